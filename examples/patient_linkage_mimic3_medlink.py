@@ -5,7 +5,6 @@ from pyhealth.metrics import ranking_metrics_fn
 from pyhealth.models import MedLink
 from pyhealth.models.medlink import BM25Okapi
 from pyhealth.models.medlink import convert_to_ir_format
-from pyhealth.models.medlink import filter_by_candidates
 from pyhealth.models.medlink import generate_candidates
 from pyhealth.models.medlink import get_bm25_hard_negatives
 from pyhealth.models.medlink import get_eval_dataloader
@@ -82,8 +81,13 @@ trainer.train(
 )
 
 """ STEP 5: evaluate """
-results = model.evaluate(test_corpus_dataloader, test_queries_dataloader)
-results = filter_by_candidates(results, te_qrels, candidates)
+# keep the true records in the candidates, as filter_by_candidates() does
+for q_id in candidates:
+    candidates[q_id] += [d_id for d_id in te_qrels[q_id] if d_id not in candidates[q_id]]
+# only the top-5 records of each query are needed for the metrics
+results = model.evaluate(
+    test_corpus_dataloader, test_queries_dataloader, top_k=5, candidates=candidates
+)
 scores = ranking_metrics_fn(te_qrels, results, k_values=[1, 5])
 logger.info(f"--- Test ---")
 for key in scores.keys():
@@ -1,12 +1,23 @@
+import hashlib
+import os
+import pickle
 from collections import defaultdict
-from typing import Optional
+from typing import Dict, Optional
 
 import numpy as np
 import torch
 import tqdm
 from torch import Tensor
+from torch.utils.data import Subset
 
+from pyhealth import BASE_CACHE_PATH
 from pyhealth.datasets import utils as datautils
+from pyhealth.utils import create_directory, load_pickle
+
+MODULE_CACHE_PATH = os.path.join(BASE_CACHE_PATH, "calib")
+
+# cache used by `prepare_numpy_dataset()` when none is given, see `ModelOutputCache`
+_active_cache = None
 
 
 def agg_loss(loss:torch.Tensor, reduction: str):
@@ -44,12 +55,152 @@ class LogLoss(torch.nn.Module):
         return agg_loss(loss, self.reduction)
 
 
+def hash_model(model: torch.nn.Module) -> str:
+    """Hashes a model checkpoint: its class, architecture and parameters/buffers."""
+    md5 = hashlib.md5()
+    md5.update(f"{type(model).__module__}.{type(model).__qualname__}".encode())
+    md5.update(repr(model).encode())
+    for name, tensor in model.state_dict().items():
+        tensor = tensor.detach().cpu().contiguous().reshape(-1)
+        md5.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+        md5.update(tensor.view(torch.uint8).numpy().tobytes())
+    return md5.hexdigest()
+
+
+def hash_dataset(dataset) -> str:
+    """Hashes the samples of a dataset, in order.
+
+    Subsets are resolved to the indices of their root dataset, whose raw
+    samples are hashed when available (without loading e.g. the signal files
+    of `SampleSignalDataset`). Otherwise, the loaded samples are hashed.
+    """
+    indices = np.arange(len(dataset))
+    while isinstance(dataset, Subset):
+        indices = np.asarray(dataset.indices)[indices]
+        dataset = dataset.dataset
+    md5 = hashlib.md5()
+    md5.update(f"{type(dataset).__qualname__}:{len(dataset)}".encode())
+    md5.update(indices.astype(np.int64).tobytes())
+    samples = getattr(dataset, "samples", None)
+    for i in indices.tolist():
+        sample = samples[i] if samples is not None else dataset[i]
+        md5.update(pickle.dumps(sample))
+    return md5.hexdigest()
+
+
+class ModelOutputCache:
+    """Persistent cache of the model outputs of `prepare_numpy_dataset()`.
+
+    The outputs (e.g., "y_prob", "logit", "embed") are stored on disk, keyed by
+    the hash of the model checkpoint, of the samples of the dataset, and of
+    the forward arguments. Thus, calibrating several calibrators or prediction
+    set methods on the same calibration set only runs the model once, also
+    across runs. Outputs computed for new keys are added to the cached ones.
+
+    Used as a context manager, it is the cache of all calibrators calibrated
+    within the block.
+
+    Args:
+        cache_dir: directory of the cache. Default is None, which uses
+            "~/.cache/pyhealth/calib/outputs".
+
+    Examples:
+        >>> from pyhealth.calib.calibration import HistogramBinning, TemperatureScaling
+        >>> from pyhealth.calib.predictionset import LABEL
+        >>> from pyhealth.calib.utils import ModelOutputCache
+        >>> with ModelOutputCache():
+        ...     TemperatureScaling(model).calibrate(cal_dataset=val_data)
+        ...     HistogramBinning(model).calibrate(cal_dataset=val_data)
+        ...     for alpha in [0.01, 0.05, 0.1]:
+        ...         LABEL(model, alpha=alpha).calibrate(cal_dataset=val_data)
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        if cache_dir is None:
+            cache_dir = os.path.join(MODULE_CACHE_PATH, "outputs")
+        self.cache_dir = cache_dir
+        self._previous = []
+
+    def get_path(
+        self, model, dataset, forward_kwargs: Optional[Dict] = None, tag: str = ""
+    ) -> str:
+        """Gets the cache file of the outputs of a model on a dataset."""
+        kwargs_hash = datautils.hash_str(repr(sorted((forward_kwargs or {}).items())))
+        key = f"{hash_model(model)}_{hash_dataset(dataset)}_{kwargs_hash}{tag}"
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def load(self, path: str) -> Dict[str, np.ndarray]:
+        """Loads the cached outputs of a cache file, if any."""
+        if not os.path.exists(path):
+            return {}
+        return load_pickle(path)
+
+    def save(self, path: str, outputs: Dict[str, np.ndarray]) -> None:
+        """Adds outputs to a cache file."""
+        create_directory(self.cache_dir)
+        outputs = {**self.load(path), **outputs}
+        # written to a temporary file first, for the concurrent runs
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(outputs, f)
+        os.replace(tmp_path, path)
+
+    def clear(self) -> None:
+        """Deletes all the cached outputs."""
+        if not os.path.exists(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".pkl"):
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def __enter__(self):
+        global _active_cache
+        self._previous.append(_active_cache)
+        _active_cache = self
+        return self
+
+    def __exit__(self, *args):
+        global _active_cache
+        _active_cache = self._previous.pop()
+        return False
+
+
 def prepare_numpy_dataset(model, dataset, keys, forward_kwargs=None,
-                         incl_data_keys=None, debug=False, batch_size=32):
+                         incl_data_keys=None, debug=False, batch_size=32,
+                         cache: Optional[ModelOutputCache] = None):
+    """Runs the model over a dataset and collects its outputs as numpy arrays.
+
+    :param cache: cache of the outputs, defaults to None, which uses the active
+        `ModelOutputCache` (if any). With a cache, the model is only run for
+        the outputs which are not cached yet.
+    :type cache: ModelOutputCache, optional
+    """
     if forward_kwargs is None:
         forward_kwargs = {}
     if incl_data_keys is None:
         incl_data_keys = []
+    if cache is None:
+        cache = _active_cache
+    if cache is None:
+        return _run_model(model, dataset, keys, forward_kwargs, incl_data_keys,
+                          debug, batch_size)
+
+    # in debug mode, only some of the batches are used
+    path = cache.get_path(
+        model, dataset, forward_kwargs, f"_debug{batch_size}" if debug else ""
+    )
+    cached = cache.load(path)
+    all_keys = list(keys) + list(incl_data_keys)
+    if all(key in cached for key in all_keys):
+        return defaultdict(list, {key: cached[key] for key in all_keys})
+    ret = _run_model(model, dataset, keys, forward_kwargs, incl_data_keys,
+                     debug, batch_size)
+    cache.save(path, dict(ret))
+    return ret
+
+
+def _run_model(model, dataset, keys, forward_kwargs, incl_data_keys, debug,
+               batch_size):
     loader = datautils.get_dataloader(dataset, batch_size, shuffle=False)
 
     ret = defaultdict(list)
@@ -1,5 +1,6 @@
 from .data import (
     Event,
+    EventList,
     Visit,
     Patient,
 )
@@ -1,9 +1,43 @@
+import sys
 from collections import OrderedDict
+from collections.abc import Sequence
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Union
 
 
-class Event:
+def _intern(s):
+    """Helper function which interns a string so that all copies share memory.
+
+    Codes, vocabularies and table names repeat across millions of events, so
+    interning them replaces one string object per event by a shared one.
+    Non-str values (e.g., None or numpy strings) are returned as is.
+    """
+    return sys.intern(s) if type(s) is str else s
+
+
+class _SlotsPickleMixin:
+    """Pickle support for slotted classes.
+
+    The state is a dict of attribute names and values, which is also the
+    state of instances pickled before the classes were slotted. Thus, caches
+    written by older versions can still be loaded.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {
+            name.lstrip("_"): getattr(self, name)
+            for cls in type(self).__mro__
+            for name in getattr(cls, "__slots__", ())
+        }
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class Event(_SlotsPickleMixin):
     """Contains information about a single event.
 
     An event can be anything from a diagnosis to a prescription or a lab test
@@ -23,6 +57,11 @@ class Event:
         attr_dict: Dict, dictionary of visit attributes. Each key is an attribute
             name and each value is the attribute's value.
 
+    Note:
+        Events are slotted and their code, table and vocabulary strings are
+            interned, since a dataset holds millions of them. Thus, no other
+            attribute than the ones above can be set on an event.
+
     Examples:
         >>> from pyhealth.data import Event
         >>> event = Event(
@@ -39,6 +78,16 @@ class Event:
         {'dosage': '250mg'}
     """
 
+    __slots__ = (
+        "code",
+        "table",
+        "vocabulary",
+        "visit_id",
+        "patient_id",
+        "timestamp",
+        "_attr_dict",
+    )
+
     def __init__(
         self,
         code: str = None,
@@ -52,14 +101,24 @@ class Event:
         assert timestamp is None or isinstance(
             timestamp, datetime
         ), "timestamp must be a datetime object"
-        self.code = code
-        self.table = table
-        self.vocabulary = vocabulary
+        self.code = _intern(code)
+        self.table = _intern(table)
+        self.vocabulary = _intern(vocabulary)
         self.visit_id = visit_id
         self.patient_id = patient_id
         self.timestamp = timestamp
-        self.attr_dict = dict()
-        self.attr_dict.update(attr)
+        # most events have no attributes, so the dict is only created on demand
+        self._attr_dict = dict(attr) if attr else None
+
+    @property
+    def attr_dict(self):
+        if self._attr_dict is None:
+            self._attr_dict = dict()
+        return self._attr_dict
+
+    @attr_dict.setter
+    def attr_dict(self, value):
+        self._attr_dict = value
 
     def __repr__(self):
         return f"Event with {self.vocabulary} code {self.code} from table {self.table}"
@@ -76,7 +135,125 @@ class Event:
         return "\n".join(lines)
 
 
-class Visit:
+class EventList(_SlotsPickleMixin, Sequence):
+    """Contains the events of a single table in a visit as arrays.
+
+    This is a struct-of-arrays alternative to a list of `Event` objects: the
+    code, vocabulary, timestamp and attributes of the events are stored in one
+    array each, while the table, visit_id and patient_id are stored only once.
+    `Event` objects are only created when the list is indexed or iterated, so
+    the memory footprint of a visit scales with the number of arrays rather
+    than the number of events.
+
+    An event list behaves as a read-only list of events, whose `Event` objects
+    are created on each access. It can be set as the events of a table with
+    `Visit.set_event_list()`. The visit converts it to a regular list of
+    events, kept in place of the event list, when the events of that table are
+    retrieved with `Visit.get_event_list()` or when an event is added to it.
+    `Visit.get_code_list()` reads the codes without converting it.
+
+    Args:
+        table: name of the table where the events are recorded.
+        visit_id: unique identifier of the visit.
+        patient_id: unique identifier of the patient.
+        code: codes of the events.
+        vocabulary: vocabularies of the events, or a single vocabulary shared
+            by all events.
+        timestamp: timestamps of the events. Default is None, which sets all
+            timestamps to None.
+        **attr: optional attributes of the events as key=array pairs.
+
+    Examples:
+        >>> from pyhealth.data import EventList
+        >>> event_list = EventList(
+        ...     table="DIAGNOSES_ICD",
+        ...     visit_id="v001",
+        ...     patient_id="p001",
+        ...     code=["428.0", "427.31"],
+        ...     vocabulary="ICD9CM",
+        ... )
+        >>> event_list
+        [Event with ICD9CM code 428.0 from table DIAGNOSES_ICD, Event with ICD9CM code 427.31 from table DIAGNOSES_ICD]
+        >>> event_list.code
+        ['428.0', '427.31']
+    """
+
+    __slots__ = (
+        "table",
+        "visit_id",
+        "patient_id",
+        "code",
+        "vocabulary",
+        "timestamp",
+        "attr",
+    )
+
+    def __init__(
+        self,
+        table: str,
+        visit_id: str,
+        patient_id: str,
+        code: Sequence,
+        vocabulary: Union[str, Sequence],
+        timestamp: Optional[Sequence] = None,
+        **attr: Sequence,
+    ):
+        self.table = _intern(table)
+        self.visit_id = visit_id
+        self.patient_id = patient_id
+        self.code = [_intern(c) for c in code]
+        if isinstance(vocabulary, str):
+            self.vocabulary = _intern(vocabulary)
+        else:
+            self.vocabulary = [_intern(v) for v in vocabulary]
+            assert len(self.vocabulary) == len(self.code), "length unmatched"
+        self.timestamp = None if timestamp is None else list(timestamp)
+        assert self.timestamp is None or len(self.timestamp) == len(
+            self.code
+        ), "length unmatched"
+        self.attr = {k: list(v) for k, v in attr.items()}
+
+    def _get_event(self, index: int) -> Event:
+        vocabulary = self.vocabulary
+        if not isinstance(vocabulary, str):
+            vocabulary = vocabulary[index]
+        return Event(
+            code=self.code[index],
+            table=self.table,
+            vocabulary=vocabulary,
+            visit_id=self.visit_id,
+            patient_id=self.patient_id,
+            timestamp=None if self.timestamp is None else self.timestamp[index],
+            **{k: v[index] for k, v in self.attr.items()},
+        )
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Event, List[Event]]:
+        if isinstance(index, slice):
+            return [self._get_event(i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event list index out of range")
+        return self._get_event(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get_event(i)
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+    def __add__(self, other) -> List[Event]:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> List[Event]:
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class Visit(_SlotsPickleMixin):
     """Contains information about a single visit.
 
     A visit is a period of time in which a patient is admitted to a hospital or
@@ -96,7 +273,9 @@ class Visit:
             name and each value is the attribute's value.
         event_list_dict: Dict[str, List[Event]], dictionary of event lists.
             Each key is a table name and each value is a list of events from that
-            table ordered by timestamp.
+            table ordered by timestamp. A value may also be a read-only
+            `EventList`; `get_event_list()` converts it to a list in place, so
+            use it rather than `event_list_dict` to modify the events.
 
     Examples:
         >>> from pyhealth.data import Event, Visit
@@ -131,6 +310,16 @@ class Visit:
         ['00069153041']
     """
 
+    __slots__ = (
+        "visit_id",
+        "patient_id",
+        "encounter_time",
+        "discharge_time",
+        "discharge_status",
+        "attr_dict",
+        "event_list_dict",
+    )
+
     def __init__(
         self,
         visit_id: str,
@@ -174,6 +363,9 @@ class Visit:
         table = event.table
         if table not in self.event_list_dict:
             self.event_list_dict[table] = list()
+        elif isinstance(self.event_list_dict[table], EventList):
+            # event lists are read-only, convert to a regular list first
+            self.event_list_dict[table] = list(self.event_list_dict[table])
         self.event_list_dict[table].append(event)
 
     def get_event_list(self, table: str) -> List[Event]:
@@ -191,8 +383,15 @@ class Visit:
         Note:
             As for now, there is no check on the order of the events. The list of
                 events is simply returned as is.
+
+        Note:
+            An `EventList` is converted to a list of events, which replaces it
+                in the visit. Thus, the same list is returned on each call, and
+                modifications to it are kept.
         """
         if table in self.event_list_dict:
+            if isinstance(self.event_list_dict[table], EventList):
+                self.event_list_dict[table] = list(self.event_list_dict[table])
             return self.event_list_dict[table]
         else:
             return list()
@@ -217,14 +416,20 @@ class Visit:
             As for now, there is no check on the order of the codes. The list of
                 codes is simply returned as is.
         """
-        event_list = self.get_event_list(table)
-        code_list = [event.code for event in event_list]
+        event_list = self.event_list_dict.get(table, [])
+        if isinstance(event_list, EventList):
+            # read the codes directly without creating the events
+            code_list = list(event_list.code)
+        else:
+            code_list = [event.code for event in event_list]
         if remove_duplicate:
             # remove duplicate codes but keep the order
             code_list = list(dict.fromkeys(code_list))
         return code_list
 
-    def set_event_list(self, table: str, event_list: List[Event]) -> None:
+    def set_event_list(
+        self, table: str, event_list: Union[List[Event], EventList]
+    ) -> None:
         """Sets the list of events from a specific table.
 
         This function will overwrite any existing list of events from
@@ -232,7 +437,7 @@ class Visit:
 
         Args:
             table: name of the table.
-            event_list: list of events to set.
+            event_list: list of events to set, or an `EventList`.
 
         Note:
             As for now, there is no check on the order of the events. The list of
@@ -285,7 +490,7 @@ class Visit:
         return "\n".join(lines)
 
 
-class Patient:
+class Patient(_SlotsPickleMixin):
     """Contains information about a single patient.
 
     A patient is a person who is admitted at least once to a hospital or
@@ -330,6 +535,17 @@ class Patient:
             Patient p001 with 1 visits
     """
 
+    __slots__ = (
+        "patient_id",
+        "birth_datetime",
+        "death_datetime",
+        "gender",
+        "ethnicity",
+        "attr_dict",
+        "visits",
+        "index_to_visit_id",
+    )
+
     def __init__(
         self,
         patient_id: str,
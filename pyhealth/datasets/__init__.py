@@ -13,5 +13,5 @@ from .tuab import TUABDataset
 from .tuev import TUEVDataset
 from .sample_dataset import SampleBaseDataset, SampleSignalDataset, SampleEHRDataset
 from .splitter import split_by_patient, split_by_visit, split_by_sample
-from .utils import collate_fn_dict, get_dataloader, strptime
+from .utils import collate_fn_dict, collate_fn_encode, get_dataloader, strptime
 from .covid19_cxr import COVID19CXRDataset
\ No newline at end of file
@@ -1,21 +1,43 @@
+import functools
 import logging
+import math
+import pickle
+import tempfile
 import time
 import os
 from abc import ABC
 from collections import Counter
-from copy import deepcopy
-from typing import Dict, Callable, Tuple, Union, List, Optional
-
+from datetime import datetime
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Callable,
+    Iterator,
+    Sequence,
+    Tuple,
+    Union,
+    List,
+    Optional,
+)
+
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from pandarallel import pandarallel
 
-from pyhealth.data import Patient, Event
+from pyhealth.data import Event, EventList, Patient
+from pyhealth.datasets.patient_store import PatientStore
 from pyhealth.datasets.sample_dataset import SampleEHRDataset
 from pyhealth.datasets.utils import MODULE_CACHE_PATH, DATASET_BASIC_TABLES
-from pyhealth.datasets.utils import hash_str
+from pyhealth.datasets.utils import (
+    apply_task_fn,
+    estimate_num_rows,
+    hash_str,
+    hash_task_fn,
+)
 from pyhealth.medcode import CrossMap
-from pyhealth.utils import load_pickle, save_pickle
+from pyhealth.utils import load_pickle, save_pickle, create_directory
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +88,17 @@ class BaseEHRDataset(ABC):
             Default is False.
         refresh_cache: whether to refresh the cache; if true, the dataset will
             be processed from scratch and the cache will be updated. Default is False.
+        cache_format: format of the cache, one of "pickle" or "columnar".
+            "pickle" stores the whole patient dict in a single pickle file.
+            "columnar" stores the patients in a `PatientStore` which is
+            memory-mapped and materializes patients lazily on access; it
+            loads faster, but `self.patients` is then read-only (each access
+            returns a new `Patient`, so modifications are not persisted).
+            Default is "pickle".
+        csv_chunksize: number of rows read at a time from each clinical table.
+            If set, tables are streamed and spilled to disk by patient, so the
+            peak memory is bounded by the chunk size rather than the table size.
+            Default is None, which reads each table at once.
     """
 
     def __init__(
@@ -76,8 +109,14 @@ class BaseEHRDataset(ABC):
         code_mapping: Optional[Dict[str, Union[str, Tuple[str, Dict]]]] = None,
         dev: bool = False,
         refresh_cache: bool = False,
+        cache_format: str = "pickle",
+        csv_chunksize: Optional[int] = None,
     ):
         """Loads tables into a dict of patients and saves it to cache."""
+        assert cache_format in [
+            "pickle",
+            "columnar",
+        ], f"cache_format must be 'pickle' or 'columnar', got {cache_format}"
 
         if code_mapping is None:
             code_mapping = {}
@@ -90,6 +129,7 @@ class BaseEHRDataset(ABC):
 
         self.code_mapping = code_mapping
         self.dev = dev
+        self.csv_chunksize = csv_chunksize
 
         # if we are using a premade dataset, no basic tables need to be provided.
         if self.dataset_name in DATASET_BASIC_TABLES and [
@@ -115,9 +155,12 @@ class BaseEHRDataset(ABC):
             + sorted(code_mapping.items())
             + ["dev" if dev else "prod"]
         )
-        filename = hash_str("+".join([str(arg) for arg in args_to_hash])) + ".pkl"
+        filename = hash_str("+".join([str(arg) for arg in args_to_hash]))
+        if cache_format == "pickle":
+            filename += ".pkl"
         self.filepath = os.path.join(MODULE_CACHE_PATH, filename)
-        
+        self.cache_format = cache_format
+
         # check if cache exists or refresh_cache is True
         if os.path.exists(self.filepath) and (not refresh_cache):
             # load from cache
@@ -125,10 +168,14 @@ class BaseEHRDataset(ABC):
                 f"Loaded {self.dataset_name} base dataset from {self.filepath}"
             )
             try:
-                self.patients, self.code_vocs = load_pickle(self.filepath)
+                if cache_format == "columnar":
+                    self.patients = PatientStore(self.filepath)
+                    self.code_vocs = self.patients.code_vocs
+                else:
+                    self.patients, self.code_vocs = load_pickle(self.filepath)
             except:
                 raise ValueError("Please refresh your cache by set refresh_cache=True")
-        
+
         else:
             # load from raw data
             logger.debug(f"Processing {self.dataset_name} base dataset...")
@@ -136,10 +183,16 @@ class BaseEHRDataset(ABC):
             patients = self.parse_tables()
             # convert codes
             patients = self._convert_code_in_patient_dict(patients)
-            self.patients = patients
             # save to cache
             logger.debug(f"Saved {self.dataset_name} base dataset to {self.filepath}")
-            save_pickle((self.patients, self.code_vocs), self.filepath)
+            if cache_format == "columnar":
+                # re-open from disk so that patients are materialized lazily
+                self.patients = PatientStore.write(
+                    patients, self.filepath, self.code_vocs
+                )
+            else:
+                self.patients = patients
+                save_pickle((self.patients, self.code_vocs), self.filepath)
 
     def _load_code_mapping_tools(self) -> Dict[str, CrossMap]:
         """Helper function which loads code mapping tools CrossMap for code mapping.
@@ -201,6 +254,111 @@ class BaseEHRDataset(ABC):
                 )
         return patients
 
+    def _read_csv_by_group(
+        self,
+        filepath: str,
+        group_by: str,
+        sort_by: List[str],
+        dropna_subset: List[str],
+        usecols: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None,
+        groups: Optional[Collection[str]] = None,
+        num_buckets: Optional[int] = None,
+        **kwargs,
+    ) -> Iterator[pd.DataFrame]:
+        """Helper function which reads a csv table as dataframes of whole groups.
+
+        Will be called in each `self.parse_[table_name]()` function.
+
+        If `self.csv_chunksize` is None, the whole table is read at once and a
+        single dataframe is yielded. Otherwise, the table is streamed in chunks of
+        `self.csv_chunksize` rows. Each chunk is filtered and appended to
+        `num_buckets` files on disk by hashing `group_by` (e.g., the patient id),
+        so that all rows of a group end up in the same bucket. By default, there
+        is one bucket per `self.csv_chunksize` rows of the table, so each bucket
+        holds about `self.csv_chunksize` rows. Buckets are then read back one at a
+        time and yielded in dataframes of about `self.csv_chunksize` rows. Thus,
+        the peak memory is bounded by the chunk size rather than the table size.
+
+        In both cases, every row of a group is in the same yielded dataframe,
+        which is sorted by `sort_by`.
+
+        Args:
+            filepath: path to the csv file.
+            group_by: column identifying a group (e.g., "SUBJECT_ID").
+            sort_by: columns to sort each yielded dataframe by.
+            dropna_subset: rows with missing values in these columns are dropped.
+            usecols: columns to read. Default is None, which reads all columns.
+            dtype: dtype of the columns. Default is None.
+            groups: if given, rows whose `group_by` value is not in `groups` are
+                dropped. Default is None.
+            num_buckets: number of buckets used to spill the table to disk.
+                Default is None, which uses the estimated number of rows of the
+                table divided by `self.csv_chunksize` (256 for a remote table).
+            **kwargs: other arguments passed to `pd.read_csv()`.
+
+        Yields:
+            Dataframes each containing all rows of a subset of groups.
+        """
+
+        def filter_df(df: pd.DataFrame) -> pd.DataFrame:
+            if groups is not None:
+                df = df[df[group_by].isin(groups)]
+            return df.dropna(subset=dropna_subset)
+
+        if groups is not None and not isinstance(groups, (set, frozenset)):
+            groups = set(groups)
+
+        if self.csv_chunksize is None:
+            df = pd.read_csv(filepath, usecols=usecols, dtype=dtype, **kwargs)
+            yield filter_df(df).sort_values(sort_by, ascending=True)
+            return
+
+        if num_buckets is None:
+            num_rows = estimate_num_rows(filepath)
+            if num_rows is None:
+                # the size of a remote table is unknown
+                num_buckets = 256
+            else:
+                num_buckets = max(1, math.ceil(num_rows / self.csv_chunksize))
+        with tempfile.TemporaryDirectory(dir=MODULE_CACHE_PATH) as spill_dir:
+            # spill the filtered chunks to disk, appended to one file per bucket
+            reader = pd.read_csv(
+                filepath,
+                usecols=usecols,
+                dtype=dtype,
+                chunksize=self.csv_chunksize,
+                **kwargs,
+            )
+            buckets = set()
+            for chunk in reader:
+                chunk = filter_df(chunk)
+                hashes = pd.util.hash_pandas_object(chunk[group_by], index=False)
+                for bucket, part in chunk.groupby(hashes.values % num_buckets):
+                    with open(os.path.join(spill_dir, f"{bucket}.pkl"), "ab") as f:
+                        pickle.dump(part, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    buckets.add(bucket)
+            # read back the buckets, a few at a time
+            buffer, buffer_rows = [], 0
+            for bucket in sorted(buckets):
+                bucket_file = os.path.join(spill_dir, f"{bucket}.pkl")
+                parts = []
+                with open(bucket_file, "rb") as f:
+                    while True:
+                        try:
+                            parts.append(pickle.load(f))
+                        except EOFError:
+                            break
+                os.remove(bucket_file)
+                df = pd.concat(parts)
+                buffer.append(df)
+                buffer_rows += len(df)
+                if buffer_rows >= self.csv_chunksize:
+                    yield pd.concat(buffer).sort_values(sort_by, ascending=True)
+                    buffer, buffer_rows = [], 0
+            if len(buffer) > 0:
+                yield pd.concat(buffer).sort_values(sort_by, ascending=True)
+
     def _add_events_to_patient_dict(
         self,
         patient_dict: Dict[str, Patient],
@@ -224,6 +382,94 @@ class BaseEHRDataset(ABC):
                 patient_dict = self._add_event_to_patient_dict(patient_dict, event)
         return patient_dict
 
+    @staticmethod
+    def _add_event_arrays_to_patient_dict(
+        patient_dict: Dict[str, Patient],
+        table: str,
+        patient_id: Sequence[str],
+        visit_id: Sequence[str],
+        code: Sequence[str],
+        vocabulary: Union[str, Sequence[str]],
+        timestamp: Optional[Sequence[Optional[datetime]]] = None,
+        **attr: Sequence,
+    ) -> Dict[str, Patient]:
+        """Helper function which adds the events of a table, given as arrays, to the patient dict.
+
+        Will be called at the end of each `self.parse_[table_name]()` function.
+
+        Unlike `self._add_events_to_patient_dict()`, this function takes one
+        array per event field (all of the same length, one element per event)
+        instead of a list of `Event` objects. Rows are split into runs of the
+        same patient and visit in a single vectorized pass, and each run is
+        stored in its visit as an `EventList`, which keeps the arrays and only
+        creates the `Event` objects on access. Rows should thus be grouped by
+        patient and visit (e.g., sorted by patient_id and visit_id), in the
+        order the events should appear in each visit.
+
+        Note that if the patient of a row is not in the patient dict, or the
+        visit is not in the patient, the row is ignored.
+
+        Args:
+            patient_dict: a dict mapping patient_id to `Patient` object.
+            table: name of the table.
+            patient_id: patient_id of each event.
+            visit_id: visit_id of each event.
+            code: code of each event.
+            vocabulary: vocabulary of each event, or a single vocabulary shared
+                by all events.
+            timestamp: timestamp of each event. Default is None, which sets all
+                timestamps to None.
+            **attr: optional attributes of each event as key=array pairs.
+
+        Returns:
+            The updated patient dict.
+        """
+        n = len(code)
+        if n == 0:
+            return patient_dict
+        patient_id = np.asarray(patient_id, dtype=object)
+        visit_id = np.asarray(visit_id, dtype=object)
+        code = np.asarray(code, dtype=object)
+        if not isinstance(vocabulary, str):
+            vocabulary = np.asarray(vocabulary, dtype=object)
+        if timestamp is not None:
+            timestamp = np.asarray(timestamp, dtype=object)
+        attr = {k: np.asarray(v, dtype=object) for k, v in attr.items()}
+
+        # start index of each run of rows with the same patient and visit
+        is_start = np.ones(n, dtype=bool)
+        is_start[1:] = (patient_id[1:] != patient_id[:-1]) | (
+            visit_id[1:] != visit_id[:-1]
+        )
+        starts = np.flatnonzero(is_start)
+        ends = np.append(starts[1:], n)
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            p_id, v_id = patient_id[start], visit_id[start]
+            patient = patient_dict.get(p_id)
+            if patient is None or v_id not in patient.visits:
+                continue
+            visit = patient.get_visit_by_id(v_id)
+            # the run is stored as arrays, the events are only created on access
+            events = EventList(
+                table=table,
+                visit_id=v_id,
+                patient_id=p_id,
+                code=code[start:end],
+                vocabulary=(
+                    vocabulary
+                    if isinstance(vocabulary, str)
+                    else vocabulary[start:end]
+                ),
+                timestamp=None if timestamp is None else timestamp[start:end],
+                **{k: v[start:end] for k, v in attr.items()},
+            )
+            existing = visit.event_list_dict.get(table)
+            if existing:
+                # concatenated into a list of events
+                events = existing + events
+            visit.set_event_list(table, events)
+        return patient_dict
+
     @staticmethod
     def _add_event_to_patient_dict(
         patient_dict: Dict[str, Patient],
@@ -268,6 +514,15 @@ class BaseEHRDataset(ABC):
         """
         for p_id, patient in tqdm(patients.items(), desc="Mapping codes"):
             patients[p_id] = self._convert_code_in_patient(patient)
+        # update the code vocs
+        for src_vocab in self.code_mapping:
+            tgt_vocab = self._get_code_mapping_args(src_vocab)[0]
+            for key, value in self.code_vocs.items():
+                if value == src_vocab:
+                    self.code_vocs[key] = tgt_vocab
+        # the mapped codes are memoized by the code mapping tools, free them
+        for code_mapping_tool in self.code_mapping_tools.values():
+            code_mapping_tool.clear_cache()
         return patients
 
     def _convert_code_in_patient(self, patient: Patient) -> Patient:
@@ -283,8 +538,24 @@ class BaseEHRDataset(ABC):
         """
         for visit in patient:
             for table in visit.available_tables:
+                event_list = visit.event_list_dict[table]
+                # skip tables without any code to convert
+                if isinstance(event_list, EventList):
+                    vocabularies = event_list.vocabulary
+                    if isinstance(vocabularies, str):
+                        vocabularies = [vocabularies]
+                else:
+                    vocabularies = [e.vocabulary for e in event_list]
+                if not any(v in self.code_mapping for v in vocabularies):
+                    continue
+                if isinstance(event_list, EventList):
+                    # keep the array storage of the events
+                    visit.set_event_list(
+                        table, self._convert_code_in_event_list(event_list)
+                    )
+                    continue
                 all_mapped_events = []
-                for event in visit.get_event_list(table):
+                for event in event_list:
                     # an event may be mapped to multiple events after code conversion
                     mapped_events: List[Event]
                     mapped_events = self._convert_code_in_event(event)
@@ -292,6 +563,88 @@ class BaseEHRDataset(ABC):
                 visit.set_event_list(table, all_mapped_events)
         return patient
 
+    def _get_code_mapping_args(self, src_vocab: str) -> Tuple[str, Dict, Dict]:
+        """Helper function which returns the target vocabulary and the kwargs
+        of the code mapping of a source vocabulary.
+
+        Args:
+            src_vocab: source vocabulary in `self.code_mapping`.
+
+        Returns:
+            A tuple of the target vocabulary, the source kwargs and the target
+                kwargs for `CrossMap.map()`.
+        """
+        target = self.code_mapping[src_vocab]
+        if isinstance(target, tuple):
+            tgt_vocab, kwargs = target
+            source_kwargs = kwargs.get("source_kwargs", {})
+            target_kwargs = kwargs.get("target_kwargs", {})
+        else:
+            tgt_vocab = self.code_mapping[src_vocab]
+            source_kwargs = {}
+            target_kwargs = {}
+        return tgt_vocab, source_kwargs, target_kwargs
+
+    def _convert_code_in_event_list(self, event_list: EventList) -> EventList:
+        """Helper function which converts the codes of an `EventList`.
+
+        The unique codes of each source vocabulary are mapped at once with
+        `CrossMap.map_codes()`, and the timestamps and attributes of each event
+        are repeated for each of its mapped codes.
+
+        Will be called in `self._convert_code_in_patient()`.
+
+        Args:
+            event_list: an `EventList` object.
+
+        Returns:
+            A new `EventList` object after code conversion, with the same
+                events as `self._convert_code_in_event()` on each event.
+        """
+        vocabularies = event_list.vocabulary
+        if isinstance(vocabularies, str):
+            vocabularies = [vocabularies] * len(event_list)
+        # source vocabulary -> (target vocabulary, code -> mapped codes)
+        mappings = {}
+        for src_vocab in set(vocabularies) & set(self.code_mapping):
+            tgt_vocab, source_kwargs, target_kwargs = self._get_code_mapping_args(
+                src_vocab
+            )
+            code_mapping_tool = self.code_mapping_tools[f"{src_vocab}_{tgt_vocab}"]
+            codes = [c for c, v in zip(event_list.code, vocabularies) if v == src_vocab]
+            mappings[src_vocab] = (
+                tgt_vocab,
+                code_mapping_tool.map_codes(codes, source_kwargs, target_kwargs),
+            )
+        # an event may be mapped to multiple events after code conversion
+        mapped_codes = []
+        mapped_vocabularies = []
+        for code, vocabulary in zip(event_list.code, vocabularies):
+            if vocabulary in mappings:
+                tgt_vocab, mapping = mappings[vocabulary]
+                mapped_codes.append(mapping[code])
+                mapped_vocabularies.append(tgt_vocab)
+            else:
+                mapped_codes.append([code])
+                mapped_vocabularies.append(vocabulary)
+        counts = [len(codes) for codes in mapped_codes]
+        index = np.repeat(np.arange(len(event_list)), counts)
+        if isinstance(event_list.vocabulary, str):
+            vocabulary = self._get_code_mapping_args(event_list.vocabulary)[0]
+        else:
+            vocabulary = [mapped_vocabularies[i] for i in index]
+        return EventList(
+            table=event_list.table,
+            visit_id=event_list.visit_id,
+            patient_id=event_list.patient_id,
+            code=[c for codes in mapped_codes for c in codes],
+            vocabulary=vocabulary,
+            timestamp=None
+            if event_list.timestamp is None
+            else [event_list.timestamp[i] for i in index],
+            **{k: [v[i] for i in index] for k, v in event_list.attr.items()},
+        )
+
     def _convert_code_in_event(self, event: Event) -> List[Event]:
         """Helper function which converts the code for a single event.
 
@@ -307,30 +660,29 @@ class BaseEHRDataset(ABC):
         """
         src_vocab = event.vocabulary
         if src_vocab in self.code_mapping:
-            target = self.code_mapping[src_vocab]
-            if isinstance(target, tuple):
-                tgt_vocab, kwargs = target
-                source_kwargs = kwargs.get("source_kwargs", {})
-                target_kwargs = kwargs.get("target_kwargs", {})
-            else:
-                tgt_vocab = self.code_mapping[src_vocab]
-                source_kwargs = {}
-                target_kwargs = {}
+            tgt_vocab, source_kwargs, target_kwargs = self._get_code_mapping_args(
+                src_vocab
+            )
+            # most codes repeat many times, CrossMap.map() memoizes them
             code_mapping_tool = self.code_mapping_tools[f"{src_vocab}_{tgt_vocab}"]
             mapped_code_list = code_mapping_tool.map(
-                event.code, source_kwargs=source_kwargs, target_kwargs=target_kwargs
+                event.code,
+                source_kwargs=source_kwargs,
+                target_kwargs=target_kwargs,
             )
-            mapped_event_list = [deepcopy(event) for _ in range(len(mapped_code_list))]
-            for i, mapped_event in enumerate(mapped_event_list):
-                mapped_event.code = mapped_code_list[i]
-                mapped_event.vocabulary = tgt_vocab
-            
-            # update the code vocs
-            for key, value in self.code_vocs.items():
-                if value == src_vocab:
-                    self.code_vocs[key] = tgt_vocab
-
-            return mapped_event_list
+            # create the mapped events directly instead of deep copying the event
+            return [
+                Event(
+                    code=mapped_code,
+                    table=event.table,
+                    vocabulary=tgt_vocab,
+                    visit_id=event.visit_id,
+                    patient_id=event.patient_id,
+                    timestamp=event.timestamp,
+                    **event.attr_dict,
+                )
+                for mapped_code in mapped_code_list
+            ]
         # TODO: should normalize the code here
         return [event]
 
@@ -341,6 +693,9 @@ class BaseEHRDataset(ABC):
         Returns:
             List of available tables.
         """
+        if isinstance(self.patients, PatientStore):
+            # read from the visits, without materializing the patients
+            return self.patients.available_tables
         tables = []
         for patient in self.patients.values():
             tables.extend(patient.available_tables)
@@ -357,18 +712,23 @@ class BaseEHRDataset(ABC):
         lines.append(f"Statistics of base dataset (dev={self.dev}):")
         lines.append(f"\t- Dataset: {self.dataset_name}")
         lines.append(f"\t- Number of patients: {len(self.patients)}")
-        num_visits = [len(p) for p in self.patients.values()]
+        # a single pass over the patients, which may be materialized on access
+        num_visits = []
+        num_events = {table: [] for table in self.tables}
+        for patient in self.patients.values():
+            num_visits.append(len(patient))
+            for table in self.tables:
+                num_events[table].extend(
+                    len(visit.event_list_dict.get(table, [])) for visit in patient
+                )
         lines.append(f"\t- Number of visits: {sum(num_visits)}")
         lines.append(
             f"\t- Number of visits per patient: {sum(num_visits) / len(num_visits):.4f}"
         )
-        for table in self.tables:
-            num_events = [
-                len(v.get_event_list(table)) for p in self.patients.values() for v in p
-            ]
+        for table, counts in num_events.items():
             lines.append(
                 f"\t- Number of events per visit in {table}: "
-                f"{sum(num_events) / len(num_events):.4f}"
+                f"{sum(counts) / len(counts):.4f}"
             )
         lines.append("")
         print("\n".join(lines))
@@ -383,6 +743,11 @@ class BaseEHRDataset(ABC):
         self,
         task_fn: Callable,
         task_name: Optional[str] = None,
+        num_workers: int = 1,
+        chunksize: Optional[int] = None,
+        cache: bool = False,
+        cache_key: Optional[str] = None,
+        refresh_cache: bool = False,
     ) -> SampleEHRDataset:
         """Processes the base dataset to generate the task-specific sample dataset.
 
@@ -397,6 +762,19 @@ class BaseEHRDataset(ABC):
                 concatenated to form the sample dataset.
             task_name: the name of the task. If None, the name of the task
                 function will be used.
+            num_workers: number of worker processes used to generate samples.
+                Patients are sharded across the workers and the samples keep
+                the patient order. Default is 1, which runs in the main process.
+            chunksize: number of patients dispatched to a worker at a time.
+                Default is None, which picks it from the number of patients.
+            cache: whether to cache the samples on disk, and to load them from
+                the cache if they were already generated. Default is False.
+            cache_key: the key of the cached samples. If set, the samples are
+                cached (even if `cache` is False) under this key instead of
+                the hash of `task_fn`. Default is None.
+            refresh_cache: whether to refresh the cache of the samples; if true,
+                the samples will be generated from scratch and the cache will be
+                updated. Default is False.
 
         Returns:
             sample_dataset: the task-specific sample dataset.
@@ -407,14 +785,56 @@ class BaseEHRDataset(ABC):
                 ([visit 1], [visit 1, visit 2], [visit 1, visit 2, visit 3]).
                 Patients can also be excluded from the task dataset by returning
                 an empty list.
+
+        Note:
+            The samples are cached under a key derived from the base dataset
+                cache and `cache_key`, or the hash of the task function (see
+                `hash_task_fn()`). The cache is invalidated when the base
+                dataset is re-processed. Without `cache_key`, it is also
+                invalidated when the source code or the bound kwargs of
+                `task_fn` change. Changes in helper functions called by
+                `task_fn` are not detected; change the `cache_key` or use
+                `refresh_cache=True` in that case.
         """
         if task_name is None:
-            task_name = task_fn.__name__
-        samples = []
-        for patient_id, patient in tqdm(
-            self.patients.items(), desc=f"Generating samples for {task_name}"
+            # the name of the function, also for partials and callable objects
+            func = task_fn
+            while isinstance(func, functools.partial):
+                func = func.func
+            task_name = getattr(func, "__name__", type(func).__name__)
+
+        task_filepath = None
+        if cache or cache_key is not None:
+            # hash filename for cache, the base cache mtime changes on re-processing
+            args_to_hash = [
+                self.filepath,
+                os.path.getmtime(self.filepath),
+                hash_task_fn(task_fn) if cache_key is None else cache_key,
+            ]
+            filename = hash_str("+".join([str(arg) for arg in args_to_hash])) + ".pkl"
+            task_filepath = os.path.join(MODULE_CACHE_PATH, "tasks", filename)
+
+        if (
+            task_filepath is not None
+            and os.path.exists(task_filepath)
+            and (not refresh_cache)
         ):
-            samples.extend(task_fn(patient))
+            # load from cache
+            logger.debug(f"Loaded {task_name} samples from {task_filepath}")
+            samples = load_pickle(task_filepath)
+        else:
+            samples = apply_task_fn(
+                task_fn,
+                self.patients,
+                num_workers=num_workers,
+                chunksize=chunksize,
+                desc=f"Generating samples for {task_name}",
+            )
+            if task_filepath is not None:
+                # save to cache
+                logger.debug(f"Saved {task_name} samples to {task_filepath}")
+                create_directory(os.path.dirname(task_filepath))
+                save_pickle(samples, task_filepath)
 
         sample_dataset = SampleEHRDataset(
             samples=samples,
@@ -3,10 +3,8 @@ import os
 import logging
 
 from abc import ABC
-import pandas as pd
-from pandarallel import pandarallel
 
-from pyhealth.datasets.utils import hash_str, MODULE_CACHE_PATH
+from pyhealth.datasets.utils import hash_str, MODULE_CACHE_PATH, apply_task_fn
 from pyhealth.datasets.sample_dataset import SampleSignalDataset
 from pyhealth.utils import load_pickle, save_pickle
 
@@ -90,6 +88,8 @@ class BaseSignalDataset(ABC):
         self,
         task_fn: Callable,
         task_name: Optional[str] = None,
+        num_workers: Optional[int] = None,
+        chunksize: Optional[int] = None,
     ) -> SampleSignalDataset:
         """Processes the base dataset to generate the task-specific sample dataset.
 
@@ -104,6 +104,11 @@ class BaseSignalDataset(ABC):
                 concatenated to form the sample dataset.
             task_name: the name of the task. If None, the name of the task
                 function will be used.
+            num_workers: number of worker processes used to generate samples.
+                Patients are sharded across the workers and the samples keep
+                the patient order. Default is None, which uses all CPUs.
+            chunksize: number of patients dispatched to a worker at a time.
+                Default is None, which picks it from the number of patients.
 
         Returns:
             sample_dataset: the task-specific sample (Base) dataset.
@@ -136,17 +141,18 @@ class BaseSignalDataset(ABC):
             # load from raw data
             logger.debug(f"Processing {self.dataset_name} base dataset...")
 
-            pandarallel.initialize(progress_bar=False)
+            if num_workers is None:
+                num_workers = os.cpu_count()
 
-            # transform dict to pandas dataframe
             if not os.path.exists(self.filepath):
                 os.makedirs(self.filepath)
-            patients = pd.DataFrame(self.patients.items(), columns=["pid", "records"])
-            patients.records = patients.records.parallel_apply(lambda x: task_fn(x))
-
-            samples = []
-            for _, records in patients.values:
-                samples.extend(records)
+            samples = apply_task_fn(
+                task_fn,
+                self.patients,
+                num_workers=num_workers,
+                chunksize=chunksize,
+                desc=f"Generating samples for {task_name}",
+            )
 
             # save to cache
             logger.debug(f"Saved {self.dataset_name} base dataset to {self.filepath}")
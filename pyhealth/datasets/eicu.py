@@ -5,9 +5,9 @@ import pandas as pd
 from tqdm import tqdm
 from datetime import datetime
 
-from pyhealth.data import Event, Visit, Patient
+from pyhealth.data import Visit, Patient
 from pyhealth.datasets import BaseEHRDataset
-from pyhealth.datasets.utils import strptime, padyear
+from pyhealth.datasets.utils import strptime, padyear, to_datetime_array
 
 # TODO: add other tables
 
@@ -240,61 +240,50 @@ class eICUDataset(BaseEHRDataset):
                 return "Unknown"
 
         table = "diagnosis"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="patientunitstayid",
+            # sort by diagnosisoffset
+            sort_by=["patientunitstayid", "diagnosisoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "icd9code", "diagnosisstring"],
+            usecols=[
+                "patientunitstayid",
+                "diagnosisoffset",
+                "icd9code",
+                "diagnosisstring",
+            ],
             dtype={"patientunitstayid": str, "icd9code": str, "diagnosisstring": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "icd9code", "diagnosisstring"])
-        # sort by diagnosisoffset
-        df = df.sort_values(["patientunitstayid", "diagnosisoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of diagnosis (per visit)
-        def diagnosis_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, codes, dxstr in zip(v_info["diagnosisoffset"], v_info["icd9code"],
-                                            v_info["diagnosisstring"]):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                codes = [c.strip() for c in codes.split(",")]
-                # for each code in a single cell (mixed ICD9CM and ICD10CM)
-                for code in codes:
-                    vocab = icd9cm_or_icd10cm(code)
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary=vocab,
-                        visit_id=v_id,
-                        patient_id=patient_id,
-                        timestamp=timestamp,
-                        diagnosisString=dxstr
-                    )
-                    # update patients
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: diagnosis_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # one row per code (mixed ICD9CM and ICD10CM codes in one cell)
+            df["icd9code"] = df["icd9code"].str.split(",")
+            df = df.explode("icd9code")
+            df["icd9code"] = df["icd9code"].str.strip()
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["diagnosisoffset"], unit="m"
+            )
+            # look up the vocabulary of each unique code only once
+            vocabs = {c: icd9cm_or_icd10cm(c) for c in df["icd9code"].unique()}
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["icd9code"].values,
+                vocabulary=df["icd9code"].map(vocabs).values,
+                timestamp=to_datetime_array(timestamp),
+                diagnosisString=df["diagnosisstring"].values,
+            )
         return patients
 
     def parse_treatment(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -312,58 +301,38 @@ class eICUDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "treatment"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="patientunitstayid",
+            # sort by treatmentoffset
+            sort_by=["patientunitstayid", "treatmentoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "treatmentstring"],
+            usecols=["patientunitstayid", "treatmentoffset", "treatmentstring"],
             dtype={"patientunitstayid": str, "treatmentstring": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "treatmentstring"])
-        # sort by treatmentoffset
-        df = df.sort_values(["patientunitstayid", "treatmentoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of treatment (per visit)
-        def treatment_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, code in zip(
-                v_info["treatmentoffset"], v_info["treatmentstring"]
-            ):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                event = Event(
-                    code=code,
-                    table=table,
-                    vocabulary="eICU_TREATMENTSTRING",
-                    visit_id=v_id,
-                    patient_id=patient_id,
-                    timestamp=timestamp,
-                )
-                # update patients
-                events.append(event)
-
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: treatment_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["treatmentoffset"], unit="m"
+            )
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["treatmentstring"].values,
+                vocabulary="eICU_TREATMENTSTRING",
+                timestamp=to_datetime_array(timestamp),
+            )
         return patients
 
     def parse_medication(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -381,56 +350,39 @@ class eICUDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "medication"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
-            low_memory=False,
+            group_by="patientunitstayid",
+            # sort by drugstartoffset
+            sort_by=["patientunitstayid", "drugstartoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "drugname"],
+            usecols=["patientunitstayid", "drugstartoffset", "drugname"],
             dtype={"patientunitstayid": str, "drugname": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "drugname"])
-        # sort by drugstartoffset
-        df = df.sort_values(["patientunitstayid", "drugstartoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of medication (per visit)
-        def medication_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, code in zip(v_info["drugstartoffset"], v_info["drugname"]):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                event = Event(
-                    code=code,
-                    table=table,
-                    vocabulary="eICU_DRUGNAME",
-                    visit_id=v_id,
-                    patient_id=patient_id,
-                    timestamp=timestamp,
-                )
-                # update patients
-                events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: medication_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            low_memory=False,
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["drugstartoffset"], unit="m"
+            )
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["drugname"].values,
+                vocabulary="eICU_DRUGNAME",
+                timestamp=to_datetime_array(timestamp),
+            )
         return patients
 
     def parse_lab(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -448,55 +400,38 @@ class eICUDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "lab"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="patientunitstayid",
+            # sort by labresultoffset
+            sort_by=["patientunitstayid", "labresultoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "labname"],
+            usecols=["patientunitstayid", "labresultoffset", "labname"],
             dtype={"patientunitstayid": str, "labname": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "labname"])
-        # sort by labresultoffset
-        df = df.sort_values(["patientunitstayid", "labresultoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of lab (per visit)
-        def lab_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, code in zip(v_info["labresultoffset"], v_info["labname"]):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                event = Event(
-                    code=code,
-                    table=table,
-                    vocabulary="eICU_LABNAME",
-                    visit_id=v_id,
-                    patient_id=patient_id,
-                    timestamp=timestamp,
-                )
-                # update patients
-                events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: lab_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["labresultoffset"], unit="m"
+            )
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["labname"].values,
+                vocabulary="eICU_LABNAME",
+                timestamp=to_datetime_array(timestamp),
+            )
         return patients
 
     def parse_physicalexam(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -514,57 +449,38 @@ class eICUDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "physicalExam"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="patientunitstayid",
+            # sort by treatmentoffset
+            sort_by=["patientunitstayid", "physicalexamoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "physicalexampath"],
+            usecols=["patientunitstayid", "physicalexamoffset", "physicalexampath"],
             dtype={"patientunitstayid": str, "physicalexampath": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "physicalexampath"])
-        # sort by treatmentoffset
-        df = df.sort_values(["patientunitstayid", "physicalexamoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of physicalExam (per visit)
-        def physicalExam_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, code in zip(
-                v_info["physicalexamoffset"], v_info["physicalexampath"]
-            ):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                event = Event(
-                    code=code,
-                    table=table,
-                    vocabulary="eICU_PHYSICALEXAMPATH",
-                    visit_id=v_id,
-                    patient_id=patient_id,
-                    timestamp=timestamp,
-                )
-                # update patients
-                events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: physicalExam_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["physicalexamoffset"], unit="m"
+            )
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["physicalexampath"].values,
+                vocabulary="eICU_PHYSICALEXAMPATH",
+                timestamp=to_datetime_array(timestamp),
+            )
         return patients
 
     def parse_admissiondx(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -582,57 +498,38 @@ class eICUDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "admissionDx"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole visits
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="patientunitstayid",
+            # sort by admitDxEnteredOffset
+            sort_by=["patientunitstayid", "admitdxenteredoffset"],
+            # drop rows with missing values
+            dropna_subset=["patientunitstayid", "admitdxpath"],
+            usecols=["patientunitstayid", "admitdxenteredoffset", "admitdxpath"],
             dtype={"patientunitstayid": str, "admitdxpath": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["patientunitstayid", "admitdxpath"])
-        # sort by admitDxEnteredOffset
-        df = df.sort_values(["patientunitstayid", "admitdxenteredoffset"], ascending=True)
-        # add the patient id info
-        df["patient_id"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_patient_id.get(x, None)
-        )
-        # add the visit encounter time info
-        df["v_encounter_time"] = df["patientunitstayid"].apply(
-            lambda x: self.visit_id_to_encounter_time.get(x, None)
-        )
-        # group by visit
-        group_df = df.groupby("patientunitstayid")
-
-        # parallel unit of admissionDx (per visit)
-        def admissionDx_unit(v_info):
-            v_id = v_info["patientunitstayid"].values[0]
-            patient_id = v_info["patient_id"].values[0]
-            v_encounter_time = v_info["v_encounter_time"].values[0]
-            if patient_id is None:
-                return []
-
-            events = []
-            for offset, code in zip(
-                v_info["admitdxenteredoffset"], v_info["admitdxpath"]
-            ):
-                # compute the absolute timestamp
-                timestamp = v_encounter_time + pd.Timedelta(minutes=offset)
-                event = Event(
-                    code=code,
-                    table=table,
-                    vocabulary="eICU_ADMITDXPATH",
-                    visit_id=v_id,
-                    patient_id=patient_id,
-                    timestamp=timestamp,
-                )
-                # update patients
-                events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: admissionDx_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other visits
+            groups=self.visit_id_to_patient_id.keys(),
+        ):
+            # add the patient id info
+            patient_id = df["patientunitstayid"].map(self.visit_id_to_patient_id)
+            # compute the absolute timestamp of each event
+            encounter_time = pd.to_datetime(
+                df["patientunitstayid"].map(self.visit_id_to_encounter_time)
+            )
+            timestamp = encounter_time + pd.to_timedelta(
+                df["admitdxenteredoffset"], unit="m"
+            )
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=patient_id.values,
+                visit_id=df["patientunitstayid"].values,
+                code=df["admitdxpath"].values,
+                vocabulary="eICU_ADMITDXPATH",
+                timestamp=to_datetime_array(timestamp),
+            )
         return patients
 
 
@@ -0,0 +1,99 @@
+import os
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def _index_filepath(filepath: str) -> str:
+    return filepath[: -len(".npy")] + ".index.npy"
+
+
+def save_epochs(filepath: str, epochs: Sequence[np.ndarray]) -> str:
+    """Saves the epochs of a record to a single memory-mappable array.
+
+    All epochs are flattened and concatenated into one contiguous array, which
+    is saved to `filepath`. An index holding the offset and the shape of each
+    epoch is saved next to it (with suffix ".index.npy"). Epochs may have
+    different shapes but must have the same number of dimensions.
+
+    This replaces saving one pickle file per epoch: a record is two files
+    no matter how many epochs it has, and `load_epoch()` reads an epoch as a
+    zero-copy slice of the memory-mapped array.
+
+    Args:
+        filepath: path of the array, must end with ".npy".
+        epochs: list of epochs (e.g., signals of shape (n_channels, length)).
+
+    Returns:
+        The filepath, to be stored in the samples as "epoch_path" together
+            with the position of each epoch as "epoch_index".
+
+    Examples:
+        >>> import numpy as np
+        >>> from pyhealth.datasets.epoch_store import save_epochs, load_epoch
+        >>> epochs = [np.random.randn(2, 3000) for _ in range(10)]
+        >>> epoch_path = save_epochs("/tmp/SC4001.npy", epochs)
+        >>> load_epoch(epoch_path, 5).shape
+        (2, 3000)
+    """
+    assert filepath.endswith(".npy"), "filepath must end with .npy"
+    epochs = [np.asarray(epoch) for epoch in epochs]
+    if len(epochs) > 0:
+        data = np.concatenate([epoch.ravel() for epoch in epochs])
+    else:
+        data = np.zeros(0)
+    ndim = epochs[0].ndim if len(epochs) > 0 else 0
+    assert all(epoch.ndim == ndim for epoch in epochs), "ndim unmatched"
+    # each row is the offset of the epoch followed by its shape
+    index = np.zeros((len(epochs), 1 + ndim), dtype=np.int64)
+    sizes = np.asarray([epoch.size for epoch in epochs], dtype=np.int64)
+    index[1:, 0] = np.cumsum(sizes)[:-1]
+    for i, epoch in enumerate(epochs):
+        index[i, 1:] = epoch.shape
+    # write to temporary files first to never leave a partial record behind
+    for path, array in [(filepath, data), (_index_filepath(filepath), index)]:
+        np.save(path[: -len(".npy")] + ".tmp.npy", array)
+        os.replace(path[: -len(".npy")] + ".tmp.npy", path)
+    return filepath
+
+
+def _file_version(filepath: str) -> Tuple[int, int, int]:
+    """Helper function which identifies the current content of a file."""
+    stat = os.stat(filepath)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=1024)
+def _open_epochs_version(
+    filepath: str, version: Tuple[int, int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    data = np.load(filepath, mmap_mode="r")
+    index = np.load(_index_filepath(filepath))
+    return data, index
+
+
+def _open_epochs(filepath: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Helper function which memory-maps the epochs of a record.
+
+    Opened records are cached, so each record is mapped once per process.
+    The cache is keyed on the file status of the index (written last by
+    `save_epochs()`), so a record saved again by any process is re-opened.
+    """
+    version = _file_version(_index_filepath(filepath))
+    return _open_epochs_version(filepath, version)
+
+
+def load_epoch(filepath: str, index: int) -> np.ndarray:
+    """Loads an epoch saved by `save_epochs()`.
+
+    Args:
+        filepath: path of the array of the record.
+        index: position of the epoch in the record.
+
+    Returns:
+        The epoch, as a read-only view of the memory-mapped array (no copy).
+    """
+    data, epoch_index = _open_epochs(filepath)
+    offset, shape = epoch_index[index, 0], tuple(epoch_index[index, 1:])
+    return data[offset : offset + int(np.prod(shape))].reshape(shape)
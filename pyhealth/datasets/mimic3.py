@@ -3,9 +3,9 @@ from typing import Optional, List, Dict, Tuple, Union
 
 import pandas as pd
 
-from pyhealth.data import Event, Visit, Patient
+from pyhealth.data import Visit, Patient
 from pyhealth.datasets import BaseEHRDataset
-from pyhealth.datasets.utils import strptime
+from pyhealth.datasets.utils import strptime, to_datetime_array
 
 # TODO: add other tables
 
@@ -158,42 +158,28 @@ class MIMIC3Dataset(BaseEHRDataset):
         """
         table = "DIAGNOSES_ICD"
         self.code_vocs["conditions"] = "ICD9CM"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="SUBJECT_ID",
+            # sort by sequence number (i.e., priority)
+            sort_by=["SUBJECT_ID", "HADM_ID", "SEQ_NUM"],
+            # drop rows with missing values
+            dropna_subset=["SUBJECT_ID", "HADM_ID", "ICD9_CODE"],
+            usecols=["SUBJECT_ID", "HADM_ID", "SEQ_NUM", "ICD9_CODE"],
             dtype={"SUBJECT_ID": str, "HADM_ID": str, "ICD9_CODE": str},
-        )
-        # drop records of the other patients
-        df = df[df["SUBJECT_ID"].isin(patients.keys())]
-        # drop rows with missing values
-        df = df.dropna(subset=["SUBJECT_ID", "HADM_ID", "ICD9_CODE"])
-        # sort by sequence number (i.e., priority)
-        df = df.sort_values(["SUBJECT_ID", "HADM_ID", "SEQ_NUM"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("SUBJECT_ID")
-
-        # parallel unit of diagnosis (per patient)
-        def diagnosis_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("HADM_ID"):
-                for code in v_info["ICD9_CODE"]:
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="ICD9CM",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: diagnosis_unit(x.SUBJECT_ID.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["SUBJECT_ID"].values,
+                visit_id=df["HADM_ID"].values,
+                code=df["ICD9_CODE"].values,
+                vocabulary="ICD9CM",
+            )
         return patients
 
     def parse_procedures_icd(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -216,42 +202,28 @@ class MIMIC3Dataset(BaseEHRDataset):
         """
         table = "PROCEDURES_ICD"
         self.code_vocs["procedures"] = "ICD9PROC"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="SUBJECT_ID",
+            # sort by sequence number (i.e., priority)
+            sort_by=["SUBJECT_ID", "HADM_ID", "SEQ_NUM"],
+            # drop rows with missing values
+            dropna_subset=["SUBJECT_ID", "HADM_ID", "SEQ_NUM", "ICD9_CODE"],
+            usecols=["SUBJECT_ID", "HADM_ID", "SEQ_NUM", "ICD9_CODE"],
             dtype={"SUBJECT_ID": str, "HADM_ID": str, "ICD9_CODE": str},
-        )
-        # drop records of the other patients
-        df = df[df["SUBJECT_ID"].isin(patients.keys())]
-        # drop rows with missing values
-        df = df.dropna(subset=["SUBJECT_ID", "HADM_ID", "SEQ_NUM", "ICD9_CODE"])
-        # sort by sequence number (i.e., priority)
-        df = df.sort_values(["SUBJECT_ID", "HADM_ID", "SEQ_NUM"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("SUBJECT_ID")
-
-        # parallel unit of procedure (per patient)
-        def procedure_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("HADM_ID"):
-                for code in v_info["ICD9_CODE"]:
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="ICD9PROC",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: procedure_unit(x.SUBJECT_ID.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["SUBJECT_ID"].values,
+                visit_id=df["HADM_ID"].values,
+                code=df["ICD9_CODE"].values,
+                vocabulary="ICD9PROC",
+            )
         return patients
 
     def parse_prescriptions(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -270,46 +242,30 @@ class MIMIC3Dataset(BaseEHRDataset):
         """
         table = "PRESCRIPTIONS"
         self.code_vocs["drugs"] = "NDC"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
-            low_memory=False,
+            group_by="SUBJECT_ID",
+            # sort by start date and end date
+            sort_by=["SUBJECT_ID", "HADM_ID", "STARTDATE", "ENDDATE"],
+            # drop rows with missing values
+            dropna_subset=["SUBJECT_ID", "HADM_ID", "NDC"],
+            usecols=["SUBJECT_ID", "HADM_ID", "STARTDATE", "ENDDATE", "NDC"],
             dtype={"SUBJECT_ID": str, "HADM_ID": str, "NDC": str},
-        )
-        # drop records of the other patients
-        df = df[df["SUBJECT_ID"].isin(patients.keys())]
-        # drop rows with missing values
-        df = df.dropna(subset=["SUBJECT_ID", "HADM_ID", "NDC"])
-        # sort by start date and end date
-        df = df.sort_values(
-            ["SUBJECT_ID", "HADM_ID", "STARTDATE", "ENDDATE"], ascending=True
-        )
-        # group by patient and visit
-        group_df = df.groupby("SUBJECT_ID")
-
-        # parallel unit for prescription (per patient)
-        def prescription_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("HADM_ID"):
-                for timestamp, code in zip(v_info["STARTDATE"], v_info["NDC"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="NDC",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: prescription_unit(x.SUBJECT_ID.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            low_memory=False,
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["SUBJECT_ID"].values,
+                visit_id=df["HADM_ID"].values,
+                code=df["NDC"].values,
+                vocabulary="NDC",
+                timestamp=to_datetime_array(df["STARTDATE"]),
+            )
         return patients
 
     def parse_labevents(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -328,43 +284,29 @@ class MIMIC3Dataset(BaseEHRDataset):
         """
         table = "LABEVENTS"
         self.code_vocs["labs"] = "MIMIC3_ITEMID"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="SUBJECT_ID",
+            # sort by charttime
+            sort_by=["SUBJECT_ID", "HADM_ID", "CHARTTIME"],
+            # drop rows with missing values
+            dropna_subset=["SUBJECT_ID", "HADM_ID", "ITEMID"],
+            usecols=["SUBJECT_ID", "HADM_ID", "ITEMID", "CHARTTIME"],
             dtype={"SUBJECT_ID": str, "HADM_ID": str, "ITEMID": str},
-        )
-        # drop records of the other patients
-        df = df[df["SUBJECT_ID"].isin(patients.keys())]
-        # drop rows with missing values
-        df = df.dropna(subset=["SUBJECT_ID", "HADM_ID", "ITEMID"])
-        # sort by charttime
-        df = df.sort_values(["SUBJECT_ID", "HADM_ID", "CHARTTIME"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("SUBJECT_ID")
-
-        # parallel unit for lab (per patient)
-        def lab_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("HADM_ID"):
-                for timestamp, code in zip(v_info["CHARTTIME"], v_info["ITEMID"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="MIMIC3_ITEMID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: lab_unit(x.SUBJECT_ID.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["SUBJECT_ID"].values,
+                visit_id=df["HADM_ID"].values,
+                code=df["ITEMID"].values,
+                vocabulary="MIMIC3_ITEMID",
+                timestamp=to_datetime_array(df["CHARTTIME"]),
+            )
         return patients
 
 
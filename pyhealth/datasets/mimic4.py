@@ -3,9 +3,9 @@ from typing import Optional, List, Dict, Union, Tuple
 
 import pandas as pd
 
-from pyhealth.data import Event, Visit, Patient
+from pyhealth.data import Visit, Patient
 from pyhealth.datasets import BaseEHRDataset
-from pyhealth.datasets.utils import strptime
+from pyhealth.datasets.utils import strptime, to_datetime_array
 
 # TODO: add other tables
 
@@ -162,41 +162,28 @@ class MIMIC4Dataset(BaseEHRDataset):
                 table, so we set it to None.
         """
         table = "diagnoses_icd"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="subject_id",
+            # sort by sequence number (i.e., priority)
+            sort_by=["subject_id", "hadm_id", "seq_num"],
+            # drop rows with missing values
+            dropna_subset=["subject_id", "hadm_id", "icd_code", "icd_version"],
+            usecols=["subject_id", "hadm_id", "seq_num", "icd_code", "icd_version"],
             dtype={"subject_id": str, "hadm_id": str, "icd_code": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["subject_id", "hadm_id", "icd_code", "icd_version"])
-        # sort by sequence number (i.e., priority)
-        df = df.sort_values(["subject_id", "hadm_id", "seq_num"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("subject_id")
-
-        # parallel unit of diagnosis (per patient)
-        def diagnosis_unit(p_id, p_info):
-            events = []
-            # iterate over each patient and visit
-            for v_id, v_info in p_info.groupby("hadm_id"):
-                for code, version in zip(v_info["icd_code"], v_info["icd_version"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary=f"ICD{version}CM",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: diagnosis_unit(x.subject_id.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["subject_id"].values,
+                visit_id=df["hadm_id"].values,
+                code=df["icd_code"].values,
+                vocabulary=("ICD" + df["icd_version"].astype(str) + "CM").values,
+            )
         return patients
 
     def parse_procedures_icd(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -218,42 +205,28 @@ class MIMIC4Dataset(BaseEHRDataset):
                 table, so we set it to None.
         """
         table = "procedures_icd"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="subject_id",
+            # sort by sequence number (i.e., priority)
+            sort_by=["subject_id", "hadm_id", "seq_num"],
+            # drop rows with missing values
+            dropna_subset=["subject_id", "hadm_id", "icd_code", "icd_version"],
+            usecols=["subject_id", "hadm_id", "seq_num", "icd_code", "icd_version"],
             dtype={"subject_id": str, "hadm_id": str, "icd_code": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["subject_id", "hadm_id", "icd_code", "icd_version"])
-        # sort by sequence number (i.e., priority)
-        df = df.sort_values(["subject_id", "hadm_id", "seq_num"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("subject_id")
-
-        # parallel unit of procedure (per patient)
-        def procedure_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("hadm_id"):
-                for code, version in zip(v_info["icd_code"], v_info["icd_version"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary=f"ICD{version}PROC",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                    )
-                    # update patients
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: procedure_unit(x.subject_id.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
-
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["subject_id"].values,
+                visit_id=df["hadm_id"].values,
+                code=df["icd_code"].values,
+                vocabulary=("ICD" + df["icd_version"].astype(str) + "PROC").values,
+            )
         return patients
 
     def parse_prescriptions(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -271,46 +244,30 @@ class MIMIC4Dataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "prescriptions"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
-            low_memory=False,
+            group_by="subject_id",
+            # sort by start date and end date
+            sort_by=["subject_id", "hadm_id", "starttime", "stoptime"],
+            # drop rows with missing values
+            dropna_subset=["subject_id", "hadm_id", "ndc"],
+            usecols=["subject_id", "hadm_id", "starttime", "stoptime", "ndc"],
             dtype={"subject_id": str, "hadm_id": str, "ndc": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["subject_id", "hadm_id", "ndc"])
-        # sort by start date and end date
-        df = df.sort_values(
-            ["subject_id", "hadm_id", "starttime", "stoptime"], ascending=True
-        )
-        # group by patient and visit
-        group_df = df.groupby("subject_id")
-
-        # parallel unit of prescription (per patient)
-        def prescription_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("hadm_id"):
-                for timestamp, code in zip(v_info["starttime"], v_info["ndc"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="NDC",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    # update patients
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: prescription_unit(x.subject_id.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
-
+            low_memory=False,
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["subject_id"].values,
+                visit_id=df["hadm_id"].values,
+                code=df["ndc"].values,
+                vocabulary="NDC",
+                timestamp=to_datetime_array(df["starttime"]),
+            )
         return patients
 
     def parse_labevents(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -328,41 +285,29 @@ class MIMIC4Dataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "labevents"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="subject_id",
+            # sort by charttime
+            sort_by=["subject_id", "hadm_id", "charttime"],
+            # drop rows with missing values
+            dropna_subset=["subject_id", "hadm_id", "itemid"],
+            usecols=["subject_id", "hadm_id", "itemid", "charttime"],
             dtype={"subject_id": str, "hadm_id": str, "itemid": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["subject_id", "hadm_id", "itemid"])
-        # sort by charttime
-        df = df.sort_values(["subject_id", "hadm_id", "charttime"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("subject_id")
-
-        # parallel unit of labevent (per patient)
-        def lab_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("hadm_id"):
-                for timestamp, code in zip(v_info["charttime"], v_info["itemid"]):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="MIMIC4_ITEMID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: lab_unit(x.subject_id.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["subject_id"].values,
+                visit_id=df["hadm_id"].values,
+                code=df["itemid"].values,
+                vocabulary="MIMIC4_ITEMID",
+                timestamp=to_datetime_array(df["charttime"]),
+            )
         return patients
 
     def parse_hcpcsevents(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -384,41 +329,28 @@ class MIMIC4Dataset(BaseEHRDataset):
                 table, so we set it to None.
         """
         table = "hcpcsevents"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="subject_id",
+            # sort by sequence number (i.e., priority)
+            sort_by=["subject_id", "hadm_id", "seq_num"],
+            # drop rows with missing values
+            dropna_subset=["subject_id", "hadm_id", "hcpcs_cd"],
+            usecols=["subject_id", "hadm_id", "seq_num", "hcpcs_cd"],
             dtype={"subject_id": str, "hadm_id": str, "hcpcs_cd": str},
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["subject_id", "hadm_id", "hcpcs_cd"])
-        # sort by sequence number (i.e., priority)
-        df = df.sort_values(["subject_id", "hadm_id", "seq_num"], ascending=True)
-        # group by patient and visit
-        group_df = df.groupby("subject_id")
-
-        # parallel unit of hcpcsevents (per patient)
-        def hcpcsevents_unit(p_id, p_info):
-            events = []
-            for v_id, v_info in p_info.groupby("hadm_id"):
-                for code in v_info["hcpcs_cd"]:
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="MIMIC4_HCPCS_CD",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                    )
-                    # update patients
-                    events.append(event)
-            return events
-            
-        # parallel apply
-        group_df = group_df.parallel_apply(
-            lambda x: hcpcsevents_unit(x.subject_id.unique()[0], x)
-        )
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["subject_id"].values,
+                visit_id=df["hadm_id"].values,
+                code=df["hcpcs_cd"].values,
+                vocabulary="MIMIC4_HCPCS_CD",
+            )
         
         return patients
         
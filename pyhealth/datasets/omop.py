@@ -3,9 +3,9 @@ from typing import Optional, List, Dict, Tuple, Union
 
 import pandas as pd
 
-from pyhealth.data import Event, Visit, Patient
+from pyhealth.data import Visit, Patient
 from pyhealth.datasets import BaseEHRDataset
-from pyhealth.datasets.utils import strptime
+from pyhealth.datasets.utils import strptime, to_datetime_array
 
 
 # TODO: add other tables
@@ -185,55 +185,39 @@ class OMOPDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "condition_occurrence"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="person_id",
+            # sort by condition_start_datetime
+            sort_by=["person_id", "visit_occurrence_id", "condition_start_datetime"],
+            # drop rows with missing values
+            dropna_subset=["person_id", "visit_occurrence_id", "condition_concept_id"],
+            usecols=[
+                "person_id",
+                "visit_occurrence_id",
+                "condition_start_datetime",
+                "condition_concept_id",
+            ],
             dtype={
                 "person_id": str,
                 "visit_occurrence_id": str,
                 "condition_concept_id": str,
             },
             sep="\t",
-        )
-        # drop rows with missing values
-        df = df.dropna(
-            subset=["person_id", "visit_occurrence_id", "condition_concept_id"]
-        )
-        # sort by condition_start_datetime
-        df = df.sort_values(
-            ["person_id", "visit_occurrence_id", "condition_start_datetime"],
-            ascending=True,
-        )
-        # group by patient and visit
-        group_df = df.groupby("person_id")
-
-        # parallel unit of condition occurrence (per patient)
-        def condition_unit(p_info):
-            p_id = p_info["person_id"].values[0]
-
-            events = []
-            for v_id, v_info in p_info.groupby("visit_occurrence_id"):
-                for timestamp, code in zip(
-                    v_info["condition_start_datetime"], v_info["condition_concept_id"]
-                ):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="CONDITION_CONCEPT_ID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    # update patients
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: condition_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
-
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["person_id"].values,
+                visit_id=df["visit_occurrence_id"].values,
+                code=df["condition_concept_id"].values,
+                vocabulary="CONDITION_CONCEPT_ID",
+                timestamp=to_datetime_array(df["condition_start_datetime"]),
+            )
         return patients
 
     def parse_procedure_occurrence(
@@ -253,52 +237,39 @@ class OMOPDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "procedure_occurrence"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="person_id",
+            # sort by procedure_datetime
+            sort_by=["person_id", "visit_occurrence_id", "procedure_datetime"],
+            # drop rows with missing values
+            dropna_subset=["person_id", "visit_occurrence_id", "procedure_concept_id"],
+            usecols=[
+                "person_id",
+                "visit_occurrence_id",
+                "procedure_datetime",
+                "procedure_concept_id",
+            ],
             dtype={
                 "person_id": str,
                 "visit_occurrence_id": str,
                 "procedure_concept_id": str,
             },
             sep="\t",
-        )
-        # drop rows with missing values
-        df = df.dropna(
-            subset=["person_id", "visit_occurrence_id", "procedure_concept_id"]
-        )
-        # sort by procedure_datetime
-        df = df.sort_values(
-            ["person_id", "visit_occurrence_id", "procedure_datetime"], ascending=True
-        )
-        # group by patient and visit
-        group_df = df.groupby("person_id")
-
-        # parallel unit of procedure occurrence (per patient)
-        def procedure_unit(p_info):
-            p_id = p_info["person_id"].values[0]
-
-            events = []
-            for v_id, v_info in p_info.groupby("visit_occurrence_id"):
-                for timestamp, code in zip(
-                    v_info["procedure_datetime"], v_info["procedure_concept_id"]
-                ):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="PROCEDURE_CONCEPT_ID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: procedure_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["person_id"].values,
+                visit_id=df["visit_occurrence_id"].values,
+                code=df["procedure_concept_id"].values,
+                vocabulary="PROCEDURE_CONCEPT_ID",
+                timestamp=to_datetime_array(df["procedure_datetime"]),
+            )
         return patients
 
     def parse_drug_exposure(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -316,52 +287,43 @@ class OMOPDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "drug_exposure"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="person_id",
+            # sort by drug_exposure_start_datetime
+            sort_by=[
+                "person_id",
+                "visit_occurrence_id",
+                "drug_exposure_start_datetime",
+            ],
+            # drop rows with missing values
+            dropna_subset=["person_id", "visit_occurrence_id", "drug_concept_id"],
+            usecols=[
+                "person_id",
+                "visit_occurrence_id",
+                "drug_exposure_start_datetime",
+                "drug_concept_id",
+            ],
             dtype={
                 "person_id": str,
                 "visit_occurrence_id": str,
                 "drug_concept_id": str,
             },
             sep="\t",
-        )
-        # drop rows with missing values
-        df = df.dropna(subset=["person_id", "visit_occurrence_id", "drug_concept_id"])
-        # sort by drug_exposure_start_datetime
-        df = df.sort_values(
-            ["person_id", "visit_occurrence_id", "drug_exposure_start_datetime"],
-            ascending=True,
-        )
-        # group by patient and visit
-        group_df = df.groupby("person_id")
-
-        # parallel unit of drug exposure (per patient)
-        def drug_unit(p_info):
-            p_id = p_info["person_id"].values[0]
-
-            events = []
-            for v_id, v_info in p_info.groupby("visit_occurrence_id"):
-                for timestamp, code in zip(
-                    v_info["drug_exposure_start_datetime"], v_info["drug_concept_id"]
-                ):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="DRUG_CONCEPT_ID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: drug_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
-
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["person_id"].values,
+                visit_id=df["visit_occurrence_id"].values,
+                code=df["drug_concept_id"].values,
+                vocabulary="DRUG_CONCEPT_ID",
+                timestamp=to_datetime_array(df["drug_exposure_start_datetime"]),
+            )
         return patients
 
     def parse_measurement(self, patients: Dict[str, Patient]) -> Dict[str, Patient]:
@@ -379,53 +341,43 @@ class OMOPDataset(BaseEHRDataset):
             The updated patients dict.
         """
         table = "measurement"
-        # read table
-        df = pd.read_csv(
+        # read table in dataframes of whole patients
+        for df in self._read_csv_by_group(
             os.path.join(self.root, f"{table}.csv"),
+            group_by="person_id",
+            # sort by measurement_datetime
+            sort_by=["person_id", "visit_occurrence_id", "measurement_datetime"],
+            # drop rows with missing values
+            dropna_subset=[
+                "person_id",
+                "visit_occurrence_id",
+                "measurement_concept_id",
+            ],
+            usecols=[
+                "person_id",
+                "visit_occurrence_id",
+                "measurement_datetime",
+                "measurement_concept_id",
+            ],
             dtype={
                 "person_id": str,
                 "visit_occurrence_id": str,
                 "measurement_concept_id": str,
             },
             sep="\t",
-        )
-        # drop rows with missing values
-        df = df.dropna(
-            subset=["person_id", "visit_occurrence_id", "measurement_concept_id"]
-        )
-        # sort by measurement_datetime
-        df = df.sort_values(
-            ["person_id", "visit_occurrence_id", "measurement_datetime"], ascending=True
-        )
-        # group by patient and visit
-        group_df = df.groupby("person_id")
-
-        # parallel unit of measurement (per patient)
-        def measurement_unit(p_info):
-            p_id = p_info["person_id"].values[0]
-
-            events = []
-            for v_id, v_info in p_info.groupby("visit_occurrence_id"):
-                for timestamp, code in zip(
-                    v_info["measurement_datetime"], v_info["measurement_concept_id"]
-                ):
-                    event = Event(
-                        code=code,
-                        table=table,
-                        vocabulary="MEASUREMENT_CONCEPT_ID",
-                        visit_id=v_id,
-                        patient_id=p_id,
-                        timestamp=strptime(timestamp),
-                    )
-                    events.append(event)
-            return events
-
-        # parallel apply
-        group_df = group_df.parallel_apply(lambda x: measurement_unit(x))
-
-        # summarize the results
-        patients = self._add_events_to_patient_dict(patients, group_df)
-
+            # drop records of the other patients
+            groups=patients.keys(),
+        ):
+            # add the events of all rows at once
+            patients = self._add_event_arrays_to_patient_dict(
+                patients,
+                table,
+                patient_id=df["person_id"].values,
+                visit_id=df["visit_occurrence_id"].values,
+                code=df["measurement_concept_id"].values,
+                vocabulary="MEASUREMENT_CONCEPT_ID",
+                timestamp=to_datetime_array(df["measurement_datetime"]),
+            )
         return patients
 
 
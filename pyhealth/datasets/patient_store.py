@@ -0,0 +1,346 @@
+import os
+import pickle
+import shutil
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from pyhealth.data import Event, EventList, Visit, Patient
+from pyhealth.utils import load_json, save_json
+
+# bump this whenever the on-disk layout changes so that stale caches are rebuilt
+STORE_VERSION = 1
+
+PATIENT_FIELDS = [
+    "patient_id",
+    "birth_datetime",
+    "death_datetime",
+    "gender",
+    "ethnicity",
+]
+VISIT_FIELDS = ["visit_id", "encounter_time", "discharge_time", "discharge_status"]
+EVENT_FIELDS = ["code", "vocabulary", "timestamp"]
+
+# column holding the whole attr_dict when keys are not uniform across rows
+ATTR_DICT_COLUMN = "__attr_dict__"
+# column holding the ordered event tables of each visit
+VISIT_TABLES_COLUMN = "__tables__"
+ATTR_PREFIX = "attr."
+
+
+def _to_arrow_array(values: List) -> Tuple[pa.Array, bool]:
+    """Helper function which converts a list of python values to an arrow array.
+
+    Values that arrow cannot represent natively (e.g., a mix of str and float
+    nan coming from pandas) are pickled into a binary column.
+
+    Returns:
+        The arrow array and whether the values were pickled.
+    """
+    try:
+        return pa.array(values), False
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array([pickle.dumps(v) for v in values], type=pa.binary()), True
+
+
+def _attr_columns(attr_dicts: List[Dict]) -> Dict[str, List]:
+    """Helper function which splits a list of attr_dict into columns.
+
+    If all attr_dicts share the same keys, each key becomes its own column.
+    Otherwise, the attr_dicts are kept as a single column.
+    """
+    if len(attr_dicts) == 0:
+        return {}
+    keys = list(attr_dicts[0].keys())
+    if all(list(d.keys()) == keys for d in attr_dicts):
+        return {f"{ATTR_PREFIX}{k}": [d[k] for d in attr_dicts] for k in keys}
+    return {ATTR_DICT_COLUMN: attr_dicts}
+
+
+def _write_table(columns: Dict[str, List], filepath: str) -> List[str]:
+    """Helper function which writes columns to an arrow IPC file.
+
+    Returns:
+        The names of the columns that were pickled.
+    """
+    arrays, pickled = {}, []
+    for name, values in columns.items():
+        array, is_pickled = _to_arrow_array(values)
+        if is_pickled:
+            pickled.append(name)
+        elif name in ["code", "vocabulary"] and pa.types.is_string(array.type):
+            # codes and vocabularies repeat a lot
+            array = array.dictionary_encode()
+        arrays[name] = array
+    table = pa.table(arrays)
+    with pa.OSFile(filepath, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return pickled
+
+
+def _read_table(filepath: str) -> pa.Table:
+    """Helper function which memory-maps an arrow IPC file (zero-copy)."""
+    source = pa.memory_map(filepath, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+class PatientStore(Mapping):
+    """Columnar on-disk store of patients.
+
+    The store keeps one arrow table for patients, one for visits and one per
+    source table (e.g., "DIAGNOSES_ICD") for events. Rows are laid out
+    contiguously by patient, so all rows of a patient form a single slice of
+    each table. Tables are memory-mapped when the store is opened, and a
+    `Patient` object is only materialized when it is accessed. Thus, opening
+    the store is near-instant and memory scales with the patients being touched
+    rather than the whole cohort. The events of each table in a visit are
+    materialized as an `EventList`, which holds them as arrays.
+
+    The store behaves as a read-only dict mapping patient_id to `Patient`.
+    Note that each access materializes a new `Patient` object, so modifications
+    to a returned patient are not persisted.
+
+    Args:
+        root: directory of the store (created by `PatientStore.write()`).
+
+    Attributes:
+        tables: List[str], names of the event tables in the store.
+        code_vocs: Dict[str, str], the code vocabularies of the dataset.
+
+    Examples:
+        >>> from pyhealth.datasets.patient_store import PatientStore
+        >>> store = PatientStore.write(patients, "/tmp/store")
+        >>> store = PatientStore("/tmp/store")
+        >>> store["p001"]
+        Patient p001 with 1 visits
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._open()
+
+    def _open(self):
+        meta = load_json(os.path.join(self.root, "meta.json"))
+        if meta["version"] != STORE_VERSION:
+            raise ValueError(
+                f"Patient store at {self.root} has version {meta['version']}, "
+                f"expected {STORE_VERSION}"
+            )
+        self.tables: List[str] = meta["tables"]
+        self.code_vocs: Dict[str, str] = meta["code_vocs"]
+        self._pickled: Dict[str, List[str]] = meta["pickled"]
+        self._patients = _read_table(os.path.join(self.root, "patients.arrow"))
+        self._visits = _read_table(os.path.join(self.root, "visits.arrow"))
+        self._events = {
+            table: _read_table(os.path.join(self.root, "events", f"{i}.arrow"))
+            for i, table in enumerate(self.tables)
+        }
+        offsets = np.load(os.path.join(self.root, "offsets.npz"))
+        self._visit_offsets = offsets["visits"]
+        self._event_offsets = {
+            table: offsets[f"events_{i}"] for i, table in enumerate(self.tables)
+        }
+        patient_ids = self._patients.column("patient_id").to_pylist()
+        self._index: Dict[str, int] = {p_id: i for i, p_id in enumerate(patient_ids)}
+
+    def __getstate__(self):
+        # memory maps cannot be pickled, re-open the store instead
+        return {"root": self.root}
+
+    def __setstate__(self, state):
+        self.root = state["root"]
+        self._open()
+
+    @classmethod
+    def write(
+        cls,
+        patients: Dict[str, Patient],
+        root: str,
+        code_vocs: Optional[Dict[str, str]] = None,
+    ) -> "PatientStore":
+        """Writes a dict of patients to a columnar store and opens it.
+
+        The store is first written to a temporary directory and then moved to
+        `root`, so an interrupted write never leaves a partial store behind.
+
+        Args:
+            patients: a dict mapping patient_id to `Patient` object.
+            root: directory of the store. Will be overwritten if it exists.
+            code_vocs: the code vocabularies of the dataset. Default is None.
+
+        Returns:
+            The opened `PatientStore`.
+        """
+        tmp_root = root + ".tmp"
+        if os.path.exists(tmp_root):
+            shutil.rmtree(tmp_root)
+        os.makedirs(os.path.join(tmp_root, "events"))
+
+        patient_rows, visit_rows = [], []
+        event_rows: Dict[str, List[Tuple[int, Event]]] = {}
+        visit_offsets = [0]
+        event_offsets: Dict[str, List[int]] = {}
+        for p_idx, patient in enumerate(patients.values()):
+            patient_rows.append(patient)
+            for v_idx, visit in enumerate(patient.visits.values()):
+                visit_rows.append(visit)
+                for table, event_list in visit.event_list_dict.items():
+                    if table not in event_rows:
+                        event_rows[table] = []
+                        # patients before this one have no events in this table
+                        event_offsets[table] = [0] * (p_idx + 1)
+                    event_rows[table].extend((v_idx, event) for event in event_list)
+            visit_offsets.append(len(visit_rows))
+            for table in event_rows:
+                event_offsets[table].append(len(event_rows[table]))
+        tables = list(event_rows.keys())
+
+        pickled = {}
+        columns = {f: [getattr(p, f) for p in patient_rows] for f in PATIENT_FIELDS}
+        columns.update(_attr_columns([p.attr_dict for p in patient_rows]))
+        pickled["patients"] = _write_table(
+            columns, os.path.join(tmp_root, "patients.arrow")
+        )
+        columns = {f: [getattr(v, f) for v in visit_rows] for f in VISIT_FIELDS}
+        columns[VISIT_TABLES_COLUMN] = [v.available_tables for v in visit_rows]
+        columns.update(_attr_columns([v.attr_dict for v in visit_rows]))
+        pickled["visits"] = _write_table(
+            columns, os.path.join(tmp_root, "visits.arrow")
+        )
+        for i, table in enumerate(tables):
+            rows = event_rows[table]
+            columns = {"visit_index": [v_idx for v_idx, _ in rows]}
+            columns.update({f: [getattr(e, f) for _, e in rows] for f in EVENT_FIELDS})
+            columns.update(_attr_columns([e.attr_dict for _, e in rows]))
+            pickled[table] = _write_table(
+                columns, os.path.join(tmp_root, "events", f"{i}.arrow")
+            )
+
+        np.savez(
+            os.path.join(tmp_root, "offsets.npz"),
+            visits=np.asarray(visit_offsets, dtype=np.int64),
+            **{
+                f"events_{i}": np.asarray(event_offsets[table], dtype=np.int64)
+                for i, table in enumerate(tables)
+            },
+        )
+        # meta.json is written last and marks the store as complete
+        save_json(
+            {
+                "version": STORE_VERSION,
+                "tables": tables,
+                "code_vocs": code_vocs or {},
+                "pickled": pickled,
+            },
+            os.path.join(tmp_root, "meta.json"),
+        )
+        if os.path.exists(root):
+            shutil.rmtree(root)
+        os.rename(tmp_root, root)
+        return cls(root)
+
+    def _decode_rows(self, table: pa.Table, name: str) -> List[Dict]:
+        """Helper function which converts arrow rows back to python dicts."""
+        rows = table.to_pylist()
+        for column in self._pickled[name]:
+            for row in rows:
+                row[column] = pickle.loads(row[column])
+        for row in rows:
+            attr = row.pop(ATTR_DICT_COLUMN, None) or {}
+            for key in [k for k in row if k.startswith(ATTR_PREFIX)]:
+                attr[key[len(ATTR_PREFIX) :]] = row.pop(key)
+            row["attr"] = attr
+        return rows
+
+    def _decode_columns(self, table: pa.Table, name: str) -> Dict[str, List]:
+        """Helper function which converts arrow columns back to python lists."""
+        columns = {}
+        for column in table.column_names:
+            values = table.column(column).to_pylist()
+            if column in self._pickled[name]:
+                values = [pickle.loads(v) for v in values]
+            if column.startswith(ATTR_PREFIX):
+                column = column[len(ATTR_PREFIX) :]
+            columns[column] = values
+        return columns
+
+    def _load_patient(self, index: int) -> Patient:
+        """Helper function which materializes the patient at row `index`."""
+        row = self._decode_rows(self._patients.slice(index, 1), "patients")[0]
+        patient = Patient(**{f: row[f] for f in PATIENT_FIELDS}, **row["attr"])
+        start, end = self._visit_offsets[index], self._visit_offsets[index + 1]
+        visits = []
+        for row in self._decode_rows(self._visits.slice(start, end - start), "visits"):
+            visit = Visit(
+                patient_id=patient.patient_id,
+                **{f: row[f] for f in VISIT_FIELDS},
+                **row["attr"],
+            )
+            # keep the original table order (and tables without events)
+            for table in row[VISIT_TABLES_COLUMN]:
+                visit.set_event_list(table, [])
+            patient.add_visit(visit)
+            visits.append(visit)
+        for table in self.tables:
+            offsets = self._event_offsets[table]
+            start, end = offsets[index], offsets[index + 1]
+            if start == end:
+                continue
+            events = self._events[table].slice(start, end - start)
+            if ATTR_DICT_COLUMN in events.column_names:
+                # attributes are not uniform, fall back to one object per event
+                for row in self._decode_rows(events, table):
+                    visit = visits[row["visit_index"]]
+                    event = Event(
+                        table=table,
+                        visit_id=visit.visit_id,
+                        patient_id=patient.patient_id,
+                        **{f: row[f] for f in EVENT_FIELDS},
+                        **row["attr"],
+                    )
+                    visit.add_event(event)
+                continue
+            columns = self._decode_columns(events, table)
+            visit_index = columns.pop("visit_index")
+            # events of a visit are contiguous, split them into runs
+            bounds = np.flatnonzero(np.diff(visit_index)) + 1
+            bounds = [0] + bounds.tolist() + [len(visit_index)]
+            for run_start, run_end in zip(bounds[:-1], bounds[1:]):
+                visit = visits[visit_index[run_start]]
+                visit.set_event_list(
+                    table,
+                    EventList(
+                        table=table,
+                        visit_id=visit.visit_id,
+                        patient_id=patient.patient_id,
+                        **{k: v[run_start:run_end] for k, v in columns.items()},
+                    ),
+                )
+        return patient
+
+    @property
+    def available_tables(self) -> List[str]:
+        """Returns the tables of the visits, without materializing the patients."""
+        tables = self._visits.column(VISIT_TABLES_COLUMN).to_pylist()
+        if VISIT_TABLES_COLUMN in self._pickled["visits"]:
+            tables = [pickle.loads(t) for t in tables]
+        return list(set(table for visit_tables in tables for table in visit_tables))
+
+    def __getitem__(self, patient_id: str) -> Patient:
+        """Materializes a patient by patient_id."""
+        return self._load_patient(self._index[patient_id])
+
+    def __contains__(self, patient_id) -> bool:
+        return patient_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self):
+        return f"PatientStore at {self.root} with {len(self)} patients"
@@ -4,6 +4,7 @@ import pickle
 
 from torch.utils.data import Dataset
 
+from pyhealth.datasets.epoch_store import load_epoch
 from pyhealth.datasets.utils import list_nested_levels, flatten_list
 
 
@@ -90,6 +91,12 @@ class SampleSignalDataset(SampleBaseDataset):
     `BaseDataset.set_task()` or user-provided input), and provides
     a uniform interface for accessing the samples.
 
+    The signal of each sample is loaded from its "epoch_path" when the sample
+    is accessed. If the sample also has an "epoch_index", the signal is read
+    from a record saved with `pyhealth.datasets.epoch_store.save_epochs()`
+    (memory-mapped, no copy). Otherwise, "epoch_path" is a pickle file of a
+    dict with the signal.
+
     Args:
         samples: a list of samples, each sample is a dict with
             patient_id, record_id, and other task-specific attributes as key.
@@ -146,14 +153,25 @@ class SampleSignalDataset(SampleBaseDataset):
         """
         input_info = {}
         # get signal info
-        sample_path_0 = self.samples[0]["epoch_path"]
-        sample = pickle.load(open(sample_path_0, "rb"))
+        sample = self._load_epoch(self.samples[0])
         n_channels, length = sample["signal"].shape
         input_info["signal"] = {"length": length, "n_channels": n_channels}
         # get label signal info
         input_info["label"] = {"type": str, "dim": 0}
         return input_info
 
+    @staticmethod
+    def _load_epoch(sample: Dict) -> Dict:
+        """Helper function which loads the saved epoch of a sample.
+
+        Returns:
+            Dict, the saved attributes of the epoch (e.g., the signal).
+        """
+        if "epoch_index" in sample:
+            return {"signal": load_epoch(sample["epoch_path"], sample["epoch_index"])}
+        with open(sample["epoch_path"], "rb") as f:
+            return pickle.load(f)
+
     def __getitem__(self, index) -> Dict:
         """Returns a sample by index.
 
@@ -163,10 +181,11 @@ class SampleSignalDataset(SampleBaseDataset):
                 in the model.
         """
         sample = self.samples[index]
-        loaded_sample = pickle.load(open(sample["epoch_path"], "rb"))
+        loaded_sample = self._load_epoch(sample)
         cur_sample = sample.copy()
         cur_sample.update(loaded_sample)
         cur_sample.pop("epoch_path", None)
+        cur_sample.pop("epoch_index", None)
         return cur_sample
 
     def stat(self) -> str:
@@ -1,13 +1,23 @@
+import functools
 import hashlib
+import inspect
+import math
+import multiprocessing
 import os
+import zlib
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, List, Mapping, Tuple, Optional
 import pickle
 
+import numpy as np
+import pandas as pd
+import torch
 from dateutil.parser import parse as dateutil_parse
 from torch.utils.data import DataLoader
+from tqdm import tqdm
 
 from pyhealth import BASE_CACHE_PATH
+from pyhealth.profiler import record_phase
 from pyhealth.utils import create_directory
 
 MODULE_CACHE_PATH = os.path.join(BASE_CACHE_PATH, "datasets")
@@ -25,6 +35,90 @@ def hash_str(s):
     return hashlib.md5(s.encode()).hexdigest()
 
 
+def hash_task_fn(task_fn: Callable) -> str:
+    """Helper function which hashes a task function.
+
+    The hash covers the qualified name and source code of the function, and
+    the pickled values of its default arguments, its closure variables and
+    the arguments bound by `functools.partial` (or the attributes of a
+    callable object). Functions called by `task_fn` are not covered.
+
+    Args:
+        task_fn: the task function (a function, a `functools.partial` or a
+            callable object).
+
+    Returns:
+        str, the hash of the task function.
+
+    Raises:
+        ValueError: if the source code of the function is not available (e.g.,
+            defined in an interactive session), or if its bound values cannot
+            be pickled.
+    """
+    values = []
+    while isinstance(task_fn, functools.partial):
+        values.extend([task_fn.args, sorted(task_fn.keywords.items())])
+        task_fn = task_fn.func
+    if not inspect.isfunction(task_fn) and not inspect.ismethod(task_fn):
+        # a callable object, hash its class and its attributes
+        values.append(sorted(vars(task_fn).items()))
+        task_fn = type(task_fn)
+    else:
+        closure = getattr(task_fn, "__closure__", None) or []
+        values.extend(
+            [
+                task_fn.__defaults__,
+                task_fn.__kwdefaults__,
+                [cell.cell_contents for cell in closure],
+            ]
+        )
+    try:
+        source = inspect.getsource(task_fn)
+    except (OSError, TypeError) as e:
+        raise ValueError(
+            f"Cannot hash {task_fn.__qualname__}, its source code is not available"
+        ) from e
+    try:
+        # unlike repr(), pickle does not embed the memory address of objects
+        pickled_values = pickle.dumps(values)
+    except Exception as e:
+        raise ValueError(
+            f"Cannot hash {task_fn.__qualname__}, its bound values cannot be pickled"
+        ) from e
+    md5 = hashlib.md5(f"{task_fn.__module__}.{task_fn.__qualname__}".encode())
+    md5.update(source.encode())
+    md5.update(pickled_values)
+    return md5.hexdigest()
+
+
+def estimate_num_rows(filepath: str, sample_size: int = 2**20) -> Optional[int]:
+    """Helper function which estimates the number of rows of a csv file.
+
+    The number of lines in the first `sample_size` bytes of the file is
+    extrapolated to the size of the file. Gzip-compressed files (".gz") are
+    supported, the sample is then decompressed.
+
+    Args:
+        filepath: path to the csv file.
+        sample_size: number of bytes read. Default is 1 MB.
+
+    Returns:
+        int, the estimated number of rows (including the header), or None if
+            the file is not a local file (e.g., a URL).
+    """
+    if not os.path.isfile(filepath):
+        return None
+    with open(filepath, "rb") as f:
+        sample = f.read(sample_size)
+    if len(sample) == 0:
+        return 0
+    data = sample
+    if filepath.endswith(".gz"):
+        data = zlib.decompressobj(wbits=31).decompress(sample)
+    num_lines = max(data.count(b"\n"), 1)
+    return math.ceil(num_lines * os.path.getsize(filepath) / len(sample))
+
+
 def strptime(s: str) -> Optional[datetime]:
     """Helper function which parses a string to datetime object.
 
@@ -39,6 +133,27 @@ def strptime(s: str) -> Optional[datetime]:
         return None
     return dateutil_parse(s)
 
+
+def to_datetime_array(s: pd.Series) -> np.ndarray:
+    """Helper function which converts a series to an array of datetime objects.
+
+    This is the vectorized version of `strptime()`: strings are parsed in a
+    single pass by pandas, and missing values are converted to None.
+
+    Args:
+        s: pd.Series, series of strings or datetime64 values.
+
+    Returns:
+        np.ndarray, object array of datetime objects (or None if missing).
+    """
+    try:
+        s = pd.to_datetime(s)
+    except (pd.errors.OutOfBoundsDatetime, ValueError):
+        # e.g., 9999-12-31 cannot be represented in nanoseconds, or mixed formats
+        return np.array([strptime(v) for v in s], dtype=object)
+    return np.where(s.isna(), None, s.dt.to_pydatetime())
+
+
 def padyear(year: str, month='1', day='1') -> str:
     """Pad a date time year of format 'YYYY' to format 'YYYY-MM-DD'
     
@@ -133,17 +248,163 @@ def is_homo_list(l: List) -> bool:
     return all(isinstance(i, type(l[0])) for i in l)
 
 
+# per-worker state of `apply_task_fn`, set by `_init_task_worker`
+_worker_task_fn: Optional[Callable] = None
+_worker_patients: Optional[Mapping] = None
+
+
+def _init_task_worker(task_fn: Callable, patients: Mapping) -> None:
+    global _worker_task_fn, _worker_patients
+    _worker_task_fn = task_fn
+    _worker_patients = patients
+
+
+def _apply_task_chunk(patient_ids: List[str]) -> List[Dict]:
+    samples = []
+    for patient_id in patient_ids:
+        samples.extend(_worker_task_fn(_worker_patients[patient_id]))
+    return samples
+
+
+def apply_task_fn(
+    task_fn: Callable,
+    patients: Mapping,
+    num_workers: int = 1,
+    chunksize: Optional[int] = None,
+    desc: Optional[str] = None,
+) -> List[Dict]:
+    """Applies a task function to all patients and concatenates the samples.
+
+    With `num_workers > 1`, patients are sharded into chunks which are dispatched
+    to a process pool. The samples are always returned in the order of
+    `patients`, regardless of the number of workers.
+
+    On platforms supporting "fork", the workers inherit `task_fn` and `patients`
+    from the parent process, so neither needs to be picklable (e.g., lambdas
+    work). Otherwise, both are pickled once per worker.
+
+    Args:
+        task_fn: a function that takes a single patient and returns a list of
+            samples.
+        patients: a dict mapping patient_id to patient.
+        num_workers: number of worker processes. Default is 1, which runs in
+            the main process.
+        chunksize: number of patients per chunk. Default is None, which splits
+            the patients into about 16 chunks per worker.
+        desc: description of the progress bar. Default is None.
+
+    Returns:
+        A list of samples.
+    """
+    if num_workers <= 1:
+        samples = []
+        for patient in tqdm(patients.values(), total=len(patients), desc=desc):
+            samples.extend(task_fn(patient))
+        return samples
+
+    patient_ids = list(patients.keys())
+    if chunksize is None:
+        chunksize = max(1, len(patient_ids) // (num_workers * 16))
+    chunks = [
+        patient_ids[i : i + chunksize] for i in range(0, len(patient_ids), chunksize)
+    ]
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    samples = []
+    with context.Pool(
+        num_workers, initializer=_init_task_worker, initargs=(task_fn, patients)
+    ) as pool, tqdm(total=len(patient_ids), desc=desc) as progress:
+        # imap keeps the chunk order, so the samples are deterministic
+        for chunk, chunk_samples in zip(chunks, pool.imap(_apply_task_chunk, chunks)):
+            samples.extend(chunk_samples)
+            progress.update(len(chunk))
+    return samples
+
+
 def collate_fn_dict(batch):
     return {key: [d[key] for d in batch] for key in batch[0]}
 
 
-def get_dataloader(dataset, batch_size, shuffle=False):
+def collate_fn_encode(batch, feature_tokenizers: Dict, feature_dims: Dict[str, int]):
+    """Collates a batch and encodes the token features into padded tensors.
+
+    This moves the tokenization out of `model.forward()`: when used as the
+    `collate_fn` of a DataLoader with `num_workers > 0`, the string lookups and
+    the padding run in the worker processes, and the models directly receive
+    LongTensors of shape (patient, event) or (patient, visit, event) padded
+    with the index of "<pad>".
+
+    Usually not called directly, see `BaseModel.get_collate_fn()`.
+
+    Args:
+        batch: a list of samples.
+        feature_tokenizers: a dict mapping feature keys to their tokenizers.
+        feature_dims: a dict mapping feature keys to the dimension of the
+            features (2 for [code1, code2, ...], 3 for [[code1, code2], ...]).
+
+    Returns:
+        A dict of batched features, with the token features encoded.
+    """
+    data = collate_fn_dict(batch)
+    with record_phase("tokenization"):
+        for key, tokenizer in feature_tokenizers.items():
+            if feature_dims[key] == 2:
+                indices, _ = tokenizer.batch_encode_2d_array(data[key])
+            elif feature_dims[key] == 3:
+                indices, _ = tokenizer.batch_encode_3d_array(data[key])
+            else:
+                continue
+            data[key] = torch.from_numpy(indices)
+    return data
+
+
+def get_dataloader(
+    dataset,
+    batch_size,
+    shuffle=False,
+    collate_fn: Optional[Callable] = None,
+    num_workers: int = 0,
+    bucket_by_length: bool = False,
+):
+    """Gets a DataLoader yielding dicts of batched samples.
+
+    Args:
+        dataset: the sample dataset (or a subset of it).
+        batch_size: number of samples per batch.
+        shuffle: whether to shuffle the samples. Default is False.
+        collate_fn: the function collating the samples. Default is None,
+            which uses `collate_fn_dict`. Pass `model.get_collate_fn()` to
+            encode the features in the DataLoader instead of in the model.
+        num_workers: number of DataLoader worker processes. Default is 0,
+            which loads the batches in the main process.
+        bucket_by_length: whether to batch samples of similar numbers of
+            visits and codes per visit together, which reduces the padding.
+            See `pyhealth.sampler.BucketBatchSampler`. Default is False.
 
+    Returns:
+        A DataLoader.
+    """
+    if collate_fn is None:
+        collate_fn = collate_fn_dict
+    if bucket_by_length:
+        # imported here as pyhealth.sampler also loads the graph samplers
+        from pyhealth.sampler import BucketBatchSampler
+
+        batch_sampler = BucketBatchSampler(dataset, batch_size, shuffle=shuffle)
+        return DataLoader(
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=collate_fn,
+            num_workers=num_workers,
+        )
     dataloader = DataLoader(
         dataset,
         batch_size=batch_size,
         shuffle=shuffle,
-        collate_fn=collate_fn_dict,
+        collate_fn=collate_fn,
+        num_workers=num_workers,
     )
 
     return dataloader
@@ -1,7 +1,7 @@
 import logging
 import os
 from collections import defaultdict
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict, Tuple
 from urllib.error import HTTPError
 
 import pyhealth.medcode as medcode
@@ -56,6 +56,8 @@ class CrossMap:
         # load source and target vocabulary classes
         self.s_class = getattr(medcode, source_vocabulary)()
         self.t_class = getattr(medcode, target_vocabulary)()
+        # memoized results of self.map()
+        self.cache: Dict[Tuple, List[str]] = {}
         return
 
     def __repr__(self):
@@ -104,13 +106,72 @@ class CrossMap:
 
         Returns:
             A list of target codes.
+
+        Note:
+            Results are memoized in `self.cache`, so mapping the same code again
+                is a dict lookup. Call `self.clear_cache()` to free the memory.
         """
         if source_kwargs is None:
             source_kwargs = {}
         if target_kwargs is None:
             target_kwargs = {}
+        try:
+            key = (
+                source_code,
+                tuple(sorted(source_kwargs.items())),
+                tuple(sorted(target_kwargs.items())),
+            )
+            hash(key)
+        except TypeError:
+            # unhashable kwargs, do not memoize
+            key = None
+        if key is not None and key in self.cache:
+            return list(self.cache[key])
+        target_codes = self._map(source_code, source_kwargs, target_kwargs)
+        if key is not None:
+            self.cache[key] = target_codes
+        return list(target_codes)
+
+    def _map(
+        self, source_code: str, source_kwargs: Dict, target_kwargs: Dict
+    ) -> List[str]:
+        """Helper function which maps a source code without memoization."""
         source_code = self.s_class.standardize(source_code)
         source_code = self.s_class.convert(source_code, **source_kwargs)
-        target_codes = self.mapping[source_code]
+        # use get() to not insert missing codes into the defaultdict
+        target_codes = self.mapping.get(source_code, [])
         target_codes = [self.t_class.convert(c, **target_kwargs) for c in target_codes]
-        return target_codes
\ No newline at end of file
+        return target_codes
+
+    def map_codes(
+        self,
+        source_codes: Iterable[str],
+        source_kwargs: Optional[Dict] = None,
+        target_kwargs: Optional[Dict] = None,
+    ) -> Dict[str, List[str]]:
+        """Maps a collection of source codes, computing each unique code once.
+
+        Args:
+            source_codes: source codes (may contain duplicates).
+            source_kwargs: additional arguments for the source codes. Will be
+                passed to `self.s_class.convert()`. Default is empty dict.
+            target_kwargs: additional arguments for the target codes. Will be
+                passed to `self.t_class.convert()`. Default is empty dict.
+
+        Returns:
+            A dict mapping each unique source code to its list of target codes.
+
+        Examples:
+            >>> from pyhealth.medcode import CrossMap
+            >>> mapping = CrossMap("ICD9CM", "CCSCM")
+            >>> mapping.map_codes(["428.0", "428.0", "427.31"])
+            {'428.0': ['108'], '427.31': ['106']}
+        """
+        return {
+            code: self.map(code, source_kwargs, target_kwargs)
+            for code in dict.fromkeys(source_codes)
+        }
+
+    def clear_cache(self):
+        """Clears the memoized results of `self.map()`."""
+        self.cache.clear()
\ No newline at end of file
@@ -1,17 +1,100 @@
 import logging
 import os
+import pickle
+import shutil
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 import pyhealth.medcode as medcode
 from pyhealth.medcode.utils import MODULE_CACHE_PATH, download_and_read_csv
-from pyhealth.utils import load_pickle, save_pickle
+from pyhealth.utils import load_json, load_pickle, save_json
 
 logger = logging.getLogger(__name__)
 
+# bump this whenever the on-disk layout changes so that stale caches are rebuilt
+COMPACT_VERSION = 2
+
+
+def _to_csr(
+    num_nodes: int, rows: np.ndarray, cols: np.ndarray, *data: np.ndarray
+) -> Tuple[np.ndarray, ...]:
+    """Helper function which converts (row, col) pairs to CSR arrays.
+
+    Pairs are sorted by row with a stable sort, so the order of the columns
+    of each row is kept.
+
+    Returns:
+        The indptr array, the indices array, and the reordered data arrays.
+    """
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return (indptr, cols[order].astype(np.int32)) + tuple(d[order] for d in data)
+
+
+def _graph_to_columns(
+    graph: nx.DiGraph,
+) -> Tuple[List[str], Dict[str, List], List[Tuple[int, int]]]:
+    """Helper function which converts a code graph to codes, attributes and edges."""
+    codes = list(graph.nodes)
+    code_to_id = {code: i for i, code in enumerate(codes)}
+    attributes = {}
+    for i, (_, attr) in enumerate(graph.nodes(data=True)):
+        for key, value in attr.items():
+            attributes.setdefault(key, [None] * len(codes))[i] = value
+    edges = [(code_to_id[u], code_to_id[v]) for u, v in graph.edges]
+    return codes, attributes, edges
+
+
+def _df_to_columns(
+    df: pd.DataFrame,
+) -> Tuple[List[str], Dict[str, List], List[Tuple[int, int]]]:
+    """Helper function which converts a vocabulary csv to codes, attributes and edges.
+
+    The result is the same as building the code graph with one node per row
+    (the last row wins for duplicate codes) and one edge per parent code.
+    """
+    codes = list(dict.fromkeys(df["code"]))
+    if "parent_code" in df.columns:
+        # parent codes without a row are added as codes without attributes
+        parents = df["parent_code"].dropna()
+        known = set(codes)
+        codes += [c for c in dict.fromkeys(parents) if c not in known]
+    code_to_id = {code: i for i, code in enumerate(codes)}
+    rows = df.drop_duplicates("code", keep="last").set_index("code")
+    rows = rows.drop(columns="parent_code", errors="ignore").reindex(codes)
+    attributes = {column: rows[column].tolist() for column in rows.columns}
+    edges = []
+    if "parent_code" in df.columns:
+        edge_df = df[["parent_code", "code"]].dropna().drop_duplicates()
+        edges = list(
+            zip(
+                edge_df["parent_code"].map(code_to_id),
+                edge_df["code"].map(code_to_id),
+            )
+        )
+    return codes, attributes, edges
+
+
+def _attribute_array(values: List) -> Tuple[pa.Array, bool]:
+    """Helper function which converts attribute values to an arrow array.
+
+    Missing values (None or nan) are stored as nulls. Values other than strings
+    are pickled into a binary column.
+
+    Returns:
+        The arrow array and whether the values were pickled.
+    """
+    values = [None if isinstance(v, float) and np.isnan(v) else v for v in values]
+    if all(v is None or isinstance(v, str) for v in values):
+        return pa.array(values, type=pa.string()), False
+    values = [None if v is None else pickle.dumps(v) for v in values]
+    return pa.array(values, type=pa.binary()), True
 
 # TODO: add this callable method: InnerMap(vocab)
 class InnerMap(ABC):
@@ -21,6 +104,12 @@ class InnerMap(ABC):
     It will be instantiated as a specific medical code system with
     `InnerMap.load(vocabulary).`
 
+    The code system is cached in a compact on-disk format: codes and their
+    attributes are stored in an arrow table, and the parent/child relations
+    as CSR arrays over integer code ids. Both are memory-mapped when loaded,
+    so loading a code system does not unpickle a full graph. The networkx
+    graph is still available as `self.graph`, and is only built on access.
+
     Note:
         This class cannot be instantiated using `__init__()` (throws an error).
     """
@@ -34,33 +123,137 @@ class InnerMap(ABC):
         # abstractmethod prevents initialization of this class
         self.vocabulary = vocabulary
 
+        self.root = os.path.join(MODULE_CACHE_PATH, self.vocabulary)
         pickle_filepath = os.path.join(MODULE_CACHE_PATH, self.vocabulary + ".pkl")
         csv_filename = self.vocabulary + ".csv"
-        if os.path.exists(pickle_filepath) and (not refresh_cache):
-            logger.debug(f"Loaded {vocabulary} code from {pickle_filepath}")
-            self.graph = load_pickle(pickle_filepath)
+        if self._is_valid_cache() and (not refresh_cache):
+            logger.debug(f"Loaded {vocabulary} code from {self.root}")
+        elif os.path.exists(pickle_filepath) and (not refresh_cache):
+            # convert the graph pickle of older versions
+            logger.debug(f"Converting {vocabulary} code from {pickle_filepath}")
+            self._write(*_graph_to_columns(load_pickle(pickle_filepath)))
         else:
             logger.debug(f"Processing {vocabulary} code...")
             df = download_and_read_csv(csv_filename, refresh_cache)
-            # create graph
-            df = df.set_index("code")
-            self.graph = nx.DiGraph()
-            # add nodes
-            for code, row in df.iterrows():
-                row_dict = row.to_dict()
-                row_dict.pop("parent_code", None)
-                self.graph.add_node(code, **row_dict)
-            # add edges
-            for code, row in df.iterrows():
-                if "parent_code" in row:
-                    if not pd.isna(row["parent_code"]):
-                        self.graph.add_edge(row["parent_code"], code)
-            logger.debug(f"Saved {vocabulary} code to {pickle_filepath}")
-            save_pickle(self.graph, pickle_filepath)
+            self._write(*_df_to_columns(df))
+            logger.debug(f"Saved {vocabulary} code to {self.root}")
+        self._open()
         return
 
+    def _is_valid_cache(self) -> bool:
+        meta_filepath = os.path.join(self.root, "meta.json")
+        if not os.path.exists(meta_filepath):
+            return False
+        return load_json(meta_filepath)["version"] == COMPACT_VERSION
+
+    def _write(
+        self,
+        codes: List[str],
+        attributes: Dict[str, List],
+        edges: List[Tuple[int, int]],
+    ):
+        """Helper function which writes the code system to `self.root`.
+
+        The code system is first written to a temporary directory and then
+        moved to `self.root`, so an interrupted write never leaves a partial
+        cache behind.
+
+        Args:
+            codes: list of codes. The index of a code is its id.
+            attributes: dict mapping each attribute name to the list of values
+                of all codes.
+            edges: list of (parent id, child id) pairs.
+        """
+        tmp_root = self.root + ".tmp"
+        if os.path.exists(tmp_root):
+            shutil.rmtree(tmp_root)
+        os.makedirs(tmp_root)
+
+        arrays, pickled = {"code": pa.array(codes, type=pa.string())}, []
+        for name, values in attributes.items():
+            arrays[name], is_pickled = _attribute_array(values)
+            if is_pickled:
+                pickled.append(name)
+        table = pa.table(arrays)
+        with pa.OSFile(os.path.join(tmp_root, "codes.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        parents, children = edges[:, 0], edges[:, 1]
+        indptr, indices = _to_csr(len(codes), children, parents)
+        np.save(os.path.join(tmp_root, "parents_indptr.npy"), indptr)
+        np.save(os.path.join(tmp_root, "parents_indices.npy"), indices)
+        indptr, indices = _to_csr(len(codes), parents, children)
+        np.save(os.path.join(tmp_root, "children_indptr.npy"), indptr)
+        np.save(os.path.join(tmp_root, "children_indices.npy"), indices)
+
+        # meta.json is written last and marks the cache as complete
+        save_json(
+            {"version": COMPACT_VERSION, "pickled": pickled},
+            os.path.join(tmp_root, "meta.json"),
+        )
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        os.rename(tmp_root, self.root)
+
+    def _load_array(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.root, f"{name}.npy"), mmap_mode="r")
+
+    def _open(self):
+        """Helper function which memory-maps the code system in `self.root`."""
+        self._pickled = load_json(os.path.join(self.root, "meta.json"))["pickled"]
+        source = pa.memory_map(os.path.join(self.root, "codes.arrow"), "r")
+        self._table = pa.ipc.open_file(source).read_all()
+        self._codes: List[str] = self._table.column("code").to_pylist()
+        self._code_to_id: Dict[str, int] = {c: i for i, c in enumerate(self._codes)}
+        self._parents = (
+            self._load_array("parents_indptr"),
+            self._load_array("parents_indices"),
+        )
+        self._children = (
+            self._load_array("children_indptr"),
+            self._load_array("children_indices"),
+        )
+        # ancestor and descendant closures, built on the first query
+        self._closure: Dict[str, Tuple[np.ndarray, ...]] = {}
+        self._graph = None
+
+    def __getstate__(self):
+        # memory maps cannot be pickled, re-open the cache instead
+        return {"vocabulary": self.vocabulary, "root": self.root}
+
+    def __setstate__(self, state):
+        self.vocabulary = state["vocabulary"]
+        self.root = state["root"]
+        self._open()
+
+    @property
+    def graph(self) -> nx.DiGraph:
+        """Returns the code system as a networkx graph.
+
+        Each node is a code with its attributes, and each edge goes from a
+        parent code to a child code. The graph is built on first access.
+        """
+        if self._graph is None:
+            graph = nx.DiGraph()
+            attributes = self.available_attributes
+            columns = [self._get_column(a) for a in attributes]
+            for code, values in zip(self._codes, zip(*columns)):
+                graph.add_node(code, **dict(zip(attributes, values)))
+            indptr, indices = self._children
+            for i, code in enumerate(self._codes):
+                for j in indices[indptr[i] : indptr[i + 1]]:
+                    graph.add_edge(code, self._codes[j])
+            self._graph = graph
+        return self._graph
+
     def __repr__(self):
-        return f"InnerMap(vocabulary={self.vocabulary}, graph={self.graph})"
+        return (
+            f"InnerMap(vocabulary={self.vocabulary}, "
+            f"graph=DiGraph with {len(self._codes)} nodes and "
+            f"{len(self._children[1])} edges)"
+        )
 
     @classmethod
     def load(_, vocabulary: str, refresh_cache: bool = False):
@@ -88,14 +281,14 @@ class InnerMap(ABC):
         Returns:
             List of available attributes.
         """
-        return list(list(self.graph.nodes.values())[0].keys())
+        return [c for c in self._table.column_names if c != "code"]
 
     def stat(self):
         """Prints statistics of the code system."""
         print()
         print(f"Statistics for {self.vocabulary}:")
-        print(f"\t- Number of nodes: {len(self.graph.nodes)}")
-        print(f"\t- Number of edges: {len(self.graph.edges)}")
+        print(f"\t- Number of nodes: {len(self._codes)}")
+        print(f"\t- Number of edges: {len(self._children[1])}")
         print(f"\t- Available attributes: {self.available_attributes}")
         print()
 
@@ -129,49 +322,169 @@ class InnerMap(ABC):
             The attribute value of the code.
         """
         code = self.standardize(code)
-        return self.graph.nodes[code][attribute]
+        index = self._code_to_id[code]
+        if attribute not in self.available_attributes:
+            raise KeyError(attribute)
+        return self._decode(attribute, self._table.column(attribute)[index].as_py())
+
+    def _decode(self, attribute: str, value):
+        """Helper function which converts a stored attribute value back."""
+        if value is None:
+            # missing values are nan in the vocabulary csv
+            return float("nan")
+        if attribute in self._pickled:
+            return pickle.loads(value)
+        return value
+
+    def _get_column(self, attribute: str) -> List:
+        """Helper function which returns the values of an attribute for all codes."""
+        values = self._table.column(attribute).to_pylist()
+        return [self._decode(attribute, v) for v in values]
 
     def __contains__(self, code: str) -> bool:
         """Checks if the code is in the code system."""
         code = self.standardize(code)
-        return code in self.graph.nodes
+        return code in self._code_to_id
 
-    def get_ancestors(self, code: str) -> List[str]:
+    def _build_closure(self, kind: str) -> Tuple[np.ndarray, ...]:
+        """Helper function which builds the ancestor or descendant closure.
+
+        For each code, the closure holds all its ancestors (resp. descendants)
+        with their depth (i.e., shortest path length to the code), ordered from
+        the closest to the farthest and then by code.
+
+        Args:
+            kind: "ancestors" or "descendants".
+
+        Returns:
+            The closure as CSR arrays: indptr, indices (code ids) and depths.
+        """
+        indptr, indices = self._parents if kind == "ancestors" else self._children
+        indptr, indices = indptr.tolist(), indices.tolist()
+        codes = self._codes
+        rows, cols, depths = [], [], []
+        for i in range(len(codes)):
+            # BFS gives the shortest path length to all reachable codes
+            seen, frontier, depth, closure = {i}, [i], 0, []
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for j in frontier:
+                    for k in indices[indptr[j] : indptr[j + 1]]:
+                        if k not in seen:
+                            seen.add(k)
+                            next_frontier.append(k)
+                            closure.append((depth, codes[k], k))
+                frontier = next_frontier
+            closure.sort()
+            rows.extend([i] * len(closure))
+            cols.extend(k for _, _, k in closure)
+            depths.extend(d for d, _, _ in closure)
+        return _to_csr(
+            len(codes),
+            np.asarray(rows, dtype=np.int64),
+            np.asarray(cols, dtype=np.int64),
+            np.asarray(depths, dtype=np.int32),
+        )
+
+    def _get_closure(
+        self, kind: str, code: str, max_depth: Optional[int] = None
+    ) -> List[str]:
+        """Helper function which looks up the closure of a code.
+
+        The closure is built once per vocabulary on the first query and cached
+        alongside the code system.
+        """
+        if kind not in self._closure:
+            try:
+                self._closure[kind] = tuple(
+                    self._load_array(f"{kind}_{name}")
+                    for name in ["indptr", "indices", "depths"]
+                )
+            except FileNotFoundError:
+                logger.debug(f"Processing {self.vocabulary} {kind}...")
+                arrays = self._build_closure(kind)
+                for name, array in zip(["indptr", "indices", "depths"], arrays):
+                    filepath = os.path.join(self.root, f"{kind}_{name}")
+                    # write to a temporary file first to never leave a partial one
+                    np.save(filepath + ".tmp.npy", array)
+                    os.replace(filepath + ".tmp.npy", filepath + ".npy")
+                self._closure[kind] = arrays
+        code = self.standardize(code)
+        if code not in self._code_to_id:
+            raise nx.NetworkXError(f"The node {code} is not in the digraph.")
+        indptr, indices, depths = self._closure[kind]
+        index = self._code_to_id[code]
+        start, end = indptr[index], indptr[index + 1]
+        if max_depth is not None:
+            end = start + np.searchsorted(depths[start:end], max_depth, side="right")
+        return [self._codes[i] for i in indices[start:end]]
+
+    def get_ancestors(self, code: str, max_depth: Optional[int] = None) -> List[str]:
         """Gets the ancestors of the code.
 
         Args:
             code: code to look up.
+            max_depth: only returns the ancestors within this number of levels
+                above the code. Default is None, which returns all ancestors.
 
         Returns:
             List of ancestors ordered from the closest to the farthest.
         """
-        code = self.standardize(code)
-        # ordered ancestors
-        ancestors = nx.ancestors(self.graph, code)
-        ancestors = list(ancestors)
-        ancestors = sorted(
-            ancestors, key=lambda x: (nx.shortest_path_length(self.graph, x, code), x)
-        )
-        return ancestors
+        return self._get_closure("ancestors", code, max_depth)
 
-    def get_descendants(self, code: str) -> List[str]:
+    def get_descendants(
+        self, code: str, max_depth: Optional[int] = None
+    ) -> List[str]:
         """Gets the descendants of the code.
 
         Args:
             code: code to look up.
+            max_depth: only returns the descendants within this number of levels
+                below the code. Default is None, which returns all descendants.
 
         Returns:
-            List of ancestors ordered from the closest to the farthest.
+            List of descendants ordered from the closest to the farthest.
         """
-        code = self.standardize(code)
-        # ordered descendants
-        descendants = nx.descendants(self.graph, code)
-        descendants = list(descendants)
-        descendants = sorted(
-            descendants, key=lambda x: (nx.shortest_path_length(self.graph, code, x), x)
-        )
-        return descendants
+        return self._get_closure("descendants", code, max_depth)
 
+    def batch_get_ancestors(
+        self, codes: List[str], max_depth: Optional[int] = None
+    ) -> List[List[str]]:
+        """Gets the ancestors of a list of codes.
+
+        Args:
+            codes: codes to look up.
+            max_depth: only returns the ancestors within this number of levels
+                above each code. Default is None, which returns all ancestors.
+
+        Returns:
+            List of ancestors of each code, ordered from the closest to the
+                farthest.
+
+        Examples:
+            >>> from pyhealth.medcode import InnerMap
+            >>> icd9cm = InnerMap.load("ICD9CM")
+            >>> icd9cm.batch_get_ancestors(["428.0", "427.31"], max_depth=1)
+            [['428'], ['427.3']]
+        """
+        return [self.get_ancestors(code, max_depth) for code in codes]
+
+    def batch_get_descendants(
+        self, codes: List[str], max_depth: Optional[int] = None
+    ) -> List[List[str]]:
+        """Gets the descendants of a list of codes.
+
+        Args:
+            codes: codes to look up.
+            max_depth: only returns the descendants within this number of levels
+                below each code. Default is None, which returns all descendants.
+
+        Returns:
+            List of descendants of each code, ordered from the closest to the
+                farthest.
+        """
+        return [self.get_descendants(code, max_depth) for code in codes]
 
 if __name__ == "__main__":
     icd9cm = InnerMap.load("ICD9CM")
@@ -3,6 +3,7 @@ import os
 from abc import ABC
 
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 from pandarallel import pandarallel
 from typing import Callable, Optional
@@ -15,7 +16,7 @@ logger = logging.getLogger(__name__)
 
 INFO_MSG = """
 dataset.triples:
-    Array((<head_entity>, <relation>, <tail_entity>))
+    int32 array of shape (N, 3), with rows (<head_entity>, <relation>, <tail_entity>)
 """
 
 
@@ -62,7 +63,14 @@ class BaseKGDataset(ABC):
         args_to_hash = [self.dataset_name, root] + ["dev" if dev else "prod"]
         filename = hash_str("+".join([str(arg) for arg in args_to_hash]))
         self.filepath = os.path.join(MODULE_CACHE_PATH, filename)
-        self.raw_graph_process()
+        if os.path.exists(self.filepath + ".npz") and (not refresh_cache):
+            print(f"Loading {self.dataset_name} graph from {self.filepath}.npz")
+            self.load_graph()
+        else:
+            self.raw_graph_process()
+            self.triples = np.asarray(self.triples, dtype=np.int32).reshape(-1, 3)
+            print(f"Saving {self.dataset_name} graph to {self.filepath}.npz")
+            self.save_graph()
 
         self.len = len(self.triples)
 
@@ -75,10 +83,39 @@ class BaseKGDataset(ABC):
         return self.len
 
     def raw_graph_process(self):
-        """Process the raw graph to triples (a list of triple)
+        """Process the raw graph to triples (an int32 array of shape (N, 3), or a list of triple)
         """
         raise NotImplementedError
 
+    def save_graph(self):
+        """Saves the triples and the entity/relation vocabularies to `self.filepath`.npz
+        """
+        graph = {
+            "triples": self.triples,
+            "entity_num": self.entity_num,
+            "relation_num": self.relation_num,
+        }
+        # custom datasets may only set the numbers of entities and relations
+        if self.entity2id is not None:
+            graph["entities"] = np.array(list(self.entity2id))
+        if self.relation2id is not None:
+            graph["relations"] = np.array(list(self.relation2id))
+        np.savez(self.filepath + ".npz", **graph)
+
+    def load_graph(self):
+        """Loads the graph saved by `save_graph()`
+        """
+        with np.load(self.filepath + ".npz", allow_pickle=True) as graph:
+            self.triples = graph["triples"]
+            self.entity_num = int(graph["entity_num"])
+            self.relation_num = int(graph["relation_num"])
+            if "entities" in graph.files:
+                entities = graph["entities"].tolist()
+                self.entity2id = {val: i for i, val in enumerate(entities)}
+            if "relations" in graph.files:
+                relations = graph["relations"].tolist()
+                self.relation2id = {val: i for i, val in enumerate(relations)}
+
     @staticmethod
     def info():
         """Prints the output format."""
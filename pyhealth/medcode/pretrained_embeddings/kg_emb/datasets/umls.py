@@ -1,6 +1,5 @@
 import logging
 import os
-from tqdm import tqdm
 import numpy as np
 import pandas as pd
 from pandarallel import pandarallel
@@ -43,8 +42,11 @@ class UMLSDataset(BaseKGDataset):
         )
 
         print("Processing UMLS knowledge graph...")
-        entity_list = pd.unique(graph_df[['e1', 'e2']].values.ravel('K'))
-        relation_list = pd.unique(graph_df['r'].values)
+        # ids in order of first appearance, heads before tails, as pd.unique
+        entity_ids, entity_list = pd.factorize(
+            np.concatenate([graph_df['e1'].values, graph_df['e2'].values])
+        )
+        relation_ids, relation_list = pd.factorize(graph_df['r'].values)
 
         self.entity2id = {val: i for i, val in enumerate(entity_list)}
         self.relation2id = {val: i for i, val in enumerate(relation_list)}
@@ -52,9 +54,10 @@ class UMLSDataset(BaseKGDataset):
         self.relation_num = len(self.relation2id)
 
         print("Building UMLS knowledge graph...")
-        self.triples = [(self.entity2id[e1], self.relation2id[r], self.entity2id[e2]) 
-                        for e1, r, e2 in tqdm(zip(graph_df['e1'], graph_df['r'], graph_df['e2']), total=graph_df.shape[0])]
-
+        num_triples = graph_df.shape[0]
+        self.triples = np.stack(
+            [entity_ids[:num_triples], relation_ids, entity_ids[num_triples:]], axis=1
+        ).astype(np.int32)
 
         return
 
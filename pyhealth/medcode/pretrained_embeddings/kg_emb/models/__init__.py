@@ -1,4 +1,5 @@
 from .kg_base import KGEBaseModel
+from .ann import IVFIndex
 from .transe import TransE
 from .rotate import RotatE
 from .distmult import DistMult
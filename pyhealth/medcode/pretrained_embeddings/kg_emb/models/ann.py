@@ -0,0 +1,110 @@
+import math
+
+import torch
+
+
+class IVFIndex:
+    """ Inverted file (IVF) index for approximate nearest neighbor search over embeddings
+
+    The embeddings are clustered with k-means into n_lists lists. A query is only compared
+    with the embeddings of the n_probe lists with the closest centroids, instead of all of
+    them. Built locally with torch, on the device of the embeddings. The index keeps a copy of
+    the embeddings, so it is a snapshot: it should be rebuilt after the embeddings change.
+
+    Args:
+        embeddings: torch.Size([n, dim]), e.g., the entity embeddings E_emb.
+        n_lists: the number of lists (clusters). Default is None, which uses sqrt(n).
+        p: the p-norm of the distance. Default is 2.
+        n_iter: the number of k-means iterations. Default is 10.
+        chunk_size: the number of embeddings assigned to the centroids at once, the memory of the
+            search is bounded by 64 times chunk_size embeddings. Default is 65536.
+        seed: the random seed of the k-means initialization. Default is 0.
+    """
+
+    def __init__(self, embeddings, n_lists=None, p=2.0, n_iter=10, chunk_size=65536, seed=0):
+        # a copy, so that the embeddings always match the centroids and the lists
+        self.embeddings = embeddings.detach().clone()
+        self.p = p
+        self.chunk_size = chunk_size
+        n = len(self.embeddings)
+        if n_lists is None:
+            n_lists = int(math.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        # k-means, initialized with random embeddings
+        generator = torch.Generator().manual_seed(seed)
+        init = torch.randperm(n, generator=generator)[:n_lists].to(self.embeddings.device)
+        self.centroids = self.embeddings[init].clone()
+        for _ in range(n_iter):
+            assignment = self.assign(self.embeddings)
+            sums = torch.zeros_like(self.centroids).index_add_(0, assignment, self.embeddings)
+            counts = torch.bincount(assignment, minlength=n_lists)
+            # empty lists keep their centroid
+            nonempty = counts > 0
+            self.centroids[nonempty] = sums[nonempty] / counts[nonempty].unsqueeze(1).to(sums.dtype)
+
+        # lists as CSR: the embedding ids sorted by list, and the offset of each list
+        assignment = self.assign(self.embeddings)
+        self.ids = torch.argsort(assignment, stable=True)
+        self.sizes = torch.bincount(assignment, minlength=n_lists)
+        self.offsets = torch.cumsum(self.sizes, dim=0) - self.sizes
+
+    def assign(self, embeddings):
+        """ Gets the closest centroid of each embedding """
+        return torch.cat([
+            torch.cdist(embeddings[i : i + self.chunk_size], self.centroids, p=self.p).argmin(dim=1)
+            for i in range(0, len(embeddings), self.chunk_size)
+        ])
+
+    def search(self, queries, top_k=10, n_probe=8):
+        """ Searches the nearest embeddings of each query
+
+        Args:
+            queries: torch.Size([n_queries, dim]).
+            top_k: the number of neighbors per query.
+            n_probe: the number of lists searched per query. More lists are slower but
+                more accurate; n_probe = n_lists is an exact search.
+
+        Returns:
+            ids: torch.Size([n_queries, top_k]), the ids of the neighbors by increasing
+                distance, -1 if fewer than top_k embeddings are in the searched lists.
+            distances: torch.Size([n_queries, top_k]), their p-norm distances (inf for -1).
+        """
+        n_probe = min(n_probe, len(self.centroids))
+        probe = torch.cdist(queries, self.centroids, p=self.p).topk(n_probe, dim=1, largest=False).indices
+        if len(queries) == 0:
+            return probe.new_empty((0, top_k)), queries.new_empty((0, top_k))
+
+        # a few queries at a time, to bound the memory of their candidates
+        width = max(int(self.sizes[probe].sum(dim=1).max()), top_k)
+        step = max(1, self.chunk_size * 64 // (width * self.embeddings.size(1)))
+        ids, distances = zip(*[
+            self._search_lists(queries[i : i + step], probe[i : i + step], top_k)
+            for i in range(0, len(queries), step)
+        ])
+        return torch.cat(ids), torch.cat(distances)
+
+    def _search_lists(self, queries, probe, top_k):
+        """ Searches the nearest embeddings of each query within its probed lists """
+        n_queries, n_probe = probe.shape
+        # candidates of each query, padded with -1
+        sizes = self.sizes[probe].flatten()
+        segment = torch.repeat_interleave(torch.arange(len(sizes), device=sizes.device), sizes)
+        segment_start = torch.cumsum(sizes, dim=0) - sizes
+        position = torch.arange(len(segment), device=sizes.device) - segment_start[segment]
+        candidate_ids = self.ids[self.offsets[probe].flatten()[segment] + position]
+        row = segment // n_probe
+        row_sizes = self.sizes[probe].sum(dim=1)
+        row_start = torch.cumsum(row_sizes, dim=0) - row_sizes
+        column = torch.arange(len(segment), device=sizes.device) - row_start[row]
+        width = max(int(row_sizes.max()), top_k)
+        candidates = torch.full((n_queries, width), -1, dtype=torch.long, device=sizes.device)
+        candidates[row, column] = candidate_ids
+
+        # exact distances to the candidates
+        distances = torch.norm(
+            self.embeddings[candidates.clamp(min=0)] - queries.unsqueeze(1), p=self.p, dim=2
+        )
+        distances[candidates < 0] = float('inf')
+        distances, index = distances.topk(top_k, dim=1, largest=False)
+        return candidates.gather(1, index), distances
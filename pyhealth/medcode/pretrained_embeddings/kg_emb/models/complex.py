@@ -46,6 +46,20 @@ class ComplEx(KGEBaseModel):
         return reg_l3
 
 
+    def inference_score_entities(self, positive_sample, entities, mode):
+        # same scores as score_entities() up to rounding, as a matrix product with the entity embeddings
+        relation_re, relation_im = torch.chunk(self.R_emb[positive_sample[:, 1]], 2, dim=1)
+        if mode == 'head':
+            tail_re, tail_im = torch.chunk(self.E_emb[positive_sample[:, 2]], 2, dim=1)
+            re_score = relation_re * tail_re + relation_im * tail_im
+            im_score = relation_re * tail_im - relation_im * tail_re
+        else:
+            head_re, head_im = torch.chunk(self.E_emb[positive_sample[:, 0]], 2, dim=1)
+            re_score = head_re * relation_re - head_im * relation_im
+            im_score = head_re * relation_im + head_im * relation_re
+        return torch.cat([re_score, im_score], dim=1) @ entities.T
+
+
     def calc(self, head, relation, tail, mode='pos'):
         head_re, head_im = torch.chunk(head, 2, dim=2)
         relation_re, relation_im = torch.chunk(relation, 2, dim=2)
@@ -1,13 +1,109 @@
 from abc import ABC
-from pyhealth.datasets import SampleBaseDataset
+from functools import partial
+from itertools import chain
+from pyhealth.datasets import SampleBaseDataset, collate_fn_dict
 
 import torch
 import time
 import numpy as np
+from tqdm import tqdm
 import torch.nn as nn
 import torch.nn.functional as F
 
 
+def ground_truth_to_csr(ground_truth, e_num):
+    """ Converts the ground truth lists of a batch into sorted keys (row * e_num + entity)
+
+    Args:
+        ground_truth: a list (length: batch_size) of lists of ground truth entities.
+        e_num: the number of entities.
+
+    Returns:
+        keys: a sorted int64 array with an entry row * e_num + entity for each ground truth
+            entity of each row, i.e., the CSR (row, column) pairs flattened, which can be
+            searched with np.searchsorted.
+    """
+    lengths = [len(gt) for gt in ground_truth]
+    if sum(lengths) == 0:
+        return np.zeros(0, dtype=np.int64)
+    entities = np.fromiter(chain.from_iterable(ground_truth), dtype=np.int64, count=sum(lengths))
+    rows = np.repeat(np.arange(len(ground_truth), dtype=np.int64), lengths)
+    return np.unique(rows * e_num + entities)
+
+
+def in_ground_truth(keys, rows, entities, e_num):
+    """ Checks whether entities[i, j] is a ground truth entity of row rows[i]
+
+    Args:
+        keys: sorted keys of the ground truth, from `ground_truth_to_csr()`.
+        rows: int64 array of shape (n,).
+        entities: int64 array of shape (n, m).
+        e_num: the number of entities.
+
+    Returns:
+        a boolean array of shape (n, m).
+    """
+    if keys.size == 0:
+        return np.zeros(entities.shape, dtype=bool)
+    query = rows[:, None] * e_num + entities
+    position = np.minimum(np.searchsorted(keys, query), keys.size - 1)
+    return keys[position] == query
+
+
+def sample_negatives(ground_truth, e_num, negative_sampling):
+    """ Samples negative entities uniformly for a batch, with the ground truth filtered out
+
+    Candidates are drawn for all rows at once and rejected if they are ground truth
+    entities of their row; only the rows still missing negatives are drawn again.
+    The candidates are drawn with the torch random generator, so that this can run
+    in DataLoader workers (see `KGEBaseModel.get_collate_fn()`).
+
+    Args:
+        ground_truth: a list (length: batch_size) of lists of ground truth entities.
+        e_num: the number of entities.
+        negative_sampling: the number of negative entities per row.
+
+    Returns:
+        negative_sample: a LongTensor of shape (batch_size, negative_sampling).
+    """
+    keys = ground_truth_to_csr(ground_truth, e_num)
+    negative_sample = np.zeros((len(ground_truth), negative_sampling), dtype=np.int64)
+    filled = np.zeros(len(ground_truth), dtype=np.int64)
+    rows = np.arange(len(ground_truth), dtype=np.int64)
+    while rows.size > 0:
+        candidates = torch.randint(e_num, size=(rows.size, negative_sampling * 2)).numpy()
+        valid = ~in_ground_truth(keys, rows, candidates, e_num)
+        # keep the first valid candidates, up to the number of missing negatives
+        rank = np.cumsum(valid, axis=1) - 1
+        take = valid & (rank < (negative_sampling - filled[rows])[:, None])
+        i, j = np.nonzero(take)
+        negative_sample[rows[i], filled[rows[i]] + rank[i, j]] = candidates[i, j]
+        filled[rows] += take.sum(axis=1)
+        rows = rows[filled[rows] < negative_sampling]
+    return torch.from_numpy(negative_sample)
+
+
+def collate_fn_kg(batch, e_num):
+    """ Collates a batch of KG samples and samples the negatives of training batches
+
+    Usually not called directly, see `KGEBaseModel.get_collate_fn()`.
+
+    Args:
+        batch: a list of samples.
+        e_num: the number of entities.
+
+    Returns:
+        A dict of batched samples, with "negative_sample_head" and "negative_sample_tail"
+            LongTensors for training batches.
+    """
+    data = collate_fn_dict(batch)
+    if data['train'][0]:
+        negative_sampling = data['hyperparameters'][0]['negative_sampling']
+        data['negative_sample_head'] = sample_negatives(data['ground_truth_head'], e_num, negative_sampling)
+        data['negative_sample_tail'] = sample_negatives(data['ground_truth_tail'], e_num, negative_sampling)
+    return data
+
+
 class KGEBaseModel(ABC, nn.Module):
     """ Abstract class for Knowledge Graph Embedding models.
 
@@ -55,6 +151,9 @@ class KGEBaseModel(ABC, nn.Module):
         if gamma != None:
             self.margin = nn.Parameter(torch.Tensor([gamma]), requires_grad=False)
 
+        # number of entities scored at once in val/test
+        self.eval_chunk_size = 4096
+
         # used to query the device of the model
         self._dummy_param = nn.Parameter(torch.empty(0))
 
@@ -141,101 +240,170 @@ class KGEBaseModel(ABC, nn.Module):
         This function creates negative triples for training (sampling size: negative_sampling)
              with ground truth masked.
         """
-        negative_sample_head = []
-        negative_sample_tail = []
-        for i in range(len(gt_head)):
-            # head, relation, tail = triples[i]
-            
-            ## negative samples for head prediction
-            negative_sample_list_head = []
-            negative_sample_size_head = 0
-
-            while negative_sample_size_head < negative_sampling:
-                negative_sample = np.random.randint(self.e_num, size=negative_sampling*2)
-                mask = np.in1d(
-                    negative_sample,
-                    gt_head[i],
-                    assume_unique=True,
-                    invert=True
-                )
-                negative_sample = negative_sample[mask]
-                negative_sample_list_head.append(negative_sample)
-                negative_sample_size_head += negative_sample.size
-            
-            ## negative samples for tail prediction
-            negative_sample_list_tail = []
-            negative_sample_size_tail = 0
-
-            while negative_sample_size_tail < negative_sampling:
-                negative_sample = np.random.randint(self.e_num, size=negative_sampling*2)
-                mask = np.in1d(
-                    negative_sample,
-                    gt_tail[i],
-                    assume_unique=True,
-                    invert=True
-                )
-                negative_sample = negative_sample[mask]
-                negative_sample_list_tail.append(negative_sample)
-                negative_sample_size_tail += negative_sample.size
-
-            neg_head = torch.LongTensor(np.concatenate(negative_sample_list_head)[:negative_sampling])
-            neg_tail = torch.LongTensor(np.concatenate(negative_sample_list_tail)[:negative_sampling])
-            negative_sample_head.append(neg_head)
-            negative_sample_tail.append(neg_tail)
-        
-        negative_sample_head = torch.stack([d for d in negative_sample_head], dim=0)
-        negative_sample_tail = torch.stack([d for d in negative_sample_tail], dim=0)
-
+        negative_sample_head = sample_negatives(gt_head, self.e_num, negative_sampling)
+        negative_sample_tail = sample_negatives(gt_tail, self.e_num, negative_sampling)
         return negative_sample_head, negative_sample_tail
 
 
-    def test_neg_sample_filter_bias_gen(self, triples, gt_head, gt_tail):
+    def get_collate_fn(self):
+        """ Gets the collate function which samples the training negatives in the DataLoader
+
+        With `get_dataloader(..., collate_fn=model.get_collate_fn(), num_workers=n)`, the
+        negative sampling runs in the DataLoader workers instead of the training loop.
+        """
+        return partial(collate_fn_kg, e_num=self.e_num)
+
+
+    def score_all_entities(self, positive_sample, mode, chunk_size=None, score_fn=None):
+        """
+        (only run in val/test batch)
+        This function scores the query (?, r, t) (mode 'head') or (h, r, ?) (mode 'tail') of each
+            positive triple against all entities, chunk_size entities at a time. The entity
+            embeddings are broadcast instead of gathered, so the largest intermediate tensor is
+            (batch_size, chunk_size, e_dim) instead of (batch_size, e_num, e_dim).
+
+        Args:
+            score_fn: the function scoring a chunk, with the signature of `score_entities()`.
+                Default is None, which uses `score_entities()`.
+
+        Yields:
+            start: index of the first entity of the chunk.
+            score: torch.Size([batch_size, chunk_size]), the scores of the entities start, start + 1, ...
+        """
+        if chunk_size is None:
+            chunk_size = self.eval_chunk_size
+        if score_fn is None:
+            score_fn = self.score_entities
+        for start in range(0, self.e_num, chunk_size):
+            yield start, score_fn(positive_sample, self.E_emb[start : start + chunk_size], mode)
+
+
+    def score_entities(self, positive_sample, entities, mode):
+        """
+        This function scores the query (?, r, t) (mode 'head') or (h, r, ?) (mode 'tail') of each
+            positive triple against the given entity embeddings, with `calc()`, so that the scores
+            are the same as the scores of the triples computed by `data_process()` and `calc()`.
+
+        Args:
+            positive_sample: torch.Size([batch_size, 3])
+            entities: torch.Size([n, e_dim])
+
+        Returns:
+            score: torch.Size([batch_size, n])
+        """
+        relation = self.R_emb[positive_sample[:, 1]].unsqueeze(1)
+        entities = entities.unsqueeze(0)
+        if mode == 'head':
+            tail = self.E_emb[positive_sample[:, 2]].unsqueeze(1)
+            return self.calc(head=entities, relation=relation, tail=tail, mode='head')
+        head = self.E_emb[positive_sample[:, 0]].unsqueeze(1)
+        return self.calc(head=head, relation=relation, tail=entities, mode='tail')
+
+
+    def inference_score_entities(self, positive_sample, entities, mode):
         """
-        (only run in val/test batch) 
-        This function creates negative triples for validation/testing with ground truth masked.
+        This function scores the queries against the given entity embeddings for
+            `batch_inference()`. Models can override it with a faster equivalent of
+            `score_entities()`, whose scores may differ in the last bits (e.g., with a matrix
+            product), which changes the top-k only for ties.
         """
+        return self.score_entities(positive_sample, entities, mode)
+
 
-        negative_sample_head = []
-        negative_sample_tail = []
-        filter_bias_head = []
-        filter_bias_tail = []
+    def ground_truth_indices(self, ground_truth):
+        """
+        This function converts the ground truth lists of a batch into sparse (row, entity) indices.
+        """
+        keys = torch.from_numpy(ground_truth_to_csr(ground_truth, self.e_num)).to(self.device)
+        return keys // self.e_num, keys % self.e_num
 
-        for i in range(len(triples)):
-            head, _, tail = triples[i]
-            gt_h_ = gt_head[i]
-            gt_h = gt_h_[:]
-            gt_h.remove(head)
-            gt_t_ = gt_tail[i]
-            gt_t = gt_t_[:]
-            gt_t.remove(tail)
 
-            neg_head = np.arange(0, self.e_num)
-            neg_head[gt_h] = head
-            neg_head = torch.LongTensor(neg_head)
+    def filtered_scores(self, positive_sample, ground_truth, mode, chunk_size=None):
+        """
+        (only run in val/test batch)
+        This function scores the queries of the positive triples against all entities, with the
+            other ground truth entities of each query filtered: their score is set to the score
+            of the positive triple minus 1, so that they never rank above it.
 
-            neg_tail = np.arange(0, self.e_num)
-            neg_tail[gt_t] = tail
-            neg_tail = torch.LongTensor(neg_tail)
+        Returns:
+            score: torch.Size([batch_size, e_num])
+        """
+        score = torch.cat([score for _, score in self.score_all_entities(positive_sample, mode, chunk_size)], dim=1)
+        y_true = positive_sample[:, 0] if mode == 'head' else positive_sample[:, 2]
+        true_score = score.gather(1, y_true.unsqueeze(1)).squeeze(1)
+        rows, entities = self.ground_truth_indices(ground_truth)
+        mask = entities != y_true[rows]
+        rows, entities = rows[mask], entities[mask]
+        score[rows, entities] = true_score[rows] - 1
+        return score
 
-            fb_head = np.zeros(self.e_num)
-            fb_head[gt_h] = -1
-            fb_head = torch.LongTensor(fb_head)
 
-            fb_tail = np.zeros(self.e_num)
-            fb_tail[gt_t] = -1
-            fb_tail = torch.LongTensor(fb_tail)
+    def filtered_ranks(self, positive_sample, ground_truth, mode, chunk_size=None):
+        """
+        (only run in val/test batch)
+        This function computes the filtered rank of the positive triples for the queries
+            (?, r, t) (mode 'head') or (h, r, ?) (mode 'tail'), i.e., 1 + the number of
+            entities which are not ground truth of the query and score higher than the positive
+            triple. The entities are scored chunk by chunk and the dense scores are never
+            materialized, so the memory is bounded by batch_size x chunk_size.
 
-            negative_sample_head.append(neg_head)
-            negative_sample_tail.append(neg_tail)
-            filter_bias_head.append(fb_head)
-            filter_bias_tail.append(fb_tail)
+        Returns:
+            ranks: torch.Size([batch_size])
+        """
+        y_true = positive_sample[:, 0] if mode == 'head' else positive_sample[:, 2]
+        # the scores of the positive triples, with the same computation as the chunks
+        negative_sample = y_true.unsqueeze(1)
+        head, relation, tail = self.data_process((positive_sample, negative_sample), mode=mode)
+        true_score = self.calc(head=head, relation=relation, tail=tail, mode=mode)
+        # the ground truth includes the positive entity itself, which is never counted
+        rows, entities = self.ground_truth_indices(ground_truth)
+        ranks = torch.ones(len(positive_sample), dtype=torch.long, device=self.device)
+        for start, score in self.score_all_entities(positive_sample, mode, chunk_size):
+            in_chunk = (entities >= start) & (entities < start + score.size(1))
+            score[rows[in_chunk], entities[in_chunk] - start] = -float('inf')
+            ranks += (score > true_score).sum(dim=1)
+        return ranks
+
+
+    def evaluate_link_prediction(self, dataloader, chunk_size=None, hits=(1, 5, 10)):
+        """ Filtered link prediction evaluation, with bounded memory
+
+        Both the head and the tail of each triple of the dataloader are predicted. The filtered
+            ranks are computed by `filtered_ranks()` and accumulated batch by batch, so neither
+            the dense scores of a batch nor the predictions of the whole dataset are kept.
 
-        negative_sample_head = torch.stack([d for d in negative_sample_head], dim=0)
-        negative_sample_tail = torch.stack([d for d in negative_sample_tail], dim=0)
-        filter_bias_head = torch.stack([d for d in filter_bias_head], dim=0)
-        filter_bias_tail = torch.stack([d for d in filter_bias_tail], dim=0)
+        Args:
+            dataloader: a dataloader of val/test samples.
+            chunk_size: the number of entities scored at once. Default is None, which uses
+                `self.eval_chunk_size`.
+            hits: the k of the HITS@k metrics. Default is (1, 5, 10).
 
-        return negative_sample_head, negative_sample_tail, filter_bias_head, filter_bias_tail
+        Returns:
+            scores: a dict with the HITS@k, the mean_rank and the mean_reciprocal_rank, as the
+                "hits@n" and "mean_rank" metrics of `pyhealth.metrics.multiclass_metrics_fn`.
+        """
+        count = 0
+        rank_sum = 0.0
+        reciprocal_rank_sum = 0.0
+        hits_count = {k: 0 for k in hits}
+        self.eval()
+        with torch.no_grad():
+            for data in tqdm(dataloader, desc="Evaluation"):
+                positive_sample = torch.stack([torch.LongTensor(d) for d in data['triple']], dim=0).to(self.device)
+                for mode in ('head', 'tail'):
+                    ranks = self.filtered_ranks(
+                        positive_sample, data[f'ground_truth_{mode}'], mode, chunk_size
+                    ).double()
+                    count += len(ranks)
+                    rank_sum += ranks.sum().item()
+                    reciprocal_rank_sum += (1 / ranks).sum().item()
+                    for k in hits:
+                        hits_count[k] += (ranks <= k).sum().item()
+
+        scores = {f"HITS@{k}": hits_count[k] / count for k in hits}
+        scores["mean_rank"] = rank_sum / count
+        scores["mean_reciprocal_rank"] = reciprocal_rank_sum / count
+        return scores
 
 
     def calc(self, head, relation, tail, mode='pos'):
@@ -272,11 +440,15 @@ class KGEBaseModel(ABC, nn.Module):
         positive_sample = torch.stack([torch.LongTensor(d) for d in data['triple']], dim=0).to(self.device)
 
         if data['train'][0]:
-            negative_sample_head, negative_sample_tail = self.train_neg_sample_gen(
-                gt_head=data['ground_truth_head'],
-                gt_tail=data['ground_truth_tail'],
-                negative_sampling=data['hyperparameters'][0]['negative_sampling']
-            )
+            if 'negative_sample_head' in data:
+                # already sampled by the collate function
+                negative_sample_head, negative_sample_tail = data['negative_sample_head'], data['negative_sample_tail']
+            else:
+                negative_sample_head, negative_sample_tail = self.train_neg_sample_gen(
+                    gt_head=data['ground_truth_head'],
+                    gt_tail=data['ground_truth_tail'],
+                    negative_sampling=data['hyperparameters'][0]['negative_sampling']
+                )
 
             negative_sample_head, negative_sample_tail = negative_sample_head.to(self.device), negative_sample_tail.to(self.device)
             
@@ -296,7 +468,8 @@ class KGEBaseModel(ABC, nn.Module):
             head, relation, tail = self.data_process((positive_sample), mode="pos")
             pos_score = F.logsigmoid(self.calc(head=head, relation=relation, tail=tail)).squeeze(dim=1)
 
-            subsampling_weight = torch.cat([d for d in data['subsampling_weight']], dim=0).to(self.device)
+            # a float per sample (or a 1-element tensor, as in older caches)
+            subsampling_weight = torch.tensor([float(d) for d in data['subsampling_weight']]).to(self.device)
             pos_sample_loss = \
                 - (subsampling_weight * pos_score).sum()/subsampling_weight.sum() if self.use_subsampling_weight else (- pos_score.mean())
             neg_sample_loss = \
@@ -312,21 +485,8 @@ class KGEBaseModel(ABC, nn.Module):
             return {"loss": loss}
 
         else: # valid/test
-            inputs = self.test_neg_sample_filter_bias_gen(
-                    triples=data['triple'],
-                    gt_head=data['ground_truth_head'],
-                    gt_tail=data['ground_truth_tail']
-                )
-
-            # inputs, mode = (data['positive_sample'], data['negative_sample'], data['filter_bias']), data['mode']
-            inputs = [x.to(self.device) for x in inputs]
-            negative_sample_head, negative_sample_tail, filter_bias_head, filter_bias_tail = inputs
-            head, relation, tail = self.data_process((positive_sample, negative_sample_head), mode="head")
-            score_head = self.calc(head=head, relation=relation, tail=tail, mode="head")
-            head, relation, tail = self.data_process((positive_sample, negative_sample_tail), mode="tail")
-            score_tail = self.calc(head=head, relation=relation, tail=tail, mode="tail")
-            score_head += filter_bias_head
-            score_tail += filter_bias_tail
+            score_head = self.filtered_scores(positive_sample, data['ground_truth_head'], mode="head")
+            score_tail = self.filtered_scores(positive_sample, data['ground_truth_tail'], mode="tail")
 
             score = score_head + score_tail
             loss = (-F.logsigmoid(-score).mean(dim=1)).mean()
@@ -344,6 +504,77 @@ class KGEBaseModel(ABC, nn.Module):
                 "y_prob": y_prob
                 }
     
+    def batch_inference(
+        self, head=None, relation=None, tail=None, top_k=10, batch_size=1024, chunk_size=None, use_index=False, n_probe=8
+    ):
+        """ Batched head prediction (?, r, t) or tail prediction (h, r, ?)
+
+        Args:
+            head: the head entities of the queries for tail prediction, None for head prediction.
+            relation: the relations of the queries.
+            tail: the tail entities of the queries for head prediction, None for tail prediction.
+            top_k: the number of predicted entities per query. Default is 10.
+            batch_size: the number of queries scored at once. Default is 1024.
+            chunk_size: the number of entities scored at once. Default is None, which uses
+                `self.eval_chunk_size`.
+            use_index: whether to search the approximate nearest neighbor index built by
+                `build_index()` instead of scoring all entities. Only supported by distance-based
+                models (TransE). Default is False.
+            n_probe: the number of lists of the index searched per query. Default is 8.
+
+        Returns:
+            ids: torch.Size([n_queries, top_k]), the predicted entities by decreasing score.
+            scores: torch.Size([n_queries, top_k]), their scores.
+        """
+        if relation is None or (head is None) == (tail is None):
+            raise ValueError("relation and exactly one of head and tail are required")
+        mode = "head" if head is None else "tail"
+        entity = torch.as_tensor(tail if head is None else head, dtype=torch.long).reshape(-1)
+        relation = torch.as_tensor(relation, dtype=torch.long).reshape(-1).expand(len(entity))
+        if mode == "head":
+            positive_sample = torch.stack([torch.zeros_like(entity), relation, entity], dim=1)
+        else:
+            positive_sample = torch.stack([entity, relation, torch.zeros_like(entity)], dim=1)
+        positive_sample = positive_sample.to(self.device)
+        top_k = min(top_k, self.e_num)
+
+        ids, scores = [], []
+        with torch.no_grad():
+            for i in range(0, len(positive_sample), batch_size):
+                batch = positive_sample[i : i + batch_size]
+                if use_index:
+                    batch_ids, batch_scores = self.index_search(batch, mode, top_k, n_probe)
+                else:
+                    # running top-k over the chunks of entities
+                    batch_ids = torch.zeros((len(batch), 0), dtype=torch.long, device=self.device)
+                    batch_scores = torch.zeros((len(batch), 0), device=self.device)
+                    for start, score in self.score_all_entities(
+                        batch, mode, chunk_size, score_fn=self.inference_score_entities
+                    ):
+                        chunk_ids = torch.arange(start, start + score.size(1), device=self.device)
+                        batch_ids = torch.cat([batch_ids, chunk_ids.expand(len(batch), -1)], dim=1)
+                        batch_scores, index = torch.cat([batch_scores, score], dim=1).topk(
+                            min(top_k, batch_ids.size(1)), dim=1
+                        )
+                        batch_ids = batch_ids.gather(1, index)
+                ids.append(batch_ids)
+                scores.append(batch_scores)
+        return torch.cat(ids), torch.cat(scores)
+
+
+    def build_index(self, n_lists=None, n_iter=10, seed=0):
+        """ Builds an approximate nearest neighbor index over the entity embeddings
+
+        Only supported by distance-based models (TransE), see `batch_inference(use_index=True)`.
+        """
+        raise NotImplementedError("The index is only supported by distance-based models (e.g., TransE)")
+
+
+    def index_search(self, positive_sample, mode, top_k, n_probe):
+        """ Searches the index built by `build_index()`, see `batch_inference(use_index=True)`. """
+        raise NotImplementedError("The index is only supported by distance-based models (e.g., TransE)")
+
+
     def inference(self, head=None, relation=None, tail=None, top_k=1):
         # Check if two or more arguments are None
         if sum(arg is None for arg in (head, relation, tail)) >= 2:
@@ -352,27 +583,9 @@ class KGEBaseModel(ABC, nn.Module):
         
         mode = "head" if head is None else ("tail" if tail is None else ("relation" if relation is None else "clf"))
 
-        if mode == "head":
-            tail_index = torch.tensor(tail)
-            relation_index = torch.tensor(relation)
-            relation = torch.index_select(self.R_emb, dim=0, index=relation_index).unsqueeze(1)
-            tail = torch.index_select(self.E_emb, dim=0, index=tail_index).unsqueeze(1)
-            head_all_idx = torch.tensor(np.arange(0, self.e_num))
-            head_all = torch.index_select(self.E_emb, dim=0, index=head_all_idx).unsqueeze(1)
-            score_head = self.calc(head=head_all, relation=relation, tail=tail, mode="head")
-            result_eid = torch.topk(score_head.flatten(), top_k).indices
-            return result_eid.tolist()
-
-        if mode == "tail":
-            head_index = torch.tensor(head)
-            relation_index = torch.tensor(relation)
-            head = torch.index_select(self.E_emb, dim=0, index=head_index).unsqueeze(1)
-            relation = torch.index_select(self.R_emb, dim=0, index=relation_index).unsqueeze(1)
-            tail_all_idx = torch.tensor(np.arange(0, self.e_num))
-            tail_all = torch.index_select(self.E_emb, dim=0, index=tail_all_idx).unsqueeze(1)
-            score_tail = self.calc(head=head, relation=relation, tail=tail_all, mode="tail")
-            result_eid = torch.topk(score_tail.flatten(), top_k).indices
-            return result_eid.tolist()
+        if mode == "head" or mode == "tail":
+            result_eid, _ = self.batch_inference(head=head, relation=relation, tail=tail, top_k=top_k)
+            return result_eid[0].tolist()
         
         if mode == "relation":
             print("Not implemented yet.")
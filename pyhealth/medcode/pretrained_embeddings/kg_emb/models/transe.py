@@ -1,4 +1,5 @@
 from.kg_base import KGEBaseModel
+from .ann import IVFIndex
 from pyhealth.datasets import SampleBaseDataset
 import torch
 
@@ -34,6 +35,53 @@ class TransE(KGEBaseModel):
         return reg
 
 
+    def build_index(self, n_lists=None, n_iter=10, seed=0):
+        """ Builds an IVF index over the entity embeddings, for `batch_inference(use_index=True)`
+
+        The index is a snapshot of the current embeddings, so it should be rebuilt after training:
+            searching it raises an error once the embeddings have changed.
+
+        Args:
+            n_lists: the number of lists of the index. Default is None, which uses sqrt(e_num).
+            n_iter: the number of k-means iterations. Default is 10.
+            seed: the random seed of the k-means initialization. Default is 0.
+        """
+        if self.ns != 'adv':
+            # the scores are only decreasing with the distance with the margin
+            raise ValueError("The index is only supported with ns='adv'")
+        self.index = IVFIndex(self.E_emb, n_lists=n_lists, p=self.p_norm, n_iter=n_iter, seed=seed)
+        # the embeddings of the index, updated in place by the optimizer or load_state_dict()
+        self.index_version = (self.E_emb, self.E_emb._version)
+
+
+    def query_embedding(self, positive_sample, mode):
+        """ The entity embedding closest to the answers: t - r (head prediction) or h + r (tail prediction) """
+        relation = self.R_emb[positive_sample[:, 1]]
+        if mode == 'head':
+            return self.E_emb[positive_sample[:, 2]] - relation
+        return self.E_emb[positive_sample[:, 0]] + relation
+
+
+    def inference_score_entities(self, positive_sample, entities, mode):
+        # same scores as score_entities() up to rounding, with the pairwise distances computed by cdist
+        score = torch.cdist(self.query_embedding(positive_sample, mode), entities, p=self.p_norm)
+        if self.ns == 'adv':
+            score = self.margin.item() - score
+        return score
+
+
+    def index_search(self, positive_sample, mode, top_k, n_probe):
+        """ Searches the index for the entities closest to the query embedding """
+        if getattr(self, 'index', None) is None:
+            raise ValueError("No index, call build_index() first")
+        embeddings, version = self.index_version
+        if embeddings is not self.E_emb or version != self.E_emb._version:
+            raise ValueError("The embeddings changed since the index was built, call build_index() again")
+        query = self.query_embedding(positive_sample, mode)
+        ids, distances = self.index.search(query, top_k=top_k, n_probe=n_probe)
+        return ids, self.margin.item() - distances
+
+
     def calc(self, head, relation, tail, mode='pos'):
 
         if mode == 'head':
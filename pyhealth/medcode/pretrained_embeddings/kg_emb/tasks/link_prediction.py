@@ -1,48 +1,99 @@
 import numpy as np
-import torch
-from tqdm import tqdm
-from typing import Tuple, List
+from typing import Tuple, List, Union
 from collections import defaultdict
 
 def link_prediction_fn(
-    triples: List[Tuple]
+    triples: Union[np.ndarray, List[Tuple]]
 ):
 
     """Process a triple list for the link prediction task
 
-    Link prediction is a task to either 
+    Link prediction is a task to either
     Tail Prediction: predict tail entity t given a triple query (h, r, ?), or
     Head Prediction: predict head entity h given a triple query (?, r, t)
 
     Args:
-        triples: a list of triples (indexed) from the knowledge graph
-    
+        triples: an int array of shape (N, 3) or a list of triples (indexed) from the knowledge graph
+
     Returns:
         samples: a list of samples
     """
-    samples = []
-    count = count_frequency(triples)
-    triple_set = set(triples)
-    gt_head, gt_tail = ground_truth_for_query(triple_set)
-
-    for positive_sample in tqdm(triples):
-        head, relation, tail = positive_sample
-        subsampling_weight = torch.sqrt(1 / torch.Tensor([count[(head, relation)] + count[(tail, -relation-1)]]))
-        gt_h = gt_head[(relation, tail)]
-        gt_t = gt_tail[(head, relation)]
-
-        tmp = {
-            "triple": positive_sample,
+    triples = np.asarray(triples, dtype=np.int64).reshape(-1, 3)
+    count_head_relation, count_tail_relation = count_frequency_per_triple(triples)
+    subsampling_weight = np.sqrt(1 / (count_head_relation + count_tail_relation))
+    gt_head, gt_tail = ground_truth_per_triple(triples)
+
+    # the samples of a same query share the same ground truth list
+    samples = [
+        {
+            "triple": triple,
             "ground_truth_head": gt_h,
             "ground_truth_tail": gt_t,
-            "subsampling_weight": subsampling_weight
+            "subsampling_weight": weight
         }
+        for triple, gt_h, gt_t, weight in zip(
+            map(tuple, triples.tolist()), gt_head, gt_tail, subsampling_weight.tolist()
+        )
+    ]
 
-        samples.append(tmp)
-        
     return samples
 
 
+def _pair_keys(first, second):
+    """
+    Encodes pairs of non-negative ints into int64 keys, ordered as the pairs
+    """
+    return first * (int(second.max(initial=0)) + 1) + second
+
+
+def _group_by_query(keys, values):
+    """
+    Groups the unique values of each query key, and returns the group of each key
+    """
+    _, inverse = np.unique(keys, return_inverse=True)
+    # unique (query, value) pairs, sorted by query then value
+    pairs = np.unique(_pair_keys(inverse, values))
+    num_values = int(values.max(initial=0)) + 1
+    queries, values = pairs // num_values, (pairs % num_values).tolist()
+    boundaries = [0] + (np.flatnonzero(np.diff(queries)) + 1).tolist() + [len(values)]
+    groups = [values[i:j] for i, j in zip(boundaries[:-1], boundaries[1:])]
+    return [groups[i] for i in inverse.tolist()]
+
+
+def ground_truth_per_triple(triples):
+    """
+    Search ground truth of either query (h, r, ?) or (?, r, t) of each triple, vectorized
+    version of `ground_truth_for_query()`
+
+    Returns:
+        gt_head: for each triple (h, r, t), the list of heads of the query (?, r, t)
+        gt_tail: for each triple (h, r, t), the list of tails of the query (h, r, ?)
+    """
+    triples = np.asarray(triples, dtype=np.int64).reshape(-1, 3)
+    gt_head = _group_by_query(_pair_keys(triples[:, 1], triples[:, 2]), triples[:, 0])
+    gt_tail = _group_by_query(_pair_keys(triples[:, 0], triples[:, 1]), triples[:, 2])
+    return gt_head, gt_tail
+
+
+def count_frequency_per_triple(triples, start=4):
+    '''
+    Get frequency of the partial triples (head, relation) and (relation, tail) of each triple,
+    vectorized version of `count_frequency()`
+
+    Returns:
+        count_head_relation: for each triple (h, r, t), start - 1 + the number of triples with (h, r)
+        count_tail_relation: for each triple (h, r, t), start - 1 + the number of triples with (r, t)
+    '''
+    triples = np.asarray(triples, dtype=np.int64).reshape(-1, 3)
+    counts = []
+    for entity in (triples[:, 0], triples[:, 2]):
+        _, inverse, count = np.unique(
+            _pair_keys(entity, triples[:, 1]), return_inverse=True, return_counts=True
+        )
+        counts.append(count[inverse] + start - 1)
+    return counts[0], counts[1]
+
+
 def ground_truth_for_query(triple_set):
     """
     Search ground truth of either query (h, r, ?) or (?, r, t) in the dataset
@@ -75,4 +126,3 @@ def count_frequency(triples, start=4):
         else:
             count[(tail, -relation-1)] += 1
     return count
-
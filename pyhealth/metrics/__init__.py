@@ -5,3 +5,4 @@ from .multilabel import multilabel_metrics_fn
 from .fairness import fairness_metrics_fn
 from .ranking import ranking_metrics_fn
 from .regression import regression_metrics_fn
+from .streaming import StreamingMetrics
@@ -1,31 +1,102 @@
-from typing import List
+from typing import List, Tuple, Union
 
 import numpy as np
+import torch
 
 
 # TODO: this metric is very ad-hoc, need to be improved
 
 
-def ddi_rate_score(medications: List[np.ndarray], ddi_matrix: np.ndarray) -> float:
+def _ddi_pair_counts(
+    medications: Union[np.ndarray, torch.Tensor],
+    ddi_pairs: Union[np.ndarray, torch.Tensor],
+) -> Tuple[float, float]:
+    """Helper function which counts the DDI pairs in a batch of medications.
+
+    Args:
+        medications: array of shape (n_samples, n_classes) holding the number
+            of times each medication is prescribed to each patient (i.e., a
+            multi-hot matrix if each medication appears once).
+        ddi_pairs: symmetric 0/1 array of shape (n_classes, n_classes), of the
+            same type and dtype as `medications`.
+
+    Returns:
+        ddi_cnt: number of pairs of medications of a same patient interacting
+            with each other.
+        all_cnt: number of pairs of medications of a same patient.
+    """
+    # sum over ordered pairs (i != j) of ddi_pairs[med_i, med_j], i.e.,
+    # y @ ddi_pairs @ y.T without the pairs of a medication with itself
+    ordered_cnt = ((medications @ ddi_pairs) * medications).sum() - (
+        medications * ddi_pairs.diagonal()
+    ).sum()
+    num_medications = medications.sum(1)
+    all_cnt = (num_medications * (num_medications - 1)).sum() / 2
+    return float(ordered_cnt) / 2, float(all_cnt)
+
+
+def ddi_rate_score(
+    medications: Union[List[np.ndarray], np.ndarray, torch.Tensor],
+    ddi_matrix: Union[np.ndarray, torch.Tensor],
+    batch_size: int = 4096,
+) -> float:
     """DDI rate score.
 
+    The DDI rate is the fraction of pairs of medications prescribed to a same
+    patient which interact with each other. It is computed in batches as
+    Y @ A @ Y.T on the multi-hot matrix Y of the medications, where A is the
+    symmetrized ddi matrix.
+
     Args:
         medications: list of medications for each patient, where each medication
-            is represented by the corresponding index in the ddi matrix.
-        ddi_matrix: array-like of shape (n_classes, n_classes).
+            is represented by the corresponding index in the ddi matrix. Or a
+            multi-hot array of shape (n_samples, n_classes), as a NumPy array
+            or a torch tensor (e.g., thresholded predictions), which is faster.
+        ddi_matrix: array-like of shape (n_classes, n_classes). If a torch
+            tensor, the score of a multi-hot tensor is computed on its device.
+        batch_size: number of patients processed at once. Default is 4096.
 
     Returns:
         result: DDI rate score.
+
+    Examples:
+        >>> import numpy as np
+        >>> from pyhealth.metrics import ddi_rate_score
+        >>> ddi_matrix = np.array([[0, 1, 0], [1, 0, 0], [0, 0, 0]])
+        >>> ddi_rate_score([np.array([0, 1, 2]), np.array([0, 2])], ddi_matrix)
+        0.25
+        >>> ddi_rate_score(np.array([[1, 1, 1], [1, 0, 1]]), ddi_matrix)
+        0.25
     """
+    if isinstance(medications, torch.Tensor):
+        ddi_matrix = torch.as_tensor(ddi_matrix, device=medications.device)
+        ddi_pairs = ((ddi_matrix == 1) | (ddi_matrix.T == 1)).double()
+    else:
+        if isinstance(ddi_matrix, torch.Tensor):
+            ddi_matrix = ddi_matrix.cpu().numpy()
+        ddi_matrix = np.asarray(ddi_matrix)
+        ddi_pairs = ((ddi_matrix == 1) | (ddi_matrix.T == 1)).astype(np.float64)
+
+    def to_batch(batch):
+        if isinstance(batch, torch.Tensor):
+            return batch.double()
+        if isinstance(batch, np.ndarray) and batch.ndim == 2:
+            return batch.astype(np.float64)
+        # lists of indices are counted into a (n_samples, n_classes) matrix
+        counts = np.zeros((len(batch), len(ddi_pairs)))
+        rows = np.repeat(np.arange(len(batch)), [len(x) for x in batch])
+        cols = np.concatenate([np.asarray(x, dtype=int) for x in batch])
+        np.add.at(counts, (rows, cols), 1)
+        return counts
+
     all_cnt = 0
     ddi_cnt = 0
-    for sample in medications:
-        for i, med_i in enumerate(sample):
-            for j, med_j in enumerate(sample):
-                if j <= i: continue
-                all_cnt += 1
-                if ddi_matrix[med_i, med_j] == 1 or ddi_matrix[med_j, med_i] == 1:
-                    ddi_cnt += 1
+    for i in range(0, len(medications), batch_size):
+        batch_ddi_cnt, batch_all_cnt = _ddi_pair_counts(
+            to_batch(medications[i : i + batch_size]), ddi_pairs
+        )
+        ddi_cnt += batch_ddi_cnt
+        all_cnt += batch_all_cnt
     if all_cnt == 0:
         return 0
     return ddi_cnt / all_cnt
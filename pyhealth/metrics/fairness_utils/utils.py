@@ -21,10 +21,14 @@ def sensitive_attributes_from_patient_ids(dataset: BaseEHRDataset,
         Sensitive attribute array of shape (n_samples,).
     """
 
+    # look up each patient once, patients may be materialized on access
+    is_protected = {
+        patient_id: getattr(dataset.patients[patient_id], sensitive_attribute) == protected_group
+        for patient_id in set(patient_ids)
+    }
     sensitive_attribute_array = np.zeros(len(patient_ids))
     for idx, patient_id in enumerate(patient_ids):
-        sensitive_attribute_value = getattr(dataset.patients[patient_id], sensitive_attribute)
-        if sensitive_attribute_value == protected_group:
+        if is_protected[patient_id]:
             sensitive_attribute_array[idx] = 1
     return sensitive_attribute_array
 
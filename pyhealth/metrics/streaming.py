@@ -0,0 +1,530 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import sklearn.metrics as sklearn_metrics
+
+from pyhealth.metrics.binary import binary_metrics_fn
+from pyhealth.metrics.multiclass import multiclass_metrics_fn
+from pyhealth.metrics.multilabel import multilabel_metrics_fn
+from pyhealth.metrics.regression import regression_metrics_fn
+
+# metrics which can be accumulated batch by batch, for each mode
+STREAMING_METRICS = {
+    "binary": {
+        "pr_auc",
+        "roc_auc",
+        "accuracy",
+        "balanced_accuracy",
+        "f1",
+        "precision",
+        "recall",
+        "cohen_kappa",
+        "jaccard",
+    },
+    "multiclass": {
+        "roc_auc_macro_ovr",
+        "roc_auc_weighted_ovr",
+        "accuracy",
+        "balanced_accuracy",
+        "f1_micro",
+        "f1_macro",
+        "f1_weighted",
+        "jaccard_micro",
+        "jaccard_macro",
+        "jaccard_weighted",
+        "cohen_kappa",
+        "hits@n",
+        "mean_rank",
+    },
+    "multilabel": {
+        "roc_auc_micro",
+        "roc_auc_macro",
+        "roc_auc_weighted",
+        "roc_auc_samples",
+        "pr_auc_micro",
+        "pr_auc_macro",
+        "pr_auc_weighted",
+        "pr_auc_samples",
+        "accuracy",
+        "f1_micro",
+        "f1_macro",
+        "f1_weighted",
+        "f1_samples",
+        "precision_micro",
+        "precision_macro",
+        "precision_weighted",
+        "precision_samples",
+        "recall_micro",
+        "recall_macro",
+        "recall_weighted",
+        "recall_samples",
+        "jaccard_micro",
+        "jaccard_macro",
+        "jaccard_weighted",
+        "jaccard_samples",
+        "hamming_loss",
+    },
+    "regression": set(),
+}
+
+DEFAULT_METRICS = {
+    "binary": ["pr_auc", "roc_auc", "f1"],
+    "multiclass": ["accuracy", "f1_macro", "f1_micro"],
+    "multilabel": ["pr_auc_samples"],
+    "regression": ["kl_divergence", "mse", "mae"],
+}
+
+DEFAULT_THRESHOLDS = {"binary": 0.5, "multilabel": 0.3}
+
+
+def _safe_divide(numerator, denominator):
+    """Helper function which divides, returning 0 where the denominator is 0.
+
+    Matches the zero_division behavior of the sklearn metrics.
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(np.broadcast(numerator, denominator).shape),
+        where=denominator != 0,
+    )
+
+
+def _histogram_auc(pos: np.ndarray, neg: np.ndarray):
+    """Helper function which computes the ROC AUC and the average precision.
+
+    Args:
+        pos: array of shape (n_labels, n_bins), number of positive samples whose
+            predicted probability falls in each bin.
+        neg: array of shape (n_labels, n_bins), same for negative samples.
+
+    Returns:
+        roc_auc, pr_auc: arrays of shape (n_labels,). Samples in a same bin are
+            handled as tied scores, so the values are the exact sklearn values
+            on the probabilities rounded down to the bins. The ROC AUC of the
+            labels with only one class is nan (see `_check_roc_auc`), and the
+            PR AUC of the labels without positive samples is 0, as in sklearn.
+    """
+    # thresholds in decreasing order
+    tp = np.cumsum(pos[:, ::-1], axis=1)
+    fp = np.cumsum(neg[:, ::-1], axis=1)
+    num_pos, num_neg = tp[:, -1:], fp[:, -1:]
+    zeros = np.zeros((len(tp), 1))
+    tpr = np.hstack([zeros, _safe_divide(tp, num_pos)])
+    fpr = np.hstack([zeros, _safe_divide(fp, num_neg)])
+    roc_auc = np.sum(np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+    roc_auc[(num_pos[:, 0] == 0) | (num_neg[:, 0] == 0)] = np.nan
+    pr_auc = np.sum(np.diff(tpr, axis=1) * _safe_divide(tp, tp + fp), axis=1)
+    return roc_auc, pr_auc
+
+
+def _check_roc_auc(roc_auc: np.ndarray):
+    """Helper function which raises if the ROC AUC of a label is not defined."""
+    if np.isnan(roc_auc).any():
+        raise ValueError(
+            "Only one class present in y_true. ROC AUC score is not defined "
+            "in that case."
+        )
+    return roc_auc
+
+
+class _Histogram:
+    """Per-label histograms of the predicted probabilities of each class."""
+
+    def __init__(self, num_labels: int, num_bins: int):
+        self.num_bins = num_bins
+        self.pos = np.zeros((num_labels, num_bins), dtype=np.int64)
+        self.neg = np.zeros((num_labels, num_bins), dtype=np.int64)
+
+    def update(self, y_true: np.ndarray, y_prob: np.ndarray):
+        """Updates the histograms with arrays of shape (n_samples, n_labels)."""
+        num_labels = self.pos.shape[0]
+        bins = np.clip((y_prob * self.num_bins).astype(np.int64), 0, self.num_bins - 1)
+        bins = (bins + np.arange(num_labels) * self.num_bins).ravel()
+        positive = y_true.ravel() == 1
+        size = num_labels * self.num_bins
+        self.pos += np.bincount(bins[positive], minlength=size).reshape(self.pos.shape)
+        self.neg += np.bincount(bins[~positive], minlength=size).reshape(self.neg.shape)
+
+    def compute(self, labels: Optional[np.ndarray] = None):
+        pos, neg = self.pos, self.neg
+        if labels is not None:
+            pos, neg = pos[labels], neg[labels]
+        return _histogram_auc(pos, neg)
+
+    def compute_micro(self):
+        pos = self.pos.sum(0, keepdims=True)
+        neg = self.neg.sum(0, keepdims=True)
+        return _histogram_auc(pos, neg)
+
+
+def _confusion_scores(tp, fp, fn, average: str, support=None):
+    """Helper function which computes precision, recall, f1 and jaccard scores.
+
+    Args:
+        tp, fp, fn: arrays of per-label counts.
+        average: "micro", "macro" or "weighted".
+        support: weights of the labels for "weighted". Default is tp + fn.
+
+    Returns:
+        A dict with keys "precision", "recall", "f1" and "jaccard".
+    """
+    if average == "micro":
+        tp, fp, fn = tp.sum(), fp.sum(), fn.sum()
+    scores = {
+        "precision": _safe_divide(tp, tp + fp),
+        "recall": _safe_divide(tp, tp + fn),
+        "f1": _safe_divide(2 * tp, 2 * tp + fp + fn),
+        "jaccard": _safe_divide(tp, tp + fp + fn),
+    }
+    if average == "micro":
+        return {key: float(value) for key, value in scores.items()}
+    if average == "macro":
+        return {key: float(np.mean(value)) for key, value in scores.items()}
+    if support is None:
+        support = tp + fn
+    if support.sum() == 0:
+        return {key: 0.0 for key in scores}
+    return {
+        key: float(np.average(value, weights=support)) for key, value in scores.items()
+    }
+
+
+class _ExactAccumulator:
+    """Keeps all predictions and calls the metrics function at the end."""
+
+    def __init__(self, mode: str, metrics: List[str], threshold: Optional[float]):
+        self.mode = mode
+        self.metrics = metrics
+        self.threshold = threshold
+        self.y_true_all = []
+        self.y_prob_all = []
+
+    def update(self, y_true: np.ndarray, y_prob: np.ndarray):
+        self.y_true_all.append(y_true)
+        self.y_prob_all.append(y_prob)
+
+    def compute(self) -> Dict[str, float]:
+        y_true_all = np.concatenate(self.y_true_all, axis=0)
+        y_prob_all = np.concatenate(self.y_prob_all, axis=0)
+        if self.mode == "binary":
+            return binary_metrics_fn(
+                y_true_all, y_prob_all, self.metrics, threshold=self.threshold
+            )
+        elif self.mode == "multiclass":
+            return multiclass_metrics_fn(y_true_all, y_prob_all, self.metrics)
+        elif self.mode == "multilabel":
+            return multilabel_metrics_fn(
+                y_true_all, y_prob_all, self.metrics, threshold=self.threshold
+            )
+        return regression_metrics_fn(y_true_all, y_prob_all, self.metrics)
+
+
+class _BinaryAccumulator:
+    def __init__(self, metrics: List[str], threshold: float, num_bins: int):
+        self.metrics = metrics
+        self.threshold = threshold
+        self.histogram = _Histogram(1, num_bins)
+        # [[tn, fp], [fn, tp]]
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+
+    def update(self, y_true: np.ndarray, y_prob: np.ndarray):
+        y_true = y_true.ravel().astype(np.int64)
+        y_prob = y_prob.ravel()
+        y_pred = (y_prob >= self.threshold).astype(np.int64)
+        self.confusion += np.bincount(y_true * 2 + y_pred, minlength=4).reshape(2, 2)
+        self.histogram.update(y_true[:, None], y_prob[:, None])
+
+    def compute(self) -> Dict[str, float]:
+        (tn, fp), (fn, tp) = self.confusion
+        total = self.confusion.sum()
+        scores = _confusion_scores(
+            np.array([tp]), np.array([fp]), np.array([fn]), "micro"
+        )
+        output = {}
+        for metric in self.metrics:
+            if metric in {"pr_auc", "roc_auc"}:
+                roc_auc, pr_auc = self.histogram.compute()
+                if metric == "roc_auc":
+                    output[metric] = float(_check_roc_auc(roc_auc)[0])
+                else:
+                    output[metric] = float(pr_auc[0])
+            elif metric == "accuracy":
+                output[metric] = float((tp + tn) / total)
+            elif metric == "balanced_accuracy":
+                output[metric] = _multiclass_balanced_accuracy(self.confusion)
+            elif metric == "cohen_kappa":
+                output[metric] = _cohen_kappa(self.confusion)
+            else:
+                output[metric] = scores[metric]
+        return output
+
+
+def _multiclass_balanced_accuracy(confusion: np.ndarray) -> float:
+    support = confusion.sum(1)
+    present = support > 0
+    return float(np.mean(np.diag(confusion)[present] / support[present]))
+
+
+def _cohen_kappa(confusion: np.ndarray) -> float:
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = np.sum(confusion.sum(0) * confusion.sum(1)) / total**2
+    return float(_safe_divide(observed - expected, 1 - expected))
+
+
+class _MulticlassAccumulator:
+    def __init__(self, metrics: List[str], num_bins: int):
+        self.metrics = metrics
+        self.num_bins = num_bins
+        self.num_samples = 0
+        # the confusion matrix is (n_classes, n_classes), only kept if needed, as
+        # the ranking metrics are used with many classes (e.g., KG entities)
+        self.use_confusion = any(
+            metric not in {"hits@n", "mean_rank"} and not metric.startswith("roc_auc")
+            for metric in metrics
+        )
+        self.confusion = None
+        self.histogram = None
+        # sums over the samples of the ranks of the true classes
+        self.use_ranks = "hits@n" in metrics or "mean_rank" in metrics
+        self.rank_sums = {"rank": 0.0, "reciprocal_rank": 0.0, 1: 0, 5: 0, 10: 0}
+
+    def update(self, y_true: np.ndarray, y_prob: np.ndarray):
+        num_classes = y_prob.shape[1]
+        y_true = y_true.ravel().astype(np.int64)
+        self.num_samples += len(y_true)
+        if self.use_confusion:
+            if self.confusion is None:
+                self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+            y_pred = np.argmax(y_prob, axis=-1)
+            self.confusion += np.bincount(
+                y_true * num_classes + y_pred, minlength=num_classes**2
+            ).reshape(num_classes, num_classes)
+        if any(metric.startswith("roc_auc") for metric in self.metrics):
+            if self.histogram is None:
+                self.histogram = _Histogram(num_classes, self.num_bins)
+            self.histogram.update(np.eye(num_classes)[y_true], y_prob)
+        if self.use_ranks:
+            true_prob = y_prob[np.arange(len(y_true)), y_true]
+            ranks = 1 + (y_prob > true_prob[:, None]).sum(1)
+            self.rank_sums["rank"] += ranks.sum()
+            self.rank_sums["reciprocal_rank"] += (1 / ranks).sum()
+            for k in (1, 5, 10):
+                self.rank_sums[k] += (ranks <= k).sum()
+
+    def compute(self) -> Dict[str, float]:
+        confusion = self.confusion
+        if self.use_confusion:
+            tp = np.diag(confusion)
+            fp = confusion.sum(0) - tp
+            fn = confusion.sum(1) - tp
+            # sklearn only considers the labels present in y_true or y_pred
+            labels = np.flatnonzero(confusion.sum(0) + confusion.sum(1))
+            tp, fp, fn = tp[labels], fp[labels], fn[labels]
+        output = {}
+        for metric in self.metrics:
+            if metric in {"roc_auc_macro_ovr", "roc_auc_weighted_ovr"}:
+                roc_auc = _check_roc_auc(self.histogram.compute()[0])
+                if metric == "roc_auc_macro_ovr":
+                    output[metric] = float(np.mean(roc_auc))
+                else:
+                    support = self.histogram.pos.sum(1)
+                    output[metric] = float(np.average(roc_auc, weights=support))
+            elif metric == "hits@n":
+                for k in (1, 5, 10):
+                    output[f"HITS@{k}"] = float(self.rank_sums[k] / self.num_samples)
+            elif metric == "mean_rank":
+                output["mean_rank"] = float(self.rank_sums["rank"] / self.num_samples)
+                output["mean_reciprocal_rank"] = float(
+                    self.rank_sums["reciprocal_rank"] / self.num_samples
+                )
+            elif metric == "accuracy":
+                output[metric] = float(tp.sum() / self.num_samples)
+            elif metric == "balanced_accuracy":
+                output[metric] = _multiclass_balanced_accuracy(confusion)
+            elif metric == "cohen_kappa":
+                output[metric] = _cohen_kappa(confusion)
+            else:
+                name, average = metric.split("_")
+                output[metric] = _confusion_scores(tp, fp, fn, average)[name]
+        return output
+
+
+class _MultilabelAccumulator:
+    def __init__(self, metrics: List[str], threshold: float, num_bins: int):
+        self.metrics = metrics
+        self.threshold = threshold
+        self.num_bins = num_bins
+        self.counts = None
+        self.histogram = None
+        self.num_samples = 0
+        # sums of the per-sample scores
+        self.samples_sums = {}
+
+    def update(self, y_true: np.ndarray, y_prob: np.ndarray):
+        num_labels = y_prob.shape[1]
+        if self.counts is None:
+            # tp, fp, fn, tn of each label
+            self.counts = np.zeros((4, num_labels), dtype=np.int64)
+            if any(
+                metric.split("_")[-1] in {"micro", "macro", "weighted"}
+                and metric.startswith(("roc_auc", "pr_auc"))
+                for metric in self.metrics
+            ):
+                self.histogram = _Histogram(num_labels, self.num_bins)
+        y_true = y_true.astype(bool)
+        y_pred = y_prob >= self.threshold
+        tp = (y_true & y_pred).sum(0)
+        fp = (~y_true & y_pred).sum(0)
+        fn = (y_true & ~y_pred).sum(0)
+        self.counts += np.stack([tp, fp, fn, len(y_true) - tp - fp - fn])
+        if self.histogram is not None:
+            self.histogram.update(y_true, y_prob)
+        self.num_samples += len(y_true)
+
+        # per-sample scores are exact, the batch sums are accumulated
+        tp = (y_true & y_pred).sum(1)
+        fp = (~y_true & y_pred).sum(1)
+        fn = (y_true & ~y_pred).sum(1)
+        samples_scores = {
+            "precision_samples": lambda: _safe_divide(tp, tp + fp),
+            "recall_samples": lambda: _safe_divide(tp, tp + fn),
+            "f1_samples": lambda: _safe_divide(2 * tp, 2 * tp + fp + fn),
+            "jaccard_samples": lambda: _safe_divide(tp, tp + fp + fn),
+            "roc_auc_samples": lambda: len(y_true)
+            * sklearn_metrics.roc_auc_score(y_true, y_prob, average="samples"),
+            "pr_auc_samples": lambda: len(y_true)
+            * sklearn_metrics.average_precision_score(
+                y_true, y_prob, average="samples"
+            ),
+        }
+        for metric in self.metrics:
+            if metric in samples_scores:
+                score = float(np.sum(samples_scores[metric]()))
+                self.samples_sums[metric] = self.samples_sums.get(metric, 0.0) + score
+
+    def compute(self) -> Dict[str, float]:
+        tp, fp, fn, tn = self.counts
+        total = self.counts.sum()
+        output = {}
+        for metric in self.metrics:
+            if metric in self.samples_sums:
+                output[metric] = self.samples_sums[metric] / self.num_samples
+            elif metric == "accuracy":
+                output[metric] = float((tp.sum() + tn.sum()) / total)
+            elif metric == "hamming_loss":
+                output[metric] = float((fp.sum() + fn.sum()) / total)
+            elif metric.startswith(("roc_auc", "pr_auc")):
+                name, average = metric.rsplit("_", 1)
+                if average == "micro":
+                    roc_auc, pr_auc = self.histogram.compute_micro()
+                else:
+                    roc_auc, pr_auc = self.histogram.compute()
+                score = _check_roc_auc(roc_auc) if name == "roc_auc" else pr_auc
+                if average == "weighted":
+                    support = tp + fn
+                    if support.sum() == 0:
+                        output[metric] = 0.0
+                    else:
+                        output[metric] = float(np.average(score, weights=support))
+                else:
+                    output[metric] = float(np.mean(score))
+            else:
+                name, average = metric.split("_")
+                output[metric] = _confusion_scores(tp, fp, fn, average)[name]
+        return output
+
+
+class StreamingMetrics:
+    """Metrics accumulated batch by batch, with bounded memory.
+
+    Instead of keeping all the predictions and computing the metrics at the
+    end, the predictions of each batch are summarized when they are added:
+        - threshold-based metrics (accuracy, f1, precision, recall, jaccard,
+          cohen_kappa, hamming_loss, ...) from confusion counts, which is exact;
+        - ROC AUC and PR AUC from histograms of the predicted probabilities
+          with `num_bins` equal-width bins, which approximates the scores
+          (probabilities in a same bin are handled as ties);
+        - "samples" averaged multilabel metrics from per-sample scores, which
+          is exact;
+        - the loss as the mean of the batch losses, if given.
+    The memory does not grow with the number of samples. If any requested
+    metric is not supported in streaming (see `STREAMING_METRICS`), or if
+    `exact` is True, all predictions are kept and the metrics functions of
+    `pyhealth.metrics` are called at the end instead.
+
+    Args:
+        mode: one of "binary", "multiclass", "multilabel" and "regression".
+        metrics: list of metric names, as in the metrics function of the mode.
+            Default is None, which uses the defaults of the metrics function.
+        threshold: threshold to binarize the predicted probabilities. Default
+            is None, which uses the default of the metrics function.
+        num_bins: number of bins of the histograms. Default is 10000.
+        exact: whether to always compute the exact metrics. Default is False.
+
+    Examples:
+        >>> from pyhealth.metrics.streaming import StreamingMetrics
+        >>> streaming_metrics = StreamingMetrics("binary", ["accuracy"])
+        >>> streaming_metrics.update(np.array([0, 0]), np.array([0.1, 0.4]))
+        >>> streaming_metrics.update(np.array([1, 1]), np.array([0.35, 0.8]))
+        >>> streaming_metrics.compute()
+        {'accuracy': 0.75}
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        metrics: Optional[List[str]] = None,
+        threshold: Optional[float] = None,
+        num_bins: int = 10000,
+        exact: bool = False,
+    ):
+        if mode not in STREAMING_METRICS:
+            raise ValueError(f"Mode {mode} is not supported")
+        if metrics is None:
+            metrics = DEFAULT_METRICS[mode]
+        if threshold is None:
+            threshold = DEFAULT_THRESHOLDS.get(mode)
+        self.mode = mode
+        self.metrics = metrics
+        self.exact = exact or not set(metrics) <= STREAMING_METRICS[mode]
+        if self.exact:
+            self.accumulator = _ExactAccumulator(mode, metrics, threshold)
+        elif mode == "binary":
+            self.accumulator = _BinaryAccumulator(metrics, threshold, num_bins)
+        elif mode == "multiclass":
+            self.accumulator = _MulticlassAccumulator(metrics, num_bins)
+        else:
+            self.accumulator = _MultilabelAccumulator(metrics, threshold, num_bins)
+        self.loss_sum = 0.0
+        self.num_losses = 0
+
+    def update(
+        self, y_true: np.ndarray, y_prob: np.ndarray, loss: Optional[float] = None
+    ) -> None:
+        """Adds the true labels, the predicted probabilities and the loss of a batch.
+
+        Args:
+            y_true: true labels of the batch.
+            y_prob: predicted probabilities of the batch.
+            loss: loss of the batch. Default is None.
+        """
+        self.accumulator.update(np.asarray(y_true), np.asarray(y_prob))
+        if loss is not None:
+            self.loss_sum += loss
+            self.num_losses += 1
+
+    def compute(self) -> Dict[str, float]:
+        """Computes the metrics over all the batches added so far.
+
+        Returns:
+            scores: a dictionary of scores, with the mean batch loss under "loss"
+                if losses were given.
+        """
+        scores = self.accumulator.compute()
+        if self.num_losses > 0:
+            scores["loss"] = self.loss_sum / self.num_losses
+        return scores
@@ -452,11 +452,8 @@ class AdaCare(BaseModel):
 
             # for case 1: [code1, code2, code3, ...]
             if (dim_ == 2) and (type_ == str):
-                x = self.feat_tokenizers[feature_key].batch_encode_2d(
-                    kwargs[feature_key]
-                )
                 # (patient, event)
-                x = torch.tensor(x, dtype=torch.long, device=self.device)
+                x = self.encode_tokens(feature_key, kwargs[feature_key])
                 # (patient, event, embedding_dim)
                 x = self.embeddings[feature_key](x)
                 # (patient, event)
@@ -464,11 +461,8 @@ class AdaCare(BaseModel):
 
             # for case 2: [[code1, code2], [code3, ...], ...]
             elif (dim_ == 3) and (type_ == str):
-                x = self.feat_tokenizers[feature_key].batch_encode_3d(
-                    kwargs[feature_key]
-                )
                 # (patient, visit, event)
-                x = torch.tensor(x, dtype=torch.long, device=self.device)
+                x = self.encode_tokens(feature_key, kwargs[feature_key])
                 # (patient, visit, event, embedding_dim)
                 x = self.embeddings[feature_key](x)
                 # (patient, visit, embedding_dim)
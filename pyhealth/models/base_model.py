@@ -1,14 +1,18 @@
 from abc import ABC
+from functools import partial
+from itertools import chain
 from typing import List, Dict, Union, Callable, Optional
 
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from pyhealth.datasets import SampleBaseDataset
+from pyhealth.datasets import SampleBaseDataset, collate_fn_dict, collate_fn_encode
 from pyhealth.models.utils import batch_to_multihot
 from pyhealth.medcode.utils import download_and_read_json
 from sklearn.decomposition import PCA
+from pyhealth.profiler import record_phase
 from pyhealth.tokenizer import Tokenizer
 
 # TODO: add support for regression
@@ -110,6 +114,57 @@ class BaseModel(ABC, nn.Module):
             )
         return embedding_layers
 
+    def get_collate_fn(self) -> Callable:
+        """Gets the collate function encoding the token features of this model.
+
+        The returned function can be passed to `get_dataloader()` (or to a
+        DataLoader) so that the features in `self.feat_tokenizers` are encoded
+        into padded LongTensors when the batches are collated, i.e., in the
+        DataLoader workers if `num_workers > 0`. The models accept both the raw
+        and the encoded features, see `encode_tokens()`.
+
+        Returns:
+            collate_fn: a picklable collate function.
+        """
+        feat_tokenizers = getattr(self, "feat_tokenizers", None)
+        if not feat_tokenizers:
+            return collate_fn_dict
+        feature_tokenizers, feature_dims = {}, {}
+        for feature_key, tokenizer in feat_tokenizers.items():
+            input_info = self.dataset.input_info[feature_key]
+            if input_info["type"] == str and input_info["dim"] in [2, 3]:
+                feature_tokenizers[feature_key] = tokenizer
+                feature_dims[feature_key] = input_info["dim"]
+        return partial(
+            collate_fn_encode,
+            feature_tokenizers=feature_tokenizers,
+            feature_dims=feature_dims,
+        )
+
+    def encode_tokens(self, feature_key: str, batch) -> torch.Tensor:
+        """Encodes a batch of token features into a LongTensor.
+
+        Features already encoded by the collate function of `get_collate_fn()`
+        are only moved to the device of the model.
+
+        Args:
+            feature_key: the key of the feature, in `self.feat_tokenizers`.
+            batch: a list of list of tokens (2d) or a list of list of list of
+                tokens (3d), or the corresponding encoded tensor.
+
+        Returns:
+            x: a LongTensor of shape (patient, event) or (patient, visit, event).
+        """
+        if isinstance(batch, torch.Tensor):
+            return batch.to(self.device)
+        tokenizer = self.feat_tokenizers[feature_key]
+        with record_phase("tokenization"):
+            if self.dataset.input_info[feature_key]["dim"] == 2:
+                x, _ = tokenizer.batch_encode_2d_array(batch)
+            else:
+                x, _ = tokenizer.batch_encode_3d_array(batch)
+        return torch.from_numpy(x).to(self.device)
+
     @staticmethod
     def padding2d(batch):
         """
@@ -120,22 +175,26 @@ class BaseModel(ABC, nn.Module):
                 - 2-level: number of visit, length maybe not equal
                 - 3-level: number of features per visit, length must be equal
         Returns:
-            padded_batch: a padded list of list of list obj
+            padded_batch: a padded float32 array of shape (patient, visit, features)
+            mask: a bool tensor of shape (patient, visit)
             e.g.,
                 batch = [[[1.3, 2.5], [3.2, 4.4]], [[5.1, 6.0], [7.7, 8.3]]] -> [[[1.3, 2.5], [3.2, 4.4]], [[5.1, 6.0], [7.7, 8.3]]]
                 batch = [[[1.3, 2.5], [3.2, 4.4]], [[5.1, 6.0]]] -> [[[1.3, 2.5], [3.2, 4.4]], [[5.1, 6.0], [0.0, 0.0]]]
         """
-        batch_max_length = max([len(x) for x in batch])
+        # the most inner vector length
+        vec_len = len(batch[0][0])
+        lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
 
         # get mask
-        mask = torch.zeros(len(batch), batch_max_length, dtype=torch.bool)
-        for i, x in enumerate(batch):
-            mask[i, : len(x)] = 1
+        mask = np.arange(lengths.max()) < lengths[:, None]
 
-        # level-2 padding
-        batch = [x + [[0.0] * len(x[0])] * (batch_max_length - len(x)) for x in batch]
+        # level-2 padding, by scattering all vectors at once
+        padded_batch = np.zeros(mask.shape + (vec_len,), dtype=np.float32)
+        padded_batch[mask] = np.asarray(
+            list(chain.from_iterable(batch)), dtype=np.float32
+        ).reshape(-1, vec_len)
 
-        return batch, mask
+        return padded_batch, torch.from_numpy(mask)
 
     @staticmethod
     def padding3d(batch):
@@ -147,39 +206,27 @@ class BaseModel(ABC, nn.Module):
                 - 2-level: number of visit, length maybe not equal
                 - 3-level: number of features per visit, length must be equal
         Returns:
-            padded_batch: a padded list of list of list obj. No examples, just one more dimension higher than self.padding2d
+            padded_batch: a padded float32 array. No examples, just one more dimension higher than self.padding2d
+            mask: a bool tensor of shape (patient, visit, event)
         """
-        batch_max_length_level2 = max([len(x) for x in batch])
-        batch_max_length_level3 = max(
-            [max([len(x) for x in visits]) for visits in batch]
-        )
-
         # the most inner vector length
         vec_len = len(batch[0][0][0])
+        visits = list(chain.from_iterable(batch))
+        num_visits = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        num_events = np.fromiter(map(len, visits), dtype=np.int64, count=len(visits))
 
         # get mask
-        mask = torch.zeros(
-            len(batch),
-            batch_max_length_level2,
-            batch_max_length_level3,
-            dtype=torch.bool,
-        )
-        for i, visits in enumerate(batch):
-            for j, x in enumerate(visits):
-                mask[i, j, : len(x)] = 1
-
-        # level-2 padding
-        batch = [
-            x + [[[0.0] * vec_len]] * (batch_max_length_level2 - len(x)) for x in batch
-        ]
-
-        # level-3 padding
-        batch = [
-            [x + [[0.0] * vec_len] * (batch_max_length_level3 - len(x)) for x in visits]
-            for visits in batch
-        ]
-
-        return batch, mask
+        visit_mask = np.arange(num_visits.max()) < num_visits[:, None]
+        mask = np.zeros(visit_mask.shape + (num_events.max(),), dtype=bool)
+        mask[visit_mask] = np.arange(num_events.max()) < num_events[:, None]
+
+        # level-2 and level-3 padding, by scattering all vectors at once
+        padded_batch = np.zeros(mask.shape + (vec_len,), dtype=np.float32)
+        padded_batch[mask] = np.asarray(
+            list(chain.from_iterable(visits)), dtype=np.float32
+        ).reshape(-1, vec_len)
+
+        return padded_batch, torch.from_numpy(mask)
 
     def add_feature_transform_layer(self, feature_key: str, info, special_tokens=None):
         if info["type"] == str:
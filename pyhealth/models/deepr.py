@@ -4,7 +4,7 @@ from typing import Dict, List, Optional, Tuple
 import torch
 import torch.nn as nn
 
-from pyhealth.datasets import BaseEHRDataset
+from pyhealth.datasets import BaseEHRDataset, collate_fn_dict
 from pyhealth.models import BaseModel
 
 
@@ -234,6 +234,14 @@ class Deepr(BaseModel):
         output_size = self.get_output_size(self.label_tokenizer)
         self.fc = nn.Linear(len(self.feature_keys) * self.hidden_dim, output_size)
 
+    def get_collate_fn(self):
+        """Gets the collate function of the model.
+
+        Deepr flattens the visits with "<gap>" tokens before encoding, so the
+        features are left as is.
+        """
+        return collate_fn_dict
+
     def forward(self, **kwargs) -> Dict[str, torch.Tensor]:
 
         """Forward propagation."""
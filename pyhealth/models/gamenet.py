@@ -377,9 +377,8 @@ class GAMENet(BaseModel):
                     the ground truth of each drug.
 
         """
-        conditions = self.feat_tokenizers["conditions"].batch_encode_3d(conditions)
         # (patient, visit, code)
-        conditions = torch.tensor(conditions, dtype=torch.long, device=self.device)
+        conditions = self.encode_tokens("conditions", conditions)
         # (patient, visit, code, embedding_dim)
         conditions = self.embeddings["conditions"](conditions)
         # (patient, visit, embedding_dim)
@@ -387,9 +386,8 @@ class GAMENet(BaseModel):
         # (batch, visit, hidden_size)
         conditions, _ = self.cond_rnn(conditions)
 
-        procedures = self.feat_tokenizers["procedures"].batch_encode_3d(procedures)
         # (patient, visit, code)
-        procedures = torch.tensor(procedures, dtype=torch.long, device=self.device)
+        procedures = self.encode_tokens("procedures", procedures)
         # (patient, visit, code, embedding_dim)
         procedures = self.embeddings["procedures"](procedures)
         # (patient, visit, embedding_dim)
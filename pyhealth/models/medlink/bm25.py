@@ -3,52 +3,170 @@ Reference: https://github.com/dorianbrown/rank_bm25
 """
 
 import math
+from typing import List, Tuple, Union
 
 import numpy as np
+import scipy.sparse as sp
 
 
 class BM25:
+    """BM25 over an inverted index.
+
+    The corpus is stored as a sparse term x document matrix (i.e., for each
+    term, the posting array of the documents containing it), and the BM25
+    weight of each posting is precomputed. Scoring a batch of queries is then
+    a single sparse matrix product, which only touches the postings of the
+    query terms instead of every document.
+
+    Args:
+        corpus: a dict mapping corpus ids to documents, where each document is
+            a list of tokens (or a string of space-separated tokens).
+    """
+
     def __init__(self, corpus):
         self.corpus_size = len(corpus)
         self.corpus_ids = list(corpus.keys())
         self.corpus_list = [corpus[id] for id in self.corpus_ids]
         self.avgdl = 0
-        self.doc_freqs = []
         self.idf = {}
         self.doc_len = []
+        # token -> row of the inverted index
+        self.vocabulary = {}
 
         nd = self._initialize(self.corpus_list)
         self._calc_idf(nd)
+        self._build_index()
+
+    @staticmethod
+    def _tokenize(document: Union[str, List[str]]) -> List[str]:
+        if isinstance(document, str):
+            return document.split(" ")
+        return document
 
     def _initialize(self, corpus_list):
-        nd = {}  # word -> number of documents with word
-        num_doc = 0
-        for document in corpus_list:
+        term_ids = []
+        doc_ids = []
+        for doc_id, document in enumerate(corpus_list):
+            document = self._tokenize(document)
             self.doc_len.append(len(document))
-            num_doc += len(document)
-
-            frequencies = {}
             for word in document:
-                if word not in frequencies:
-                    frequencies[word] = 0
-                frequencies[word] += 1
-            self.doc_freqs.append(frequencies)
-
-            for word, freq in frequencies.items():
-                try:
-                    nd[word] += 1
-                except KeyError:
-                    nd[word] = 1
-
-        self.avgdl = num_doc / self.corpus_size
+                term_ids.append(self.vocabulary.setdefault(word, len(self.vocabulary)))
+            doc_ids.extend([doc_id] * len(document))
+        self.doc_len = np.array(self.doc_len, dtype=np.float64)
+        self.avgdl = self.doc_len.sum() / self.corpus_size
+
+        # term frequencies, duplicated (term, doc) entries are summed up
+        self.term_freqs = sp.csr_matrix(
+            (np.ones(len(term_ids)), (term_ids, doc_ids)),
+            shape=(len(self.vocabulary), self.corpus_size),
+        )
+        self.term_freqs.sum_duplicates()
+        # word -> number of documents with word
+        nd = dict(zip(self.vocabulary, np.diff(self.term_freqs.indptr).tolist()))
         return nd
 
     def _calc_idf(self, nd):
         raise NotImplementedError()
 
-    def get_scores(self, query):
+    def _calc_weights(self, tf: np.ndarray, dl: np.ndarray) -> np.ndarray:
         raise NotImplementedError()
 
+    def _build_index(self):
+        """Precomputes the BM25 weight of each posting of the inverted index."""
+        idf = np.array([self.idf[word] for word in self.vocabulary])
+        rows = np.repeat(
+            np.arange(len(self.vocabulary)), np.diff(self.term_freqs.indptr)
+        )
+        cols = self.term_freqs.indices
+        weights = idf[rows] * self._calc_weights(
+            self.term_freqs.data, self.doc_len[cols]
+        )
+        self.weights = sp.csr_matrix(
+            (weights, cols, self.term_freqs.indptr), shape=self.term_freqs.shape
+        )
+
+    def _encode_queries(self, queries: List[Union[str, List[str]]]) -> sp.csr_matrix:
+        """Helper function which converts queries to a query x term count matrix.
+
+        Tokens not in the corpus are dropped, as they score 0.
+        """
+        rows, cols = [], []
+        for i, query in enumerate(queries):
+            for word in self._tokenize(query):
+                term_id = self.vocabulary.get(word)
+                if term_id is not None:
+                    rows.append(i)
+                    cols.append(term_id)
+        return sp.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary)),
+        )
+
+    def get_batch_scores(
+        self, queries: List[Union[str, List[str]]], batch_size: int = 1024
+    ) -> np.ndarray:
+        """Scores a batch of queries against the whole corpus.
+
+        Args:
+            queries: list of queries, each a list of tokens or a string of
+                space-separated tokens. Repeated tokens are counted repeatedly.
+            batch_size: number of queries scored at once. Default is 1024.
+
+        Returns:
+            scores: array of shape (len(queries), corpus_size), in the order of
+                `self.corpus_ids`.
+        """
+        scores = np.zeros((len(queries), self.corpus_size))
+        for i in range(0, len(queries), batch_size):
+            query_matrix = self._encode_queries(queries[i : i + batch_size])
+            scores[i : i + batch_size] = (query_matrix @ self.weights).toarray()
+        return scores
+
+    def get_top_k(
+        self,
+        queries: List[Union[str, List[str]]],
+        k: int = 10,
+        batch_size: int = 1024,
+    ) -> List[List[Tuple[str, float]]]:
+        """Gets the k best scored corpus ids of each query.
+
+        Ties are broken by the order of the corpus, as `sorted()` on the scores
+        of `get_scores()` would do.
+
+        Args:
+            queries: list of queries, each a list of tokens or a string of
+                space-separated tokens.
+            k: number of corpus ids per query. Default is 10.
+            batch_size: number of queries scored at once. Default is 1024.
+
+        Returns:
+            A list with, for each query, a list of (corpus id, score) tuples
+                sorted by decreasing score.
+        """
+        k = min(k, self.corpus_size)
+        results = []
+        for i in range(0, len(queries), batch_size):
+            scores = self.get_batch_scores(queries[i : i + batch_size])
+            if k == 0:
+                results.extend([] for _ in scores)
+                continue
+            kth = np.partition(scores, -k, axis=1)[:, -k]
+            for row, threshold in zip(scores, kth):
+                # all ties of the k-th score, sorted by index
+                candidates = np.flatnonzero(row >= threshold)
+                top = candidates[np.argsort(-row[candidates], kind="stable")[:k]]
+                results.append([(self.corpus_ids[j], row[j]) for j in top.tolist()])
+        return results
+
+    def get_scores(self, query, random=False):
+        if not random:
+            score = self.get_batch_scores([query])[0]
+        else:
+            score = np.random.rand(self.corpus_size)
+        score = score.tolist()
+        score = {self.corpus_ids[idx]: s for idx, s in enumerate(score)}
+        return score
+
 
 class BM25Okapi(BM25):
     def __init__(self, corpus, k1=1.5, b=0.75, epsilon=0.25):
@@ -75,18 +193,7 @@ class BM25Okapi(BM25):
         for word in negative_idfs:
             self.idf[word] = eps
 
-    def get_scores(self, query, random=False):
-        if not random:
-            score = np.zeros(self.corpus_size)
-            doc_len = np.array(self.doc_len)
-            query = query.split(' ')
-            for q in query:
-                q_freq = np.array([(doc.get(q) or 0) for doc in self.doc_freqs])
-                score += (self.idf.get(q) or 0) * \
-                         (q_freq * (self.k1 + 1) / (q_freq + self.k1 * (
-                                 1 - self.b + self.b * doc_len / self.avgdl)))
-        else:
-            score = np.random.rand(self.corpus_size)
-        score = score.tolist()
-        score = {self.corpus_ids[idx]: s for idx, s in enumerate(score)}
-        return score
+    def _calc_weights(self, tf, dl):
+        return tf * (self.k1 + 1) / (
+            tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl)
+        )
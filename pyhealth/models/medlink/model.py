@@ -1,5 +1,6 @@
 from typing import Dict
 from typing import List
+from typing import Optional
 
 import torch
 import torch.nn as nn
@@ -147,15 +148,19 @@ class MedLink(BaseModel):
         corpus_emb = corpus_one_hot + pred_queries
         return corpus_emb
 
-    def compute_scores(self, queries_emb, corpus_emb):
-        n = torch.tensor(corpus_emb.shape[0]).to(queries_emb.device)
+    @staticmethod
+    def compute_idf(corpus_emb):
+        n = torch.tensor(corpus_emb.shape[0]).to(corpus_emb.device)
         df = (corpus_emb > 0).sum(dim=0)
         idf = torch.log(1 + n) - torch.log(1 + df)
-
-        tf = torch.einsum('ac,bc->abc', queries_emb, corpus_emb)
-
-        tf_idf = tf * idf
-        final_scores = tf_idf.sum(dim=-1)
+        return idf
+
+    def compute_scores(self, queries_emb, corpus_emb, idf=None):
+        if idf is None:
+            idf = self.compute_idf(corpus_emb)
+        # sum_c queries_emb[a, c] * corpus_emb[b, c] * idf[c], as a matmul
+        # instead of materializing the (query, corpus, vocab) tensor
+        final_scores = queries_emb @ (corpus_emb * idf).T
         return final_scores
 
     def get_loss(self, scores):
@@ -193,16 +198,99 @@ class MedLink(BaseModel):
                self.gamma * ret_loss
         return {"loss": loss}
 
-    def search(self, queries_ids, queries_embeddings, corpus_ids, corpus_embeddings):
-        scores = self.compute_scores(queries_embeddings, corpus_embeddings)
+    def search(
+        self,
+        queries_ids,
+        queries_embeddings,
+        corpus_ids,
+        corpus_embeddings,
+        top_k: Optional[int] = None,
+        candidates: Optional[Dict[str, List[str]]] = None,
+        batch_size: int = 256,
+    ):
+        """Scores the queries against the corpus.
+
+        The scores are computed for `batch_size` queries and `batch_size`
+        corpus records at a time, so the memory does not grow with the size
+        of the corpus.
+
+        Args:
+            queries_ids: list of query ids.
+            queries_embeddings: tensor of shape (query, vocab).
+            corpus_ids: list of corpus ids.
+            corpus_embeddings: tensor of shape (corpus, vocab).
+            top_k: number of best scored corpus ids kept per query. Default is
+                None, which keeps all of them.
+            candidates: a dict mapping query ids to the corpus ids which can be
+                retrieved for the query (e.g., from `generate_candidates()`).
+                Default is None, which allows all corpus ids.
+            batch_size: number of queries and corpus records scored at once.
+                Default is 256.
+
+        Returns:
+            A dict mapping each query id to a dict of corpus ids and scores,
+                which can be passed to `ranking_metrics_fn()`.
+        """
+        idf = self.compute_idf(corpus_embeddings)
+        corpus_index = {c_id: c_idx for c_idx, c_id in enumerate(corpus_ids)}
+        num_corpus = len(corpus_ids)
         results = {}
-        for q_idx, q_id in enumerate(queries_ids):
-            results[q_id] = {}
-            for c_idx, c_id in enumerate(corpus_ids):
-                results[q_id][c_id] = scores[q_idx, c_idx].item()
+        for q_start in range(0, len(queries_ids), batch_size):
+            batch_ids = queries_ids[q_start : q_start + batch_size]
+            batch_emb = queries_embeddings[q_start : q_start + batch_size]
+            mask = None
+            if candidates is not None:
+                # (query, corpus), True for the allowed corpus records
+                mask = torch.zeros(
+                    len(batch_ids),
+                    num_corpus,
+                    dtype=torch.bool,
+                    device=batch_emb.device,
+                )
+                for q_idx, q_id in enumerate(batch_ids):
+                    c_idx = [corpus_index[c_id] for c_id in candidates[q_id]]
+                    mask[q_idx, c_idx] = True
+            best_scores, best_idx = [], []
+            for c_start in range(0, num_corpus, batch_size):
+                scores = self.compute_scores(
+                    batch_emb, corpus_embeddings[c_start : c_start + batch_size], idf
+                )
+                if mask is not None:
+                    scores = scores.masked_fill(
+                        ~mask[:, c_start : c_start + batch_size], float("-inf")
+                    )
+                c_idx = torch.arange(
+                    c_start, c_start + scores.shape[1], device=scores.device
+                ).expand_as(scores)
+                best_scores.append(scores)
+                best_idx.append(c_idx)
+                if top_k is not None:
+                    # only keep the running top-k of the scored chunks
+                    scores, c_idx = torch.cat(best_scores, 1), torch.cat(best_idx, 1)
+                    scores, pos = scores.topk(min(top_k, scores.shape[1]), dim=1)
+                    best_scores, best_idx = [scores], [c_idx.gather(1, pos)]
+            scores = torch.cat(best_scores, 1).tolist()
+            c_idx = torch.cat(best_idx, 1).tolist()
+            for q_id, q_scores, q_c_idx in zip(batch_ids, scores, c_idx):
+                results[q_id] = {
+                    corpus_ids[i]: score
+                    for i, score in zip(q_c_idx, q_scores)
+                    if score != float("-inf")
+                }
         return results
 
-    def evaluate(self, corpus_dataloader, queries_dataloader):
+    def evaluate(
+        self,
+        corpus_dataloader,
+        queries_dataloader,
+        top_k: Optional[int] = None,
+        candidates: Optional[Dict[str, List[str]]] = None,
+        batch_size: int = 256,
+    ):
+        """Encodes the corpus and the queries and searches them.
+
+        See `search()` for `top_k`, `candidates` and `batch_size`.
+        """
         self.eval()
         all_corpus_ids, all_corpus_embeddings = [], []
         all_queries_ids, all_queries_embeddings = [], []
@@ -223,11 +311,13 @@ class MedLink(BaseModel):
                 all_queries_ids,
                 all_queries_embeddings,
                 all_corpus_ids,
-                all_corpus_embeddings
+                all_corpus_embeddings,
+                top_k=top_k,
+                candidates=candidates,
+                batch_size=batch_size,
             )
         return results
 
-
 if __name__ == "__main__":
     from pyhealth.datasets import MIMIC3Dataset
     from pyhealth.models import MedLink
@@ -24,21 +24,39 @@ def convert_to_ir_format(samples):
 
 
 def generate_candidates(corpus_meta, queries_meta):
+    """Gets the corpus records which can be linked to each query.
+
+    A corpus record is a candidate if it has the same identifiers as the query
+    and an age lower than or equal to the age of the query. The corpus records
+    are blocked by identifiers and sorted by age, so the candidates of a query
+    are found by a binary search in its block instead of a scan of the corpus.
+    The candidates are listed in the order of `corpus_meta`.
+    """
+    corpus_ids = list(corpus_meta.keys())
+    # identifiers -> positions of the corpus records
+    blocks = {}
+    for c_idx, d_meta in enumerate(corpus_meta.values()):
+        blocks.setdefault(d_meta["identifiers"], []).append(c_idx)
+    # identifiers -> (ages sorted in ascending order, positions in the same order)
+    for identifiers, positions in blocks.items():
+        positions = np.array(positions)
+        ages = np.array([corpus_meta[corpus_ids[i]]["age"] for i in positions])
+        order = np.argsort(ages, kind="stable")
+        blocks[identifiers] = (ages[order], positions[order])
     candidates = {}
     for q_id, q_meta in queries_meta.items():
-        age = q_meta["age"]
-        identifiers = q_meta["identifiers"]
         matches = []
-        for d_id, d_meta in corpus_meta.items():
-            if (d_meta["age"] <= age) and (d_meta["identifiers"] == identifiers):
-                matches.append(d_id)
+        if q_meta["identifiers"] in blocks:
+            ages, positions = blocks[q_meta["identifiers"]]
+            num_matches = np.searchsorted(ages, q_meta["age"], side="right")
+            matches = [corpus_ids[i] for i in np.sort(positions[:num_matches])]
         candidates[q_id] = matches
     # solve the problem of empty candidates
     average_matches = int(np.mean([len(v) for v in candidates.values()]))
     for q_id, q_meta in queries_meta.items():
         if len(candidates[q_id]) == 0:
             # random select average_matches candidates
-            candidates[q_id] = random.sample(list(corpus_meta.keys()), average_matches)
+            candidates[q_id] = random.sample(corpus_ids, average_matches)
     return candidates
 
 
@@ -72,17 +90,27 @@ def tvt_split(queries, qrels, train_ratio=0.7, val_ratio=0.1, test_ratio=0.2):
     return train_queries, val_queries, test_queries, train_qrels, val_qrels, test_qrels
 
 
-def get_bm25_hard_negatives(bm25_model, corpus, queries, qrels):
+def get_bm25_hard_negatives(bm25_model, corpus, queries, qrels, batch_size=1024):
+    """Gets the best scored corpus record other than the positive for each query.
+
+    The positive records are scored against the corpus in batches with
+    `bm25_model.get_top_k()`.
+    """
+    pairs = []
+    for q_id in queries:
+        for d_id in qrels[q_id]:
+            if qrels[q_id][d_id] > 0:
+                pairs.append((q_id, d_id))
     qrels_w_neg = {}
-    for q_id, q in tqdm.tqdm(queries.items()):
-        d_ids = [d_id for d_id in qrels[q_id] if qrels[q_id][d_id] > 0]
-        ds = [corpus[d_id] for d_id in d_ids]
-        for d_id, d in zip(d_ids, ds):
-            scores = bm25_model.get_scores(d)
-            for (ned_d_id, neg_s) in sorted(scores.items(), key=lambda x: x[1],
-                                            reverse=True):
-                if ned_d_id != d_id:
-                    qrels_w_neg[q_id] = {d_id: 1, ned_d_id: -1}
+    for i in tqdm.trange(0, len(pairs), batch_size):
+        batch = pairs[i : i + batch_size]
+        top_k = bm25_model.get_top_k(
+            [corpus[d_id] for _, d_id in batch], k=2, batch_size=batch_size
+        )
+        for (q_id, d_id), results in zip(batch, top_k):
+            for neg_d_id, neg_s in results:
+                if neg_d_id != d_id:
+                    qrels_w_neg[q_id] = {d_id: 1, neg_d_id: -1}
                     break
     return qrels_w_neg
 
@@ -333,10 +333,8 @@ class MoleRecLayer(torch.nn.Module):
         mul_pred_prob = y_prob.T @ y_prob  # (voc_size, voc_size)
         ddi_loss = (mul_pred_prob * ddi_adj).sum() / (ddi_adj.shape[0] ** 2)
 
-        y_pred = y_prob.detach().cpu().numpy()
-        y_pred[y_pred >= 0.5] = 1
-        y_pred[y_pred < 0.5] = 0
-        y_pred = [np.where(sample == 1)[0] for sample in y_pred]
+        # multi-hot predictions, scored on the device of the model
+        y_pred = y_prob.detach() >= 0.5
 
         loss_cls = binary_cross_entropy_with_logits(logits, labels)
         if self.multiloss_weight > 0 and label_index is not None:
@@ -346,7 +344,7 @@ class MoleRecLayer(torch.nn.Module):
                 + (1 - self.multiloss_weight) * loss_cls
             )
 
-        cur_ddi_rate = ddi_rate_score(y_pred, ddi_adj.cpu().numpy())
+        cur_ddi_rate = ddi_rate_score(y_pred, ddi_adj)
         if cur_ddi_rate > self.target_ddi:
             beta = self.coef * (1 - (cur_ddi_rate / self.target_ddi))
             beta = min(math.exp(beta), 1)
@@ -635,8 +633,7 @@ class MoleRec(BaseModel):
     def encode_patient(
         self, feature_key: str, raw_values: List[List[List[str]]]
     ) -> torch.Tensor:
-        codes = self.feat_tokenizers[feature_key].batch_encode_3d(raw_values)
-        codes = torch.tensor(codes, dtype=torch.long, device=self.device)
+        codes = self.encode_tokens(feature_key, raw_values)
         embeddings = self.embeddings[feature_key](codes)
         embeddings = torch.sum(self.dropout_fn(embeddings), dim=2)
         outputs, _ = self.rnns[feature_key](embeddings)
@@ -218,12 +218,10 @@ class SafeDrugLayer(nn.Module):
             torch.sum(mul_pred_prob.mul(self.ddi_adj)) / self.ddi_adj.shape[0] ** 2
         )
 
-        y_pred = y_prob.clone().detach().cpu().numpy()
-        y_pred[y_pred >= 0.5] = 1
-        y_pred[y_pred < 0.5] = 0
-        y_pred = [np.where(sample == 1)[0] for sample in y_pred]
+        # multi-hot predictions, scored on the device of the model
+        y_pred = y_prob.detach() >= 0.5
 
-        cur_ddi_rate = ddi_rate_score(y_pred, self.ddi_adj.cpu().numpy())
+        cur_ddi_rate = ddi_rate_score(y_pred, self.ddi_adj)
         if cur_ddi_rate > self.target_ddi:
             beta = max(0.0, 1 + (self.target_ddi - cur_ddi_rate) / self.kp)
             add_loss, beta = batch_ddi_loss, beta
@@ -577,9 +575,8 @@ class SafeDrug(BaseModel):
                 y_true: a tensor of shape [patient, visit, num_labels] representing
                     the ground truth of each drug.
         """
-        conditions = self.feat_tokenizers["conditions"].batch_encode_3d(conditions)
         # (patient, visit, code)
-        conditions = torch.tensor(conditions, dtype=torch.long, device=self.device)
+        conditions = self.encode_tokens("conditions", conditions)
         # (patient, visit, code, embedding_dim)
         conditions = self.embeddings["conditions"](conditions)
         # (patient, visit, embedding_dim)
@@ -587,9 +584,8 @@ class SafeDrug(BaseModel):
         # (batch, visit, hidden_size)
         conditions, _ = self.cond_rnn(conditions)
 
-        procedures = self.feat_tokenizers["procedures"].batch_encode_3d(procedures)
         # (patient, visit, code)
-        procedures = torch.tensor(procedures, dtype=torch.long, device=self.device)
+        procedures = self.encode_tokens("procedures", procedures)
         # (patient, visit, code, embedding_dim)
         procedures = self.embeddings["procedures"](procedures)
         # (patient, visit, embedding_dim)
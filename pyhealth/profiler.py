@@ -0,0 +1,277 @@
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# profiler of the running training loop, if any, see `record_phase()`
+_active_profiler = None
+
+
+@contextmanager
+def record_phase(name: str):
+    """Records the time spent in a block as a phase of the active profiler.
+
+    Used inside the models (e.g., for the tokenization in the forward pass) to
+    be reported by the `TrainingProfiler` of the training loop. The block is
+    also labeled in the torch.profiler trace. Without an active profiler,
+    during evaluation (which is reported as a whole), or in a DataLoader worker
+    process (which may have inherited the active profiler when forked), this
+    is a no-op.
+
+    Args:
+        name: name of the phase.
+    """
+    if (
+        _active_profiler is None
+        or _active_profiler.evaluating
+        or torch.utils.data.get_worker_info() is not None
+    ):
+        yield
+        return
+    with _active_profiler.phase(name):
+        yield
+
+
+def _get_batch_size(data: Dict) -> int:
+    """Helper function which gets the number of samples of a collated batch."""
+    for value in data.values():
+        return len(value)
+    return 0
+
+
+def get_peak_memory(device: str) -> float:
+    """Gets the peak memory of the training, in MB.
+
+    Args:
+        device: device of the model.
+
+    Returns:
+        The peak memory allocated by torch on a GPU device, or the peak
+            resident memory of the process on CPU, or nan if it is not
+            available (e.g., on Windows).
+    """
+    if torch.device(device).type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    try:
+        # only available on Unix
+        import resource
+    except ImportError:
+        return float("nan")
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    if sys.platform == "darwin":
+        return max_rss / 2**20
+    return max_rss / 2**10
+
+
+class TrainingProfiler:
+    """Per-phase timings and throughput of a training loop.
+
+    The training loop wraps its phases (e.g., "data", "forward", "backward",
+    "optimizer", "evaluation") into `phase()`, and calls `step()` after each
+    batch. Phases recorded inside the model with `record_phase()` (e.g.,
+    "tokenization" within "forward") are reported as well. Timings are
+    synchronized with the GPU, so they include the asynchronous kernels.
+
+    With `output_path`, `save()` writes:
+        - steps.csv: the time of each phase at each step, in seconds;
+        - profile.json: the summary of `summary()`;
+        - trace.json: if `trace` is True, a torch.profiler trace of a few
+          steps, which can be opened in chrome://tracing or Perfetto.
+
+    Args:
+        device: device of the model.
+        output_path: directory to save the results. Default is None, which
+            only logs the summary.
+        enabled: whether to profile. Default is True. If False, all methods
+            are no-ops.
+        trace: whether to export a torch.profiler trace. Default is False.
+        trace_steps: number of steps traced, after a warmup step. Default is 5.
+    """
+
+    def __init__(
+        self,
+        device: str,
+        output_path: Optional[str] = None,
+        enabled: bool = True,
+        trace: bool = False,
+        trace_steps: int = 5,
+    ):
+        self.device = device
+        self.output_path = output_path
+        self.enabled = enabled
+        self.synchronize = enabled and torch.device(device).type == "cuda"
+        self.steps = []
+        self.current_step = defaultdict(float)
+        self.phase_totals = defaultdict(float)
+        # phases recorded within another phase, e.g., tokenization in forward
+        self.nested_phases = set()
+        self.depth = 0
+        self.evaluating = False
+        self.num_samples = 0
+        self.start_time = None
+        self.stop_time = None
+        self.torch_profiler = None
+        if enabled and trace:
+            self.torch_profiler = torch.profiler.profile(
+                schedule=torch.profiler.schedule(
+                    wait=0, warmup=1, active=trace_steps, repeat=1
+                ),
+                on_trace_ready=self._save_trace,
+                record_shapes=True,
+                profile_memory=True,
+            )
+
+    def start(self) -> None:
+        """Starts profiling, and makes this profiler the active one."""
+        global _active_profiler
+        if not self.enabled:
+            return
+        _active_profiler = self
+        self.start_time = time.perf_counter()
+        if self.synchronize:
+            torch.cuda.reset_peak_memory_stats(self.device)
+        if self.torch_profiler is not None:
+            self.torch_profiler.start()
+
+    def stop(self) -> None:
+        """Stops profiling."""
+        global _active_profiler
+        if not self.enabled:
+            return
+        _active_profiler = None
+        self.stop_time = time.perf_counter()
+        if self.torch_profiler is not None:
+            self.torch_profiler.stop()
+            self.torch_profiler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times a block as the phase `name` of the current step."""
+        if not self.enabled:
+            yield
+            return
+        label = nullcontext()
+        if self.torch_profiler is not None:
+            label = torch.profiler.record_function(name)
+        if self.depth > 0:
+            self.nested_phases.add(name)
+        with label:
+            if self.synchronize:
+                torch.cuda.synchronize(self.device)
+            start = time.perf_counter()
+            self.depth += 1
+            self.evaluating = self.evaluating or name == "evaluation"
+            try:
+                yield
+            finally:
+                if self.synchronize:
+                    torch.cuda.synchronize(self.device)
+                elapsed = time.perf_counter() - start
+                self.depth -= 1
+                self.phase_totals[name] += elapsed
+                # evaluation is not part of the training steps
+                if name == "evaluation":
+                    self.evaluating = False
+                else:
+                    self.current_step[name] += elapsed
+
+    def step(self, data: Optional[Dict] = None) -> None:
+        """Ends the current step.
+
+        Args:
+            data: the batch of the step, to count the samples. Default is None.
+        """
+        if not self.enabled:
+            return
+        num_samples = 0 if data is None else _get_batch_size(data)
+        self.num_samples += num_samples
+        self.steps.append({"samples": num_samples, **self.current_step})
+        self.current_step = defaultdict(float)
+        if self.torch_profiler is not None:
+            self.torch_profiler.step()
+
+    def summary(self) -> Dict[str, float]:
+        """Summarizes the profile.
+
+        Returns:
+            A dict with the total time in seconds, the number of steps and of
+                samples, the training throughput in samples/sec (over the
+                training steps only), the peak memory in MB, and for each
+                phase, its total time in seconds and its share of the total.
+                Nested phases are also counted in their enclosing phase.
+        """
+        stop_time = self.stop_time or time.perf_counter()
+        total_time = stop_time - self.start_time
+        step_time = sum(
+            value
+            for key, value in self.phase_totals.items()
+            if key != "evaluation" and key not in self.nested_phases
+        )
+        summary = {
+            "total_time": total_time,
+            "num_steps": len(self.steps),
+            "num_samples": self.num_samples,
+            "samples_per_sec": self.num_samples / step_time if step_time else 0.0,
+            "peak_memory_mb": get_peak_memory(self.device),
+        }
+        for name, value in self.phase_totals.items():
+            summary[f"{name}_time"] = value
+            summary[f"{name}_share"] = value / total_time
+        return summary
+
+    def log(self) -> None:
+        """Logs the summary."""
+        if not self.enabled:
+            return
+        summary = self.summary()
+        logger.info("--- Profile ---")
+        logger.info(
+            f"steps: {summary['num_steps']}, samples: {summary['num_samples']}, "
+            f"samples/sec: {summary['samples_per_sec']:.1f}, "
+            f"peak memory: {summary['peak_memory_mb']:.1f} MB"
+        )
+        for name in self.phase_totals:
+            logger.info(
+                f"{name}: {summary[f'{name}_time']:.2f}s "
+                f"({100 * summary[f'{name}_share']:.1f}%)"
+            )
+
+    def save(self) -> None:
+        """Saves the per-step timings and the summary to `output_path`."""
+        if not self.enabled or self.output_path is None:
+            return
+        phases = [name for name in self.phase_totals if name != "evaluation"]
+        with open(os.path.join(self.output_path, "steps.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(
+                f, fieldnames=["step", "samples"] + phases, restval=0.0
+            )
+            writer.writeheader()
+            for i, step in enumerate(self.steps):
+                writer.writerow({"step": i, **step})
+        with open(os.path.join(self.output_path, "profile.json"), "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def _save_trace(self, torch_profiler) -> None:
+        if self.output_path is None:
+            return
+        torch_profiler.export_chrome_trace(
+            os.path.join(self.output_path, "trace.json")
+        )
@@ -1 +1,2 @@
-from .sage_sampler import NeighborSampler
\ No newline at end of file
+from .sage_sampler import NeighborSampler
+from .bucket_sampler import BucketBatchSampler
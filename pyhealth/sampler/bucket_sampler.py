@@ -0,0 +1,136 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+def _get_samples(dataset) -> List[Dict]:
+    """Helper function which gets the samples of a dataset without loading them.
+
+    Sample datasets keep their samples in `dataset.samples`, and the splitters
+    return `torch.utils.data.Subset` of them. Other datasets are indexed.
+    """
+    if isinstance(dataset, torch.utils.data.Subset):
+        samples = _get_samples(dataset.dataset)
+        return [samples[i] for i in dataset.indices]
+    if hasattr(dataset, "samples"):
+        return dataset.samples
+    return [dataset[i] for i in range(len(dataset))]
+
+
+def get_sample_length(
+    sample: Dict, keys: Optional[List[str]] = None
+) -> Tuple[int, int]:
+    """Gets the padded length of a sample.
+
+    Args:
+        sample: a sample dict.
+        keys: the keys of the features to consider. Default is None, which
+            considers all list values of the sample.
+
+    Returns:
+        length: max number of elements of the list features (e.g., number of
+            visits for [[code1, code2], [code3, ...], ...], number of codes for
+            [code1, code2, code3, ...]).
+        width: max number of elements of the inner lists of the nested list
+            features (e.g., number of codes per visit), 0 if there is none.
+    """
+    length, width = 0, 0
+    if keys is None:
+        keys = sample.keys()
+    for key in keys:
+        value = sample[key]
+        if not isinstance(value, list):
+            continue
+        length = max(length, len(value))
+        if len(value) > 0 and isinstance(value[0], list):
+            width = max(width, max(map(len, value)))
+    return length, width
+
+
+class BucketBatchSampler(Sampler):
+    """Batch sampler grouping samples of similar lengths.
+
+    Models pad each batch to its longest sample (e.g., to the max number of
+    visits and the max number of codes per visit), so a single long sample
+    inflates the tensors of the whole batch. This sampler sorts the samples by
+    `get_sample_length()`, splits the sorted samples into `num_buckets` buckets
+    of equal size, and draws each batch from a single bucket.
+
+    With `shuffle=True`, the samples are shuffled within each bucket and the
+    batches are shuffled across buckets at every epoch. Otherwise, the batches
+    are yielded from the shortest to the longest samples.
+
+    Args:
+        dataset: the sample dataset (or a subset of it).
+        batch_size: number of samples per batch.
+        shuffle: whether to shuffle the batches. Default is False.
+        num_buckets: number of buckets. Default is 10. More buckets reduce the
+            padding but make the batches less random.
+        drop_last: whether to drop the last incomplete batch of each bucket.
+            Default is False.
+        keys: the keys of the features used to compute the lengths. Default is
+            None, which uses all list values of the samples.
+        generator: random generator used for shuffling. Default is None.
+
+    Examples:
+        >>> from pyhealth.datasets import get_dataloader
+        >>> train_loader = get_dataloader(
+        ...     train_dataset, batch_size=32, shuffle=True, bucket_by_length=True
+        ... )
+    """
+
+    def __init__(
+        self,
+        dataset,
+        batch_size: int,
+        shuffle: bool = False,
+        num_buckets: int = 10,
+        drop_last: bool = False,
+        keys: Optional[List[str]] = None,
+        generator: Optional[torch.Generator] = None,
+    ):
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+        lengths = np.array(
+            [get_sample_length(sample, keys) for sample in _get_samples(dataset)],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        # sort by length, then by width; stable to keep the dataset order
+        order = np.lexsort((lengths[:, 1], lengths[:, 0]))
+        num_buckets = max(1, min(num_buckets, len(order)))
+        self.buckets = [
+            bucket for bucket in np.array_split(order, num_buckets) if len(bucket)
+        ]
+
+    def _split(self, bucket: np.ndarray) -> List[List[int]]:
+        batches = [
+            bucket[i : i + self.batch_size].tolist()
+            for i in range(0, len(bucket), self.batch_size)
+        ]
+        if self.drop_last and len(batches) and len(batches[-1]) < self.batch_size:
+            batches.pop()
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        if not self.shuffle:
+            for bucket in self.buckets:
+                yield from self._split(bucket)
+            return
+        batches = []
+        for bucket in self.buckets:
+            perm = torch.randperm(len(bucket), generator=self.generator).numpy()
+            batches.extend(self._split(bucket[perm]))
+        for i in torch.randperm(len(batches), generator=self.generator).tolist():
+            yield batches[i]
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return sum(len(bucket) // self.batch_size for bucket in self.buckets)
+        return sum(
+            (len(bucket) + self.batch_size - 1) // self.batch_size
+            for bucket in self.buckets
+        )
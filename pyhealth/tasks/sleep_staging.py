@@ -1,10 +1,11 @@
 import os
-import pickle
 import pkg_resources
 import mne
 import pandas as pd
 import numpy as np
 
+from pyhealth.datasets.epoch_store import save_epochs
+
 
 def sleep_staging_isruc_fn(record, epoch_seconds=10, label_id=1):
     """Processes a single patient for the sleep staging task on ISRUC.
@@ -23,7 +24,8 @@ def sleep_staging_isruc_fn(record, epoch_seconds=10, label_id=1):
 
     Returns:
         samples: a list of samples, each sample is a dict with patient_id, record_id,
-            and epoch_path (the path to the saved epoch {"X": signal, "Y": label} as key.
+            epoch_path and epoch_index (the path to the saved epochs of the record and
+            the position of the epoch, see `pyhealth.datasets.epoch_store`) as key.
 
     Note that we define the task as a multi-class classification task.
 
@@ -38,7 +40,8 @@ def sleep_staging_isruc_fn(record, epoch_seconds=10, label_id=1):
         {
             'record_id': '1-0',
             'patient_id': '1',
-            'epoch_path': '/home/zhenlin4/.cache/pyhealth/datasets/832afe6e6e8a5c9ea5505b47e7af8125/10-1/1/0.pkl',
+            'epoch_path': '/home/zhenlin4/.cache/pyhealth/datasets/832afe6e6e8a5c9ea5505b47e7af8125/10-1/1/epochs.npy',
+            'epoch_index': 0,
             'label': 'W'
         }
     """
@@ -91,26 +94,23 @@ def sleep_staging_isruc_fn(record, epoch_seconds=10, label_id=1):
     )[0]
     ann = ann.map(["W", "N1", "N2", "N3", "Unknown", "R"].__getitem__)
     assert "Unknown" not in ann.values, "bad annotations"
-    samples = []
+    samples, epochs = [], []
     sample_length = SAMPLE_RATE * epoch_seconds
+    # all epochs of the record are saved in a single memory-mapped file
+    save_file_path = os.path.join(save_path, "epochs.npy")
     for i, epoch_label in enumerate(np.repeat(ann.values, 30 // epoch_seconds)):
         epoch_signal = data[i * sample_length : (i + 1) * sample_length].T
-        save_file_path = os.path.join(save_path, f"{i}.pkl")
-        pickle.dump(
-            {
-                "signal": epoch_signal,
-                "label": epoch_label,
-            },
-            open(save_file_path, "wb"),
-        )
+        epochs.append(epoch_signal)
         samples.append(
             {
                 "record_id": f"{record['subject_id']}-{i}",
                 "patient_id": record["subject_id"],
                 "epoch_path": save_file_path,
+                "epoch_index": i,
                 "label": epoch_label,  # use for counting the label tokens
             }
         )
+    save_epochs(save_file_path, epochs)
     return samples
 
 
@@ -127,7 +127,8 @@ def sleep_staging_sleepedf_fn(record, epoch_seconds=30):
 
     Returns:
         samples: a list of samples, each sample is a dict with patient_id, record_id,
-            and epoch_path (the path to the saved epoch {"X": signal, "Y": label} as key.
+            epoch_path and epoch_index (the path to the saved epochs of the record and
+            the position of the epoch, see `pyhealth.datasets.epoch_store`) as key.
 
     Note that we define the task as a multi-class classification task.
 
@@ -142,7 +143,8 @@ def sleep_staging_sleepedf_fn(record, epoch_seconds=30):
         {
             'record_id': 'SC4001-0',
             'patient_id': 'SC4001',
-            'epoch_path': '/home/chaoqiy2/.cache/pyhealth/datasets/70d6dbb28bd81bab27ae2f271b2cbb0f/SC4001-0.pkl',
+            'epoch_path': '/home/chaoqiy2/.cache/pyhealth/datasets/70d6dbb28bd81bab27ae2f271b2cbb0f/SC4001.npy',
+            'epoch_index': 0,
             'label': 'W'
         }
     """
@@ -181,8 +183,10 @@ def sleep_staging_sleepedf_fn(record, epoch_seconds=30):
         for _ in range(int(dur) // 30):
             labels.append(des)
 
-    samples = []
+    samples, epochs = [], []
     sample_length = SAMPLE_RATE * epoch_seconds
+    # all epochs of the record are saved in a single memory-mapped file
+    save_file_path = os.path.join(save_path, f"{pid}.npy")
     # slice the EEG signals into non-overlapping windows
     # window size = sampling rate * second time = 100 * epoch_seconds
     for slice_index in range(min(X.shape[1] // sample_length, len(labels))):
@@ -201,24 +205,18 @@ def sleep_staging_sleepedf_fn(record, epoch_seconds=30):
             :, slice_index * sample_length : (slice_index + 1) * sample_length
         ]
         epoch_label = labels[slice_index][-1]  # "W", "1", "2", "3", "R"
-        save_file_path = os.path.join(save_path, f"{pid}-{slice_index}.pkl")
-
-        pickle.dump(
-            {
-                "signal": epoch_signal,
-                "label": epoch_label,
-            },
-            open(save_file_path, "wb"),
-        )
 
         samples.append(
             {
                 "record_id": f"{pid}-{slice_index}",
                 "patient_id": pid,
                 "epoch_path": save_file_path,
+                "epoch_index": len(epochs),
                 "label": epoch_label,  # use for counting the label tokens
             }
         )
+        epochs.append(epoch_signal)
+    save_epochs(save_file_path, epochs)
     return samples
 
 
@@ -235,7 +233,8 @@ def sleep_staging_shhs_fn(record, epoch_seconds=30):
 
     Returns:
         samples: a list of samples, each sample is a dict with patient_id, record_id,
-            and epoch_path (the path to the saved epoch {"X": signal, "Y": label} as key.
+            epoch_path and epoch_index (the path to the saved epochs of the record and
+            the position of the epoch, see `pyhealth.datasets.epoch_store`) as key.
 
     Note that we define the task as a multi-class classification task.
 
@@ -251,7 +250,8 @@ def sleep_staging_shhs_fn(record, epoch_seconds=30):
         {
             'record_id': 'shhs1-200001-0', 
             'patient_id': 'shhs1-200001', 
-            'epoch_path': '/home/chaoqiy2/.cache/pyhealth/datasets/76c1ce8195a2e1a654e061cb5df4671a/shhs1-200001-0.pkl', 
+            'epoch_path': '/home/chaoqiy2/.cache/pyhealth/datasets/76c1ce8195a2e1a654e061cb5df4671a/shhs1-200001.npy',
+            'epoch_index': 0,
             'label': '0'
         }
     """
@@ -297,9 +297,11 @@ def sleep_staging_shhs_fn(record, epoch_seconds=30):
         root = ET.fromstring(text)
         Y = [i.text for i in root.find('SleepStages').findall('SleepStage')]
 
-    samples = []
+    samples, epochs = [], []
     sample_length = SAMPLE_RATE * epoch_seconds
-    
+    # all epochs of the record are saved in a single memory-mapped file
+    save_file_path = os.path.join(save_path, f"{pid}.npy")
+
     # slice the EEG signals into non-overlapping windows
     # window size = sampling rate * second time = 125 * epoch_seconds
     for slice_index in range(X.shape[1] // sample_length):
@@ -308,24 +310,18 @@ def sleep_staging_shhs_fn(record, epoch_seconds=30):
             :, slice_index * sample_length : (slice_index + 1) * sample_length
         ]
         epoch_label = Y[slice_index]
-        save_file_path = os.path.join(save_path, f"{pid}-{slice_index}.pkl")
-
-        pickle.dump(
-            {
-                "signal": epoch_signal,
-                "label": epoch_label,
-            },
-            open(save_file_path, "wb"),
-        )
 
         samples.append(
             {
                 "record_id": f"{pid}-{slice_index}",
                 "patient_id": pid,
                 "epoch_path": save_file_path,
+                "epoch_index": len(epochs),
                 "label": epoch_label,  # use for counting the label tokens
             }
         )
+        epochs.append(epoch_signal)
+    save_epochs(save_file_path, epochs)
     return samples
 
 
@@ -1,5 +1,8 @@
+from itertools import chain
 from typing import List, Optional, Tuple
 
+import numpy as np
+
 
 class Vocabulary:
     """Vocabulary class for mapping between tokens and indices."""
@@ -125,6 +128,126 @@ class Tokenizer:
         """
         return [self.vocabulary.idx2token[idx] for idx in indices]
 
+    def _convert_tokens_to_array(self, tokens: List[str]) -> np.ndarray:
+        """Helper function which converts a flat list of tokens to an index array.
+
+        Same as `convert_tokens_to_indices()`, but the lookup goes through a
+        single `map` over the vocabulary dict and the result is an int64 array.
+        """
+        token2idx = self.vocabulary.token2idx
+        indices = np.fromiter(
+            map(token2idx.get, tokens, [-1] * len(tokens)),
+            dtype=np.int64,
+            count=len(tokens),
+        )
+        unknown = indices < 0
+        if unknown.any():
+            if "<unk>" not in token2idx:
+                token = tokens[int(np.argmax(unknown))]
+                raise ValueError("Unknown token: {}".format(token))
+            indices[unknown] = token2idx["<unk>"]
+        return indices
+
+    def _fill_array(
+        self, tokens: List[str], mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Helper function which scatters the indices of tokens into a padded array.
+
+        Args:
+            tokens: flat list of tokens, in row-major order of `mask`.
+            mask: boolean array which is True at the positions of the tokens.
+
+        Returns:
+            indices: int64 array of the same shape as `mask`, padded with the
+                index of <pad>.
+            mask: the mask.
+        """
+        indices = np.empty(mask.shape, dtype=np.int64)
+        if not mask.all():
+            indices.fill(self.get_padding_index())
+        indices[mask] = self._convert_tokens_to_array(tokens)
+        return indices, mask
+
+    def batch_encode_2d_array(
+        self,
+        batch: List[List[str]],
+        truncation: bool = True,
+        max_length: int = 512,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Converts a list of lists of tokens (2D) to a padded index array.
+
+        Same as `batch_encode_2d()` with padding, but the tokens are flattened
+        and encoded in a single pass, and then scattered into a NumPy array,
+        instead of padding and encoding each list in Python.
+
+        Args:
+            batch: List of lists of tokens to convert to indices.
+            truncation: whether to truncate the tokens to max_length.
+            max_length: maximum length of the tokens. This argument is ignored
+                if truncation is False.
+
+        Returns:
+            indices: int64 array of shape (batch size, max number of tokens).
+            mask: boolean array of the same shape, False at padded positions.
+
+        Examples:
+            >>> tokens = [
+            ...     ['A03C', 'A03D', 'A03E', 'A03F'],
+            ...     ['A04A', 'B035', 'C129']
+            ... ]
+            >>> indices, mask = tokenizer.batch_encode_2d_array(tokens)
+            >>> indices
+            array([[ 8,  9, 10, 11],
+                   [12,  1,  1,  0]])
+        """
+        if truncation:
+            batch = [tokens[-max_length:] for tokens in batch]
+        lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        max_len = int(lengths.max()) if len(batch) > 0 else 0
+        mask = np.arange(max_len) < lengths[:, None]
+        return self._fill_array(list(chain.from_iterable(batch)), mask)
+
+    def batch_encode_3d_array(
+        self,
+        batch: List[List[List[str]]],
+        truncation: Tuple[bool, bool] = (True, True),
+        max_length: Tuple[int, int] = (10, 512),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Converts a list of lists of lists of tokens (3D) to a padded index array.
+
+        Same as `batch_encode_3d()` with padding along both dimensions, but
+        encoded in a single pass like `batch_encode_2d_array()`.
+
+        Args:
+            batch: List of lists of lists of tokens to convert to indices.
+            truncation: a tuple of two booleans indicating whether to truncate the
+                tokens to the corresponding element in max_length
+            max_length: a tuple of two integers indicating the maximum length of the
+                tokens along the first and second dimension. This argument is ignored
+                if truncation is False.
+
+        Returns:
+            indices: int64 array of shape (batch size, max number of visits,
+                max number of tokens per visit).
+            mask: boolean array of the same shape, False at padded positions.
+        """
+        if truncation[0]:
+            batch = [visits[-max_length[0] :] for visits in batch]
+        visits = list(chain.from_iterable(batch))
+        if truncation[1]:
+            visits = [tokens[-max_length[1] :] for tokens in visits]
+        num_visits = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        num_tokens = np.fromiter(map(len, visits), dtype=np.int64, count=len(visits))
+        max_visits = int(num_visits.max()) if len(batch) > 0 else 0
+        max_tokens = int(num_tokens.max()) if len(visits) > 0 else 0
+        visit_mask = np.arange(max_visits) < num_visits[:, None]
+        if not visit_mask.all():
+            # padded visits hold at least one <pad>, as in batch_encode_3d()
+            max_tokens = max(max_tokens, 1)
+        mask = np.zeros((len(batch), max_visits, max_tokens), dtype=bool)
+        mask[visit_mask] = np.arange(max_tokens) < num_tokens[:, None]
+        return self._fill_array(list(chain.from_iterable(visits)), mask)
+
     def batch_encode_2d(
         self,
         batch: List[List[str]],
@@ -161,14 +284,11 @@ class Tokenizer:
             case 3: [[9, 10, 11], [12, 1, 1]]
         """
 
+        if padding:
+            indices, _ = self.batch_encode_2d_array(batch, truncation, max_length)
+            return indices.tolist()
         if truncation:
             batch = [tokens[-max_length:] for tokens in batch]
-        if padding:
-            batch_max_length = max([len(tokens) for tokens in batch])
-            batch = [
-                tokens + ["<pad>"] * (batch_max_length - len(tokens))
-                for tokens in batch
-            ]
         return [[self.vocabulary(token) for token in tokens] for tokens in batch]
 
     def batch_decode_2d(
@@ -252,6 +372,9 @@ class Tokenizer:
                 >>> print ('case 5:', indices)
                 case 5: [[[10, 11], [24, 25]], [[1, 1], [0, 0]]]
         """
+        if padding[0] and padding[1]:
+            indices, _ = self.batch_encode_3d_array(batch, truncation, max_length)
+            return indices.tolist()
         if truncation[0]:
             batch = [tokens[-max_length[0] :] for tokens in batch]
         if truncation[1]:
@@ -1,3 +1,4 @@
+import contextlib
 import logging
 import os
 from datetime import datetime
@@ -11,8 +12,10 @@ from torch.utils.data import DataLoader
 from tqdm import tqdm
 from tqdm.autonotebook import trange
 
-from pyhealth.metrics import (binary_metrics_fn, multiclass_metrics_fn,
-                              multilabel_metrics_fn, regression_metrics_fn)
+from pyhealth.metrics import (StreamingMetrics, binary_metrics_fn,
+                              multiclass_metrics_fn, multilabel_metrics_fn,
+                              regression_metrics_fn)
+from pyhealth.profiler import TrainingProfiler
 from pyhealth.utils import create_directory
 
 logger = logging.getLogger(__name__)
@@ -50,6 +53,25 @@ def get_metrics_fn(mode: str) -> Callable:
         raise ValueError(f"Mode {mode} is not supported")
 
 
+def get_autocast_dtype(mixed_precision: Optional[str]) -> Optional[torch.dtype]:
+    if mixed_precision is None:
+        return None
+    elif mixed_precision == "bf16":
+        return torch.bfloat16
+    elif mixed_precision == "fp16":
+        return torch.float16
+    else:
+        raise ValueError(f"Mixed precision {mixed_precision} is not supported")
+
+
+def get_grad_scaler():
+    """Gets a loss scaler for fp16 training on GPU."""
+    # torch.amp.GradScaler is only available from torch 2.3
+    if hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler("cuda")
+    return torch.cuda.amp.GradScaler()
+
+
 class Trainer:
     """Trainer for PyTorch models.
 
@@ -64,6 +86,10 @@ class Trainer:
         enable_logging: Whether to enable logging. Default is True.
         output_path: Path to save the output. Default is "./output".
         exp_name: Name of the experiment. Default is current datetime.
+        streaming_metrics: Whether to accumulate the metrics batch by batch
+            during evaluation (see `pyhealth.metrics.StreamingMetrics`), instead
+            of keeping all predictions in memory. ROC/PR AUC are then
+            approximated with histograms. Default is False.
     """
 
     def __init__(
@@ -75,6 +101,7 @@ class Trainer:
         enable_logging: bool = True,
         output_path: Optional[str] = None,
         exp_name: Optional[str] = None,
+        streaming_metrics: bool = False,
     ):
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -82,6 +109,7 @@ class Trainer:
         self.model = model
         self.metrics = metrics
         self.device = device
+        self.streaming_metrics = streaming_metrics
 
         # set logger
         if enable_logging:
@@ -125,6 +153,11 @@ class Trainer:
         monitor: Optional[str] = None,
         monitor_criterion: str = "max",
         load_best_model_at_last: bool = True,
+        mixed_precision: Optional[str] = None,
+        gradient_accumulation_steps: int = 1,
+        compile_model: bool = False,
+        profile: bool = False,
+        profile_trace: bool = False,
     ):
         """Trains the model.
 
@@ -142,9 +175,32 @@ class Trainer:
             monitor_criterion: Criterion to monitor. Default is "max".
             load_best_model_at_last: Whether to load the best model at the last.
                 Default is True.
+            mixed_precision: "bf16" or "fp16" to run the forward pass under
+                autocast, on CPU or GPU. "fp16" on GPU also scales the loss to
+                avoid gradient underflow. Default is None, which trains in fp32.
+            gradient_accumulation_steps: Number of batches whose gradients are
+                accumulated before each optimizer step, i.e., the effective
+                batch size is gradient_accumulation_steps times the batch size.
+                The last group of an epoch may have fewer batches, its loss is
+                averaged over the batches it has. Default is 1.
+            compile_model: Whether to train with `torch.compile(model)`. The
+                compiled module shares the parameters of the model, so
+                evaluation and checkpoints are unchanged. Default is False.
+            profile: Whether to time the phases of the training (data loading,
+                forward, tokenization within forward, backward, optimizer and
+                evaluation), with the throughput and the peak memory (see
+                `pyhealth.profiler.TrainingProfiler`). The summary is logged
+                and, with logging enabled, the per-step timings and the summary
+                are saved to steps.csv and profile.json in the experiment
+                directory. Default is False.
+            profile_trace: Whether to also export a torch.profiler trace of the
+                first steps to trace.json in the experiment directory. Default
+                is False.
         """
         if optimizer_params is None:
             optimizer_params = {"lr": 1e-3}
+        autocast_dtype = get_autocast_dtype(mixed_precision)
+        device_type = torch.device(self.device).type
 
         # logging
         logger.info("Training:")
@@ -157,6 +213,9 @@ class Trainer:
         logger.info(f"Monitor: {monitor}")
         logger.info(f"Monitor criterion: {monitor_criterion}")
         logger.info(f"Epochs: {epochs}")
+        logger.info(f"Mixed precision: {mixed_precision}")
+        logger.info(f"Gradient accumulation steps: {gradient_accumulation_steps}")
+        logger.info(f"Compile model: {compile_model}")
 
         # set optimizer
         param = list(self.model.named_parameters())
@@ -172,6 +231,17 @@ class Trainer:
             },
         ]
         optimizer = optimizer_class(optimizer_grouped_parameters, **optimizer_params)
+        # loss scaling is only needed for fp16 gradients on GPU
+        scaler = None
+        if autocast_dtype == torch.float16 and device_type == "cuda":
+            scaler = get_grad_scaler()
+        model = torch.compile(self.model) if compile_model else self.model
+        profiler = TrainingProfiler(
+            self.device,
+            output_path=self.exp_path,
+            enabled=profile or profile_trace,
+            trace=profile_trace,
+        )
 
         # initialize
         data_iterator = iter(train_dataloader)
@@ -180,60 +250,98 @@ class Trainer:
             steps_per_epoch = len(train_dataloader)
         global_step = 0
 
-        # epoch training loop
-        for epoch in range(epochs):
-            training_loss = []
-            self.model.zero_grad()
-            self.model.train()
-            # batch training loop
-            logger.info("")
-            for _ in trange(
-                steps_per_epoch,
-                desc=f"Epoch {epoch} / {epochs}",
-                smoothing=0.05,
-            ):
-                try:
-                    data = next(data_iterator)
-                except StopIteration:
-                    data_iterator = iter(train_dataloader)
-                    data = next(data_iterator)
-                # forward
-                output = self.model(**data)
-                loss = output["loss"]
-                # backward
-                loss.backward()
-                if max_grad_norm is not None:
-                    torch.nn.utils.clip_grad_norm_(
-                        self.model.parameters(), max_grad_norm
+        profiler.start()
+        # the profiler is active until stopped, also if the training fails
+        try:
+            # epoch training loop
+            for epoch in range(epochs):
+                training_loss = []
+                self.model.zero_grad()
+                self.model.train()
+                # batch training loop
+                logger.info("")
+                for step in trange(
+                    steps_per_epoch,
+                    desc=f"Epoch {epoch} / {epochs}",
+                    smoothing=0.05,
+                ):
+                    with profiler.phase("data"):
+                        try:
+                            data = next(data_iterator)
+                        except StopIteration:
+                            data_iterator = iter(train_dataloader)
+                            data = next(data_iterator)
+                    # forward
+                    if autocast_dtype is not None:
+                        autocast = torch.autocast(device_type, dtype=autocast_dtype)
+                    else:
+                        autocast = contextlib.nullcontext()
+                    with profiler.phase("forward"), autocast:
+                        output = model(**data)
+                    loss = output["loss"]
+                    # backward, averaged over the batches of the accumulation group
+                    # (the last group of the epoch may be smaller)
+                    group_start = step - step % gradient_accumulation_steps
+                    group_size = min(
+                        gradient_accumulation_steps, steps_per_epoch - group_start
                     )
-                # update
-                optimizer.step()
-                optimizer.zero_grad()
-                training_loss.append(loss.item())
-                global_step += 1
-            # log and save
-            logger.info(f"--- Train epoch-{epoch}, step-{global_step} ---")
-            logger.info(f"loss: {sum(training_loss) / len(training_loss):.4f}")
-            if self.exp_path is not None:
-                self.save_ckpt(os.path.join(self.exp_path, "last.ckpt"))
-
-            # validation
-            if val_dataloader is not None:
-                scores = self.evaluate(val_dataloader)
-                logger.info(f"--- Eval epoch-{epoch}, step-{global_step} ---")
-                for key in scores.keys():
-                    logger.info("{}: {:.4f}".format(key, scores[key]))
-                # save best model
-                if monitor is not None:
-                    score = scores[monitor]
-                    if is_best(best_score, score, monitor_criterion):
-                        logger.info(
-                            f"New best {monitor} score ({score:.4f}) "
-                            f"at epoch-{epoch}, step-{global_step}"
-                        )
-                        best_score = score
-                        if self.exp_path is not None:
-                            self.save_ckpt(os.path.join(self.exp_path, "best.ckpt"))
+                    with profiler.phase("backward"):
+                        if scaler is not None:
+                            scaler.scale(loss / group_size).backward()
+                        else:
+                            (loss / group_size).backward()
+                    training_loss.append(loss.item())
+                    # update after the last accumulated batch (or of the epoch)
+                    if (step + 1) % gradient_accumulation_steps != 0 and (
+                        step + 1 != steps_per_epoch
+                    ):
+                        profiler.step(data)
+                        continue
+                    with profiler.phase("optimizer"):
+                        if max_grad_norm is not None:
+                            if scaler is not None:
+                                scaler.unscale_(optimizer)
+                            torch.nn.utils.clip_grad_norm_(
+                                self.model.parameters(), max_grad_norm
+                            )
+                        if scaler is not None:
+                            scaler.step(optimizer)
+                            scaler.update()
+                        else:
+                            optimizer.step()
+                        optimizer.zero_grad()
+                    profiler.step(data)
+                    global_step += 1
+                # log and save
+                logger.info(f"--- Train epoch-{epoch}, step-{global_step} ---")
+                logger.info(f"loss: {sum(training_loss) / len(training_loss):.4f}")
+                if self.exp_path is not None:
+                    self.save_ckpt(os.path.join(self.exp_path, "last.ckpt"))
+
+                # validation
+                if val_dataloader is not None:
+                    with profiler.phase("evaluation"):
+                        scores = self.evaluate(val_dataloader)
+                    logger.info(f"--- Eval epoch-{epoch}, step-{global_step} ---")
+                    for key in scores.keys():
+                        logger.info("{}: {:.4f}".format(key, scores[key]))
+                    # save best model
+                    if monitor is not None:
+                        score = scores[monitor]
+                        if is_best(best_score, score, monitor_criterion):
+                            logger.info(
+                                f"New best {monitor} score ({score:.4f}) "
+                                f"at epoch-{epoch}, step-{global_step}"
+                            )
+                            best_score = score
+                            if self.exp_path is not None:
+                                self.save_ckpt(
+                                    os.path.join(self.exp_path, "best.ckpt")
+                                )
+        finally:
+            profiler.stop()
+        profiler.log()
+        profiler.save()
 
         # load best model
         if load_best_model_at_last and self.exp_path is not None and os.path.isfile(
@@ -251,17 +359,22 @@ class Trainer:
         return
 
     def inference(self, dataloader, additional_outputs=None,
-                  return_patient_ids=False) -> Dict[str, float]:
+                  return_patient_ids=False,
+                  batch_callback: Optional[Callable] = None) -> Dict[str, float]:
         """Model inference.
 
         Args:
             dataloader: Dataloader for evaluation.
             additional_outputs: List of additional output to collect.
                 Defaults to None ([]).
+            batch_callback: Function called with the true labels, the predicted
+                probabilities and the loss of each batch. If given, the labels
+                and probabilities are passed to it instead of being collected.
+                Defaults to None.
 
         Returns:
-            y_true_all: List of true labels.
-            y_prob_all: List of predicted probabilities.
+            y_true_all: List of true labels (None with batch_callback).
+            y_prob_all: List of predicted probabilities (None with batch_callback).
             loss_mean: Mean loss over batches.
             additional_outputs (only if requested): Dict of additional results.
             patient_ids (only if requested): List of patient ids in the same order as y_true_all/y_prob_all.
@@ -280,16 +393,22 @@ class Trainer:
                 y_true = output["y_true"].cpu().numpy()
                 y_prob = output["y_prob"].cpu().numpy()
                 loss_all.append(loss.item())
-                y_true_all.append(y_true)
-                y_prob_all.append(y_prob)
+                if batch_callback is not None:
+                    batch_callback(y_true, y_prob, loss.item())
+                else:
+                    y_true_all.append(y_true)
+                    y_prob_all.append(y_prob)
                 if additional_outputs is not None:
                     for key in additional_outputs.keys():
                         additional_outputs[key].append(output[key].cpu().numpy())
             if return_patient_ids:
                 patient_ids.extend(data["patient_id"])
         loss_mean = sum(loss_all) / len(loss_all)
-        y_true_all = np.concatenate(y_true_all, axis=0)
-        y_prob_all = np.concatenate(y_prob_all, axis=0)
+        if batch_callback is not None:
+            y_true_all, y_prob_all = None, None
+        else:
+            y_true_all = np.concatenate(y_true_all, axis=0)
+            y_prob_all = np.concatenate(y_prob_all, axis=0)
         outputs = [y_true_all, y_prob_all, loss_mean]
         if additional_outputs is not None:
             additional_outputs = {key: np.concatenate(val)
@@ -308,7 +427,16 @@ class Trainer:
         Returns:
             scores: a dictionary of scores.
         """
-        if self.model.mode is not None:
+        if self.model.mode is not None and self.streaming_metrics:
+            streaming_metrics = StreamingMetrics(self.model.mode, self.metrics)
+            self.inference(
+                dataloader,
+                batch_callback=lambda y_true, y_prob, loss: streaming_metrics.update(
+                    y_true, y_prob, loss=loss
+                ),
+            )
+            scores = streaming_metrics.compute()
+        elif self.model.mode is not None:
             y_true_all, y_prob_all, loss_mean = self.inference(dataloader)
             mode = self.model.mode
             metrics_fn = get_metrics_fn(mode)
@@ -0,0 +1,90 @@
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from torch.utils.data import Subset
+
+from pyhealth.calib.calibration import TemperatureScaling
+from pyhealth.calib.predictionset import LABEL
+from pyhealth.calib.utils import ModelOutputCache, prepare_numpy_dataset
+from pyhealth.datasets import SampleEHRDataset
+from pyhealth.models import MLP
+
+
+# this test suite verifies that the cached model outputs match the outputs of
+# the model, and that the model is only run once per checkpoint and dataset.
+
+
+class TestModelOutputCache(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        samples = [
+            {
+                "patient_id": f"patient-{i}",
+                "visit_id": f"visit-{i}",
+                "conditions": [f"cond-{c}" for c in rng.choice(20, 3, replace=False)],
+                "label": int(rng.randint(3)),
+            }
+            for i in range(100)
+        ]
+        self.dataset = SampleEHRDataset(samples=samples)
+        torch.manual_seed(0)
+        self.model = MLP(
+            dataset=self.dataset,
+            feature_keys=["conditions"],
+            label_key="label",
+            mode="multiclass",
+        )
+        self.model.eval()
+        self.num_forward = 0
+
+        def count(*args):
+            self.num_forward += 1
+
+        self.model.register_forward_hook(count)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = ModelOutputCache(self.cache_dir.name)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_outputs(self):
+        keys = ["y_true", "y_prob", "logit"]
+        expected = prepare_numpy_dataset(self.model, self.dataset, keys)
+        num_forward = self.num_forward
+        for _ in range(2):
+            outputs = prepare_numpy_dataset(
+                self.model, self.dataset, keys, cache=self.cache
+            )
+            for key in keys:
+                np.testing.assert_array_equal(outputs[key], expected[key])
+        self.assertEqual(self.num_forward, 2 * num_forward)
+
+    def test_calibrators(self):
+        cal_dataset = Subset(self.dataset, np.arange(50))
+        with self.cache:
+            TemperatureScaling(self.model).calibrate(cal_dataset=cal_dataset)
+            num_forward = self.num_forward
+            for alpha in [0.05, 0.1, 0.2]:
+                LABEL(self.model, alpha=alpha).calibrate(cal_dataset=cal_dataset)
+        # "y_true" and "logit" are cached, LABEL only runs the model for "y_prob"
+        self.assertEqual(self.num_forward, 2 * num_forward)
+
+    def test_keys(self):
+        keys = ["y_true", "y_prob"]
+        prepare_numpy_dataset(self.model, self.dataset, keys, cache=self.cache)
+        num_forward = self.num_forward
+        # another subset of the samples
+        subset = Subset(self.dataset, np.arange(1, 100))
+        prepare_numpy_dataset(self.model, subset, keys, cache=self.cache)
+        self.assertEqual(self.num_forward, 2 * num_forward)
+        # another checkpoint
+        with torch.no_grad():
+            self.model.fc.weight.add_(1.0)
+        prepare_numpy_dataset(self.model, self.dataset, keys, cache=self.cache)
+        self.assertEqual(self.num_forward, 3 * num_forward)
+
+
+if __name__ == "__main__":
+    unittest.main()
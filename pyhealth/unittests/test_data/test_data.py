@@ -1,6 +1,7 @@
 import unittest
 import datetime
-from pyhealth.data import Event, Visit, Patient
+import pickle
+from pyhealth.data import Event, EventList, Visit, Patient
 
 
 class TestEvent(unittest.TestCase):
@@ -31,6 +32,68 @@ class TestEvent(unittest.TestCase):
         self.assertEqual(attr_dict["add_attr1"], "add_attr1")
         self.assertEqual(attr_dict["add_attr2"], {"key": "add_attr2"})
 
+    def test_pickle(self):
+        event = pickle.loads(pickle.dumps(self.event))
+        self.assertEqual(event.code, "428.0")
+        self.assertEqual(event.attr_dict, self.event.attr_dict)
+
+
+class TestEventList(unittest.TestCase):
+    def setUp(self):
+        self.event_list = EventList(
+            table="PRESCRIPTIONS",
+            visit_id="v001",
+            patient_id="p001",
+            code=["00069153041", "00069153042"],
+            vocabulary="NDC",
+            timestamp=[None, datetime.datetime(2012, 1, 1, 0, 0)],
+            dosage=["250mg", "500mg"],
+        )
+        self.visit = Visit(visit_id="v001", patient_id="p001")
+        self.visit.set_event_list("PRESCRIPTIONS", self.event_list)
+
+    def test_events(self):
+        self.assertEqual(len(self.event_list), 2)
+        event = self.event_list[-1]
+        self.assertEqual(event.code, "00069153042")
+        self.assertEqual(event.vocabulary, "NDC")
+        self.assertEqual(event.visit_id, "v001")
+        self.assertEqual(event.timestamp, datetime.datetime(2012, 1, 1, 0, 0))
+        self.assertEqual(event.attr_dict, {"dosage": "500mg"})
+        self.assertEqual([e.code for e in self.event_list], self.event_list.code)
+
+    def test_visit(self):
+        self.assertEqual(self.visit.num_events, 2)
+        self.assertEqual(
+            self.visit.get_code_list("PRESCRIPTIONS"), ["00069153041", "00069153042"]
+        )
+        self.visit.add_event(
+            Event(
+                code="00069153043",
+                table="PRESCRIPTIONS",
+                vocabulary="NDC",
+                visit_id="v001",
+                patient_id="p001",
+            )
+        )
+        self.assertIsInstance(self.visit.get_event_list("PRESCRIPTIONS"), list)
+        self.assertEqual(self.visit.num_events, 3)
+
+    def test_get_event_list(self):
+        events = self.visit.get_event_list("PRESCRIPTIONS")
+        self.assertIsInstance(events, list)
+        self.assertEqual([e.code for e in events], self.event_list.code)
+        # the events are converted once, modifications are kept
+        self.assertIs(self.visit.get_event_list("PRESCRIPTIONS"), events)
+        events[0].attr_dict["dosage"] = "100mg"
+        events.pop()
+        self.assertIs(self.visit.event_list_dict["PRESCRIPTIONS"], events)
+        self.assertEqual(self.visit.num_events, 1)
+        self.assertEqual(
+            self.visit.get_event_list("PRESCRIPTIONS")[0].attr_dict,
+            {"dosage": "100mg"},
+        )
+
 
 class TestVisit(unittest.TestCase):
     def setUp(self):
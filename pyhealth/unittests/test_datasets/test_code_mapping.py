@@ -0,0 +1,128 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyhealth.data import EventList
+from pyhealth.datasets import MIMIC3Dataset
+from pyhealth.medcode import CrossMap
+from pyhealth.unittests.test_datasets.test_event_arrays import event_fields
+from pyhealth.unittests.test_datasets.utils import write_synthetic_mimic3
+
+
+# this test suite verifies that the codes of a dataset are mapped through the
+# memoized CrossMap, each unique code once.
+
+
+class IdentityVocabulary:
+    def standardize(self, code):
+        return code
+
+    def convert(self, code, **kwargs):
+        return code
+
+
+def toy_cross_map(source_vocabulary, target_vocabulary, refresh_cache=False):
+    # a CrossMap with a small in-memory mapping, without downloading it
+    cross_map = CrossMap.__new__(CrossMap)
+    cross_map.s_vocab = source_vocabulary
+    cross_map.t_vocab = target_vocabulary
+    cross_map.s_class = IdentityVocabulary()
+    cross_map.t_class = IdentityVocabulary()
+    cross_map.mapping = {"4280": ["108"], "42731": ["106"], "5849": ["157", "158"]}
+    cross_map.cache = {}
+    return cross_map
+
+
+class TestCodeMapping(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_path)
+        write_synthetic_mimic3(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def load_dataset(self, code_mapping):
+        with mock.patch(
+            "pyhealth.datasets.base_ehr_dataset.MODULE_CACHE_PATH", self.cache_path
+        ), mock.patch("pyhealth.datasets.base_ehr_dataset.CrossMap", toy_cross_map):
+            return MIMIC3Dataset(
+                root=self.root,
+                tables=["DIAGNOSES_ICD"],
+                code_mapping=code_mapping,
+                refresh_cache=True,
+            )
+
+    def test_code_mapping(self):
+        expected = self.load_dataset({})
+        with mock.patch.object(CrossMap, "_map", autospec=True, side_effect=CrossMap._map) as _map:
+            actual = self.load_dataset({"ICD9CM": "CCSCM"})
+        # each unique code is mapped once
+        codes = [call.args[1] for call in _map.call_args_list]
+        self.assertEqual(sorted(codes), ["25000", "42731", "4280", "5849"])
+        self.assertEqual(actual.code_vocs["conditions"], "CCSCM")
+        mapping = toy_cross_map("ICD9CM", "CCSCM").mapping
+        for patient_id, patient in expected.patients.items():
+            for visit, actual_visit in zip(patient, actual.patients[patient_id]):
+                expected_codes = [
+                    mapped
+                    for code in visit.get_code_list("DIAGNOSES_ICD", False)
+                    for mapped in mapping.get(code, [])
+                ]
+                events = actual_visit.get_event_list("DIAGNOSES_ICD")
+                self.assertEqual([e.code for e in events], expected_codes)
+                self.assertEqual({e.vocabulary for e in events} - {"CCSCM"}, set())
+        # the memoized codes are freed after the conversion
+        for code_mapping_tool in actual.code_mapping_tools.values():
+            self.assertEqual(code_mapping_tool.cache, {})
+
+    def test_event_list(self):
+        expected = self.load_dataset({})
+        actual = self.load_dataset({"ICD9CM": "CCSCM"})
+        for patient_id, patient in expected.patients.items():
+            for visit, actual_visit in zip(patient, actual.patients[patient_id]):
+                # the mapped table keeps the array storage
+                event_list = actual_visit.event_list_dict["DIAGNOSES_ICD"]
+                self.assertIsInstance(event_list, EventList)
+                # same events as the conversion of each event
+                expected_events = [
+                    mapped_event
+                    for event in visit.get_event_list("DIAGNOSES_ICD")
+                    for mapped_event in actual._convert_code_in_event(event)
+                ]
+                self.assertEqual(
+                    list(map(event_fields, event_list)),
+                    list(map(event_fields, expected_events)),
+                )
+
+    def test_one_to_many(self):
+        event_list = EventList(
+            table="DIAGNOSES_ICD",
+            visit_id="v0",
+            patient_id="p0",
+            code=["5849", "0000", "4280"],
+            vocabulary=["ICD9CM", "ICD10CM", "ICD9CM"],
+            timestamp=[datetime.datetime(2020, 1, i + 1) for i in range(3)],
+            seq_num=[1, 2, 3],
+        )
+        dataset = self.load_dataset({"ICD9CM": "CCSCM"})
+        actual = dataset._convert_code_in_event_list(event_list)
+        self.assertIsInstance(actual, EventList)
+        expected = [
+            mapped_event
+            for event in event_list
+            for mapped_event in dataset._convert_code_in_event(event)
+        ]
+        self.assertEqual(
+            list(map(event_fields, actual)), list(map(event_fields, expected))
+        )
+        self.assertEqual(actual.code, ["157", "158", "0000", "108"])
+        self.assertEqual(actual.attr["seq_num"], [1, 1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyhealth.datasets import SampleSignalDataset
+from pyhealth.datasets.epoch_store import save_epochs, load_epoch
+
+
+# this test suite verifies that epochs saved in a record are read back as is,
+# both directly and through SampleSignalDataset.
+
+
+class TestEpochStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        # the last epoch of a record may be shorter
+        self.epochs = [rng.randn(2, 300) for _ in range(4)] + [rng.randn(2, 120)]
+        self.epoch_path = save_epochs(
+            os.path.join(self.root, "SC4001.npy"), self.epochs
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_load_epoch(self):
+        for i, epoch in enumerate(self.epochs):
+            np.testing.assert_array_equal(load_epoch(self.epoch_path, i), epoch)
+
+    def test_overwrite(self):
+        load_epoch(self.epoch_path, 0)
+        # the record is saved again (e.g., by another process), the opened
+        # record of this process is outdated
+        epochs = [epoch + 1 for epoch in self.epochs[:2]]
+        save_epochs(self.epoch_path, epochs)
+        for i, epoch in enumerate(epochs):
+            np.testing.assert_array_equal(load_epoch(self.epoch_path, i), epoch)
+
+    def test_sample_dataset(self):
+        samples = [
+            {
+                "record_id": f"SC4001-{i}",
+                "patient_id": "SC4001",
+                "epoch_path": self.epoch_path,
+                "epoch_index": i,
+                "label": "W",
+            }
+            for i in range(len(self.epochs))
+        ]
+        dataset = SampleSignalDataset(samples)
+        self.assertEqual(
+            dataset.input_info["signal"], {"length": 300, "n_channels": 2}
+        )
+        sample = dataset[1]
+        self.assertNotIn("epoch_path", sample)
+        self.assertNotIn("epoch_index", sample)
+        np.testing.assert_array_equal(sample["signal"], self.epochs[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from pyhealth.data import Event, EventList, Patient, Visit
+from pyhealth.datasets import BaseEHRDataset, MIMIC3Dataset
+from pyhealth.datasets.utils import strptime
+from pyhealth.unittests.test_datasets.utils import write_synthetic_mimic3
+
+
+# this test suite verifies that the events added as arrays by the parsers are
+# the same as the events added one by one, and the same as the raw tables.
+
+
+def event_fields(event):
+    return (
+        event.code,
+        event.table,
+        event.vocabulary,
+        event.visit_id,
+        event.patient_id,
+        event.timestamp,
+        event.attr_dict,
+    )
+
+
+class TestEventArrays(unittest.TestCase):
+    def setUp(self):
+        self.rows = pd.DataFrame(
+            {
+                "patient_id": ["p0", "p0", "p0", "p1", "p1", "p2"],
+                "visit_id": ["v0", "v0", "v1", "v2", "v2", "v3"],
+                "code": ["a", "b", "c", "d", "a", "b"],
+                "timestamp": pd.Series(
+                    [datetime.datetime(2020, 1, i + 1) for i in range(5)] + [None],
+                    dtype=object,
+                ),
+                "dosage": ["1mg", "2mg", "3mg", "4mg", "5mg", "6mg"],
+            }
+        )
+
+    def patients(self):
+        patients = {}
+        for p_id, v_ids in [("p0", ["v0", "v1"]), ("p1", ["v2"])]:
+            patients[p_id] = Patient(patient_id=p_id)
+            for v_id in v_ids:
+                patients[p_id].add_visit(Visit(visit_id=v_id, patient_id=p_id))
+        return patients
+
+    def test_add_event_arrays(self):
+        expected = self.patients()
+        events = [
+            Event(table="PRESCRIPTIONS", vocabulary="NDC", **row)
+            for row in self.rows.to_dict("records")
+        ]
+        for event in events:
+            BaseEHRDataset._add_event_to_patient_dict(expected, event)
+        actual = BaseEHRDataset._add_event_arrays_to_patient_dict(
+            self.patients(),
+            "PRESCRIPTIONS",
+            patient_id=self.rows["patient_id"].values,
+            visit_id=self.rows["visit_id"].values,
+            code=self.rows["code"].values,
+            vocabulary="NDC",
+            timestamp=self.rows["timestamp"].values,
+            dosage=self.rows["dosage"].values,
+        )
+        for p_id, patient in expected.items():
+            for visit, actual_visit in zip(patient, actual[p_id]):
+                # the events are stored as arrays
+                self.assertIsInstance(
+                    actual_visit.event_list_dict["PRESCRIPTIONS"], EventList
+                )
+                self.assertEqual(
+                    list(map(event_fields, actual_visit.get_event_list("PRESCRIPTIONS"))),
+                    list(map(event_fields, visit.get_event_list("PRESCRIPTIONS"))),
+                )
+
+    def test_append(self):
+        patients = self.patients()
+        for rows in [self.rows.iloc[:1], self.rows.iloc[1:]]:
+            BaseEHRDataset._add_event_arrays_to_patient_dict(
+                patients,
+                "PRESCRIPTIONS",
+                patient_id=rows["patient_id"].values,
+                visit_id=rows["visit_id"].values,
+                code=rows["code"].values,
+                vocabulary=["NDC"] * len(rows),
+            )
+        visit = patients["p0"].get_visit_by_id("v0")
+        self.assertEqual(visit.get_code_list("PRESCRIPTIONS"), ["a", "b"])
+
+
+class TestParserRoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_path)
+        write_synthetic_mimic3(self.root)
+        with mock.patch(
+            "pyhealth.datasets.base_ehr_dataset.MODULE_CACHE_PATH", self.cache_path
+        ):
+            self.dataset = MIMIC3Dataset(
+                root=self.root, tables=["DIAGNOSES_ICD", "PRESCRIPTIONS"]
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def assert_table(self, table, sort_by, code_column, vocabulary, time_column=None):
+        df = pd.read_csv(
+            os.path.join(self.root, f"{table}.csv"),
+            dtype={"SUBJECT_ID": str, "HADM_ID": str, code_column: str},
+        ).sort_values(sort_by)
+        num_events = 0
+        for (p_id, v_id), rows in df.groupby(["SUBJECT_ID", "HADM_ID"], sort=False):
+            visit = self.dataset.patients[p_id].get_visit_by_id(v_id)
+            events = visit.get_event_list(table)
+            self.assertEqual([e.code for e in events], rows[code_column].tolist())
+            self.assertEqual({e.vocabulary for e in events}, {vocabulary})
+            if time_column is not None:
+                self.assertEqual(
+                    [e.timestamp for e in events],
+                    [strptime(t) for t in rows[time_column]],
+                )
+            num_events += len(events)
+        self.assertEqual(num_events, len(df))
+
+    def test_diagnoses(self):
+        self.assert_table(
+            "DIAGNOSES_ICD", ["SUBJECT_ID", "HADM_ID", "SEQ_NUM"], "ICD9_CODE", "ICD9CM"
+        )
+
+    def test_prescriptions(self):
+        self.assert_table(
+            "PRESCRIPTIONS",
+            ["SUBJECT_ID", "HADM_ID", "STARTDATE", "ENDDATE"],
+            "NDC",
+            "NDC",
+            time_column="STARTDATE",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import datetime
+import pickle
+import shutil
+import tempfile
+import os
+import unittest
+
+from pyhealth.data import Event, Visit, Patient
+from pyhealth.datasets.patient_store import PatientStore
+
+
+# this test suite verifies that the columnar patient store returns the same
+# patients, visits and events that were written to it.
+
+
+class TestPatientStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patients = {}
+        for p_idx in range(3):
+            p_id = f"p{p_idx}"
+            patient = Patient(
+                patient_id=p_id,
+                birth_datetime=datetime.datetime(1950 + p_idx, 1, 1),
+                gender="F" if p_idx % 2 else "M",
+                ethnicity=float("nan") if p_idx == 1 else "WHITE",
+            )
+            for v_idx in range(p_idx + 1):
+                v_id = f"{p_id}-v{v_idx}"
+                visit = Visit(
+                    visit_id=v_id,
+                    patient_id=p_id,
+                    encounter_time=datetime.datetime(2020, 1, v_idx + 1),
+                    discharge_status=v_idx,
+                    insurance="Medicare",
+                )
+                patient.add_visit(visit)
+                for code in ["428.0", "427.31"]:
+                    visit.add_event(
+                        Event(
+                            code=code,
+                            table="DIAGNOSES_ICD",
+                            vocabulary="ICD9CM",
+                            visit_id=v_id,
+                            patient_id=p_id,
+                        )
+                    )
+                # the first patient has no prescriptions
+                if p_idx > 0:
+                    visit.add_event(
+                        Event(
+                            code="00069153041",
+                            table="PRESCRIPTIONS",
+                            vocabulary="NDC",
+                            visit_id=v_id,
+                            patient_id=p_id,
+                            timestamp=datetime.datetime(2020, 1, v_idx + 1, 12),
+                            dosage="250mg",
+                        )
+                    )
+            self.patients[p_id] = patient
+        self.store = PatientStore.write(
+            self.patients, os.path.join(self.root, "store"), {"conditions": "ICD9CM"}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_mapping(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(list(self.store.keys()), ["p0", "p1", "p2"])
+        self.assertTrue("p1" in self.store)
+        self.assertFalse("p3" in self.store)
+        self.assertEqual(self.store.code_vocs, {"conditions": "ICD9CM"})
+        self.assertEqual(self.store.tables, ["DIAGNOSES_ICD", "PRESCRIPTIONS"])
+        self.assertEqual(
+            sorted(self.store.available_tables), ["DIAGNOSES_ICD", "PRESCRIPTIONS"]
+        )
+
+    def test_roundtrip(self):
+        store = PatientStore(self.store.root)
+        for p_id, expected in self.patients.items():
+            actual = store[p_id]
+            self.assertEqual(str(actual), str(expected))
+            self.assertEqual(len(actual), len(expected))
+            for actual_visit, expected_visit in zip(actual, expected):
+                self.assertEqual(
+                    actual_visit.available_tables, expected_visit.available_tables
+                )
+                self.assertEqual(actual_visit.attr_dict, expected_visit.attr_dict)
+        event = store["p2"].get_visit_by_index(1).get_event_list("PRESCRIPTIONS")[0]
+        self.assertEqual(event.timestamp, datetime.datetime(2020, 1, 2, 12))
+        self.assertEqual(event.attr_dict, {"dosage": "250mg"})
+
+    def test_pickle(self):
+        store = pickle.loads(pickle.dumps(self.store))
+        self.assertEqual(str(store["p1"]), str(self.patients["p1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import gzip
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from pyhealth.datasets import MIMIC3Dataset
+from pyhealth.datasets.utils import estimate_num_rows
+from pyhealth.unittests.test_datasets.utils import write_synthetic_mimic3
+
+
+# this test suite verifies that streaming the tables in chunks yields whole
+# patients and the same dataset as reading each table at once.
+
+
+class TestReadCsvByGroup(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_path)
+        write_synthetic_mimic3(self.root, num_patients=50)
+        self.patcher = mock.patch(
+            "pyhealth.datasets.base_ehr_dataset.MODULE_CACHE_PATH", self.cache_path
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.root)
+
+    def load_dataset(self, csv_chunksize):
+        return MIMIC3Dataset(
+            root=self.root,
+            tables=["DIAGNOSES_ICD", "PRESCRIPTIONS"],
+            csv_chunksize=csv_chunksize,
+            refresh_cache=True,
+        )
+
+    def read(self, dataset, **kwargs):
+        return list(
+            dataset._read_csv_by_group(
+                os.path.join(self.root, "DIAGNOSES_ICD.csv"),
+                group_by="SUBJECT_ID",
+                sort_by=["SUBJECT_ID", "HADM_ID", "SEQ_NUM"],
+                dropna_subset=["SUBJECT_ID", "HADM_ID", "ICD9_CODE"],
+                dtype={"SUBJECT_ID": str, "HADM_ID": str, "ICD9_CODE": str},
+                **kwargs,
+            )
+        )
+
+    def test_estimate_num_rows(self):
+        filepath = os.path.join(self.root, "DIAGNOSES_ICD.csv")
+        num_rows = len(pd.read_csv(filepath)) + 1
+        self.assertEqual(estimate_num_rows(filepath), num_rows)
+        # a small sample is extrapolated to the size of the file
+        self.assertAlmostEqual(
+            estimate_num_rows(filepath, sample_size=512) / num_rows, 1, delta=0.2
+        )
+        with open(filepath, "rb") as f_in, gzip.open(f"{filepath}.gz", "wb") as f_out:
+            f_out.write(f_in.read())
+        self.assertEqual(estimate_num_rows(f"{filepath}.gz"), num_rows)
+        self.assertIsNone(estimate_num_rows("https://example.com/DIAGNOSES_ICD.csv"))
+
+    def test_groups(self):
+        dataset = self.load_dataset(csv_chunksize=None)
+        expected = self.read(dataset)[0]
+        dataset.csv_chunksize = 20
+        dfs = self.read(dataset)
+        self.assertGreater(len(dfs), 1)
+        # every patient is in a single dataframe
+        patient_ids = [set(df["SUBJECT_ID"]) for df in dfs]
+        self.assertEqual(sum(len(p) for p in patient_ids), len(set.union(*patient_ids)))
+        actual = pd.concat(dfs).sort_values(["SUBJECT_ID", "HADM_ID", "SEQ_NUM"])
+        pd.testing.assert_frame_equal(
+            actual.reset_index(drop=True), expected.reset_index(drop=True)
+        )
+        # the number of buckets follows the size of the table
+        with mock.patch("pickle.dump", wraps=pickle.dump) as dump:
+            self.read(dataset)
+        buckets = set(call.args[1].name for call in dump.call_args_list)
+        self.assertGreater(len(buckets), 1)
+        self.assertLessEqual(len(buckets), -(-(len(expected) + 1) // 20))
+
+    def test_dataset(self):
+        expected = self.load_dataset(csv_chunksize=None)
+        actual = self.load_dataset(csv_chunksize=20)
+        self.assertEqual(list(actual.patients), list(expected.patients))
+        for patient_id, patient in expected.patients.items():
+            for visit, actual_visit in zip(patient, actual.patients[patient_id]):
+                for table in ["DIAGNOSES_ICD", "PRESCRIPTIONS"]:
+                    self.assertEqual(
+                        actual_visit.get_code_list(table), visit.get_code_list(table)
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
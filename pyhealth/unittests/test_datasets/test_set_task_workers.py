@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from pyhealth.datasets import BaseSignalDataset, MIMIC3Dataset
+from pyhealth.datasets.epoch_store import save_epochs
+from pyhealth.unittests.test_datasets.utils import write_synthetic_mimic3
+
+
+# this test suite verifies that the samples generated by set_task with a pool
+# of workers are the same, and in the same order, as in the main process.
+
+
+def drugs_fn(patient):
+    samples = []
+    for visit in patient:
+        samples.append(
+            {
+                "visit_id": visit.visit_id,
+                "patient_id": patient.patient_id,
+                "conditions": [visit.get_code_list(table="DIAGNOSES_ICD")],
+                "drugs": visit.get_code_list(table="PRESCRIPTIONS"),
+            }
+        )
+    return samples
+
+
+class AdmissionSignalDataset(BaseSignalDataset):
+    """A signal dataset with a record per admission of the MIMIC-III tables."""
+
+    def process_EEG_data(self):
+        admissions = pd.read_csv(os.path.join(self.root, "ADMISSIONS.csv"), dtype=str)
+        patients = {}
+        for row in admissions.itertuples():
+            patients.setdefault(row.SUBJECT_ID, []).append(
+                {
+                    "load_from_path": self.root,
+                    "patient_id": row.SUBJECT_ID,
+                    "signal_file": f"{row.HADM_ID}.npy",
+                    "save_to_path": self.filepath,
+                }
+            )
+        return patients
+
+
+def records_fn(records):
+    samples = []
+    for record in records:
+        # a few epochs per record, saved as in the sleep staging tasks
+        record_id = record["signal_file"][: -len(".npy")]
+        num_epochs = int(record_id) % 3 + 1
+        epochs = [np.full((2, 4), int(record_id) + i) for i in range(num_epochs)]
+        epoch_path = save_epochs(
+            os.path.join(record["save_to_path"], record["signal_file"]), epochs
+        )
+        for i in range(num_epochs):
+            samples.append(
+                {
+                    "record_id": f"{record_id}-{i}",
+                    "patient_id": record["patient_id"],
+                    "epoch_path": epoch_path,
+                    "epoch_index": i,
+                    "label": str(i),
+                }
+            )
+    return samples
+
+
+class TestSetTaskWorkers(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_path)
+        write_synthetic_mimic3(self.root)
+        self.patchers = [
+            mock.patch(
+                f"pyhealth.datasets.{module}.MODULE_CACHE_PATH", self.cache_path
+            )
+            for module in ["base_ehr_dataset", "base_signal_dataset"]
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.root)
+
+    def test_ehr(self):
+        dataset = MIMIC3Dataset(
+            root=self.root, tables=["DIAGNOSES_ICD", "PRESCRIPTIONS"]
+        )
+        expected = dataset.set_task(drugs_fn, num_workers=1).samples
+        actual = dataset.set_task(drugs_fn, num_workers=2, chunksize=3).samples
+        self.assertGreater(len(expected), len(dataset.patients))
+        self.assertEqual(actual, expected)
+
+    def test_signal(self):
+        # the samples are cached by the signal datasets, refresh them
+        dataset = AdmissionSignalDataset(root=self.root, refresh_cache=True)
+        expected = dataset.set_task(records_fn, num_workers=1).samples
+        sample_dataset = dataset.set_task(records_fn, num_workers=2, chunksize=3)
+        self.assertGreater(len(expected), len(dataset.patients))
+        self.assertEqual(sample_dataset.samples, expected)
+        # the epochs saved by the workers are loaded by the samples
+        for i, sample in enumerate(expected):
+            record_id, epoch_index = sample["record_id"].split("-")
+            self.assertEqual(
+                sample_dataset[i]["signal"][0, 0], int(record_id) + int(epoch_index)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
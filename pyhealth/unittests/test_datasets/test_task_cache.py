@@ -0,0 +1,131 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pyhealth.datasets import MIMIC3Dataset
+from pyhealth.datasets.utils import hash_task_fn
+from pyhealth.unittests.test_datasets.utils import write_synthetic_mimic3
+
+
+# this test suite verifies that the samples of set_task are only cached when
+# asked to, and that the cache is hit, missed and invalidated as expected.
+
+
+def conditions_fn(patient, min_conditions=1):
+    samples = []
+    for visit in patient:
+        conditions = visit.get_code_list(table="DIAGNOSES_ICD")
+        if len(conditions) >= min_conditions:
+            samples.append(
+                {
+                    "visit_id": visit.visit_id,
+                    "patient_id": patient.patient_id,
+                    "conditions": [conditions],
+                    "label": int(len(conditions) > 2),
+                }
+            )
+    return samples
+
+
+class ConditionsTask:
+    def __init__(self, min_conditions):
+        self.min_conditions = min_conditions
+        self.marker = object()
+
+    def __call__(self, patient):
+        return conditions_fn(patient, self.min_conditions)
+
+
+class TestTaskCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, "cache")
+        os.makedirs(self.cache_path)
+        write_synthetic_mimic3(self.root)
+        self.patcher = mock.patch(
+            "pyhealth.datasets.base_ehr_dataset.MODULE_CACHE_PATH", self.cache_path
+        )
+        self.patcher.start()
+        self.dataset = self.load_dataset()
+        self.num_calls = 0
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.root)
+
+    def load_dataset(self, refresh_cache=False):
+        return MIMIC3Dataset(
+            root=self.root, tables=["DIAGNOSES_ICD"], refresh_cache=refresh_cache
+        )
+
+    def set_task(self, task_fn=conditions_fn, dataset=None, **kwargs):
+        dataset = self.dataset if dataset is None else dataset
+        with mock.patch(
+            "pyhealth.datasets.base_ehr_dataset.apply_task_fn",
+            side_effect=self.apply_task_fn,
+        ):
+            return dataset.set_task(task_fn, **kwargs)
+
+    def apply_task_fn(self, task_fn, patients, **kwargs):
+        self.num_calls += 1
+        return [sample for p in patients.values() for sample in task_fn(p)]
+
+    def task_files(self):
+        task_dir = os.path.join(self.cache_path, "tasks")
+        return os.listdir(task_dir) if os.path.exists(task_dir) else []
+
+    def test_no_cache_by_default(self):
+        self.set_task()
+        self.set_task()
+        self.assertEqual(self.num_calls, 2)
+        self.assertEqual(self.task_files(), [])
+
+    def test_hit(self):
+        samples = self.set_task(cache=True).samples
+        cached = self.set_task(cache=True).samples
+        self.assertEqual(self.num_calls, 1)
+        self.assertEqual(cached, samples)
+        self.assertEqual(len(self.task_files()), 1)
+        # the cache is shared by the datasets of the same base cache
+        self.set_task(dataset=self.load_dataset(), cache=True)
+        self.assertEqual(self.num_calls, 1)
+
+    def test_miss(self):
+        self.set_task(cache=True)
+        self.set_task(functools.partial(conditions_fn, min_conditions=2), cache=True)
+        self.set_task(ConditionsTask(2), cache=True)
+        self.assertEqual(self.num_calls, 3)
+        self.set_task(functools.partial(conditions_fn, min_conditions=2), cache=True)
+        self.set_task(ConditionsTask(2), cache=True)
+        self.assertEqual(self.num_calls, 3)
+
+    def test_invalidation(self):
+        self.set_task(cache=True)
+        self.set_task(cache=True, refresh_cache=True)
+        self.assertEqual(self.num_calls, 2)
+        # re-processing the base dataset invalidates its task caches
+        os.utime(self.dataset.filepath, (0, 0))
+        self.set_task(cache=True)
+        self.assertEqual(self.num_calls, 3)
+
+    def test_cache_key(self):
+        self.set_task(cache_key="conditions-v1")
+        self.set_task(functools.partial(conditions_fn, min_conditions=2), cache_key="conditions-v1")
+        self.assertEqual(self.num_calls, 1)
+        self.set_task(cache_key="conditions-v2")
+        self.assertEqual(self.num_calls, 2)
+
+    def test_hash_task_fn(self):
+        self.assertEqual(hash_task_fn(ConditionsTask(2)), hash_task_fn(ConditionsTask(2)))
+        self.assertNotEqual(hash_task_fn(ConditionsTask(1)), hash_task_fn(ConditionsTask(2)))
+        # the source of a class defined at runtime is not available
+        task_cls = type("RuntimeTask", (), {"__call__": lambda self, patient: []})
+        with self.assertRaises(ValueError):
+            hash_task_fn(task_cls())
+
+
+if __name__ == "__main__":
+    unittest.main()
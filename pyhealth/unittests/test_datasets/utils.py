@@ -1,4 +1,9 @@
+import os
 from typing import List
+
+import numpy as np
+import pandas as pd
+
 from pyhealth.datasets import BaseEHRDataset
 
 class EHRDatasetStatAssertion:
@@ -49,4 +54,66 @@ class EHRDatasetStatAssertion:
             actual_value = sum(actual_num_events) / len(actual_num_events)
             
             if abs(expected_value - actual_value) > self.eps:
-                raise AssertionError(f"Expected {expected_value} mean for events in {table} got {actual_value}")
\ No newline at end of file
+                raise AssertionError(f"Expected {expected_value} mean for events in {table} got {actual_value}")
+
+def write_synthetic_mimic3(root: str, num_patients: int = 20, seed: int = 0) -> None:
+    """Writes small random PATIENTS, ADMISSIONS, DIAGNOSES_ICD and PRESCRIPTIONS
+    tables in the MIMIC-III format to `root`, for tests without network access.
+    """
+    rng = np.random.RandomState(seed)
+    patients, admissions, diagnoses, prescriptions = [], [], [], []
+    for p in range(num_patients):
+        subject_id = 100 + p
+        patients.append(
+            {
+                "SUBJECT_ID": subject_id,
+                "GENDER": "F" if p % 2 else "M",
+                "DOB": f"{2050 + p % 30}-01-01 00:00:00",
+                "DOD_HOSP": None,
+            }
+        )
+        for v in range(rng.randint(1, 4)):
+            hadm_id = 1000 * subject_id + v
+            admissions.append(
+                {
+                    "SUBJECT_ID": subject_id,
+                    "HADM_ID": hadm_id,
+                    "ADMITTIME": f"2100-0{v + 1}-01 00:00:00",
+                    "DISCHTIME": f"2100-0{v + 1}-05 00:00:00",
+                    "HOSPITAL_EXPIRE_FLAG": 0,
+                    "INSURANCE": "Medicare",
+                    "LANGUAGE": "ENGL",
+                    "RELIGION": "CATHOLIC",
+                    "MARITAL_STATUS": "MARRIED",
+                    "ETHNICITY": "WHITE",
+                }
+            )
+            for seq_num in range(1, rng.randint(2, 6)):
+                diagnoses.append(
+                    {
+                        "SUBJECT_ID": subject_id,
+                        "HADM_ID": hadm_id,
+                        "SEQ_NUM": seq_num,
+                        "ICD9_CODE": rng.choice(["4280", "42731", "5849", "25000"]),
+                    }
+                )
+            for day in range(rng.randint(0, 4)):
+                prescriptions.append(
+                    {
+                        "SUBJECT_ID": subject_id,
+                        "HADM_ID": hadm_id,
+                        "STARTDATE": f"2100-0{v + 1}-0{day + 1} 00:00:00",
+                        "ENDDATE": f"2100-0{v + 1}-0{day + 2} 00:00:00",
+                        "NDC": rng.choice(["00069153041", "00904198861"]),
+                    }
+                )
+    # rows of a table are not grouped by patient
+    for name, rows in [
+        ("PATIENTS", patients),
+        ("ADMISSIONS", admissions),
+        ("DIAGNOSES_ICD", diagnoses),
+        ("PRESCRIPTIONS", prescriptions),
+    ]:
+        df = pd.DataFrame(rows)
+        df = df.iloc[rng.permutation(len(df))]
+        df.to_csv(os.path.join(root, f"{name}.csv"), index=False)
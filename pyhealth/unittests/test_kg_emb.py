@@ -0,0 +1,344 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+from pyhealth.datasets import get_dataloader
+from pyhealth.medcode.pretrained_embeddings.kg_emb.datasets import (
+    BaseKGDataset,
+    SampleKGDataset,
+)
+from pyhealth.medcode.pretrained_embeddings.kg_emb.models import (
+    ComplEx,
+    DistMult,
+    RotatE,
+    TransE,
+)
+from pyhealth.medcode.pretrained_embeddings.kg_emb.models.kg_base import (
+    collate_fn_kg,
+    sample_negatives,
+)
+from pyhealth.medcode.pretrained_embeddings.kg_emb.tasks import link_prediction_fn
+from pyhealth.medcode.pretrained_embeddings.kg_emb.tasks.link_prediction import (
+    count_frequency,
+    count_frequency_per_triple,
+    ground_truth_for_query,
+    ground_truth_per_triple,
+)
+from pyhealth.metrics import multiclass_metrics_fn
+
+
+# this test suite verifies the link prediction samples, the negative sampling
+# and the link prediction evaluation of the KG embedding models.
+
+
+def kg_dataset(e_num=60, r_num=4, num_triples=400, seed=0):
+    rng = np.random.RandomState(seed)
+    triples = np.unique(
+        np.stack(
+            [
+                rng.randint(e_num, size=num_triples),
+                rng.randint(r_num, size=num_triples),
+                rng.randint(e_num, size=num_triples),
+            ],
+            axis=1,
+        ),
+        axis=0,
+    )
+    return SampleKGDataset(
+        samples=link_prediction_fn(triples),
+        entity_num=e_num,
+        relation_num=r_num,
+        entity2id={f"e{i}": i for i in range(e_num)},
+        relation2id={f"r{i}": i for i in range(r_num)},
+    )
+
+
+class TestLinkPredictionTask(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # with duplicated triples
+        self.triples = [
+            (int(rng.randint(30)), int(rng.randint(3)), int(rng.randint(30)))
+            for _ in range(300)
+        ]
+
+    def test_samples(self):
+        # the previous samples, from the dict based functions
+        count = count_frequency(self.triples)
+        gt_head, gt_tail = ground_truth_for_query(set(self.triples))
+        samples = link_prediction_fn(np.array(self.triples, dtype=np.int32))
+        self.assertEqual(len(samples), len(self.triples))
+        for (h, r, t), sample in zip(self.triples, samples):
+            self.assertEqual(sample["triple"], (h, r, t))
+            self.assertEqual(sample["ground_truth_head"], sorted(gt_head[(r, t)]))
+            self.assertEqual(sample["ground_truth_tail"], sorted(gt_tail[(h, r)]))
+            weight = np.sqrt(1 / (count[(h, r)] + count[(t, -r - 1)]))
+            self.assertAlmostEqual(sample["subsampling_weight"], weight)
+        # a list of tuples gives the same samples
+        self.assertEqual(link_prediction_fn(self.triples), samples)
+
+    def test_per_triple(self):
+        count = count_frequency(self.triples)
+        count_head_relation, count_tail_relation = count_frequency_per_triple(
+            self.triples
+        )
+        gt_head, gt_tail = ground_truth_for_query(set(self.triples))
+        per_triple_head, per_triple_tail = ground_truth_per_triple(self.triples)
+        for i, (h, r, t) in enumerate(self.triples):
+            self.assertEqual(count_head_relation[i], count[(h, r)])
+            self.assertEqual(count_tail_relation[i], count[(t, -r - 1)])
+            self.assertEqual(per_triple_head[i], sorted(gt_head[(r, t)]))
+            self.assertEqual(per_triple_tail[i], sorted(gt_tail[(h, r)]))
+
+
+class ToyKGDataset(BaseKGDataset):
+    def raw_graph_process(self):
+        # only the numbers of entities and relations, without vocabularies
+        self.triples = [(0, 0, 1), (1, 1, 2), (2, 0, 0)]
+        self.entity_num = 3
+        self.relation_num = 2
+
+
+class TestBaseKGDataset(unittest.TestCase):
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.patcher = mock.patch(
+            "pyhealth.medcode.pretrained_embeddings.kg_emb.datasets.base_kg_dataset"
+            ".MODULE_CACHE_PATH",
+            self.cache_path,
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache_path)
+
+    def test_cache(self):
+        expected = ToyKGDataset(root="toy")
+        self.assertTrue(os.path.exists(expected.filepath + ".npz"))
+        with mock.patch.object(ToyKGDataset, "raw_graph_process") as process:
+            actual = ToyKGDataset(root="toy")
+        process.assert_not_called()
+        np.testing.assert_array_equal(actual.triples, expected.triples)
+        self.assertEqual(actual.triples.dtype, np.int32)
+        self.assertEqual((actual.entity_num, actual.relation_num), (3, 2))
+        self.assertIsNone(actual.entity2id)
+        self.assertIsNone(actual.relation2id)
+
+
+class TestSampleNegatives(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        rng = np.random.RandomState(0)
+        self.e_num = 50
+        self.ground_truth = [
+            sorted(rng.choice(self.e_num, rng.randint(1, 40), False).tolist())
+            for _ in range(64)
+        ]
+
+    def test_excludes_ground_truth(self):
+        negative_sample = sample_negatives(self.ground_truth, self.e_num, 32)
+        self.assertEqual(negative_sample.shape, (64, 32))
+        self.assertEqual(negative_sample.dtype, torch.long)
+        for gt, negatives in zip(self.ground_truth, negative_sample.tolist()):
+            self.assertTrue(all(0 <= e < self.e_num for e in negatives))
+            self.assertEqual(set(negatives) & set(gt), set())
+
+    def test_uniform(self):
+        # all the entities which are not ground truth are drawn
+        ground_truth = [list(range(45))] * 200
+        negative_sample = sample_negatives(ground_truth, self.e_num, 10)
+        self.assertEqual(set(negative_sample.flatten().tolist()), set(range(45, 50)))
+
+    def test_single_candidate(self):
+        ground_truth = [list(range(1, self.e_num))] * 4
+        negative_sample = sample_negatives(ground_truth, self.e_num, 8)
+        self.assertEqual(negative_sample.tolist(), [[0] * 8] * 4)
+
+    def test_empty_ground_truth(self):
+        negative_sample = sample_negatives([[], []], self.e_num, 4)
+        self.assertEqual(negative_sample.shape, (2, 4))
+
+    def test_collate_fn(self):
+        batch = [
+            {
+                "triple": (gt[0], 0, gt[-1]),
+                "ground_truth_head": gt,
+                "ground_truth_tail": gt[::-1],
+                "subsampling_weight": 1.0,
+                "train": True,
+                "hyperparameters": {"negative_sampling": 16},
+            }
+            for gt in self.ground_truth[:8]
+        ]
+        data = collate_fn_kg(batch, self.e_num)
+        for mode in ["head", "tail"]:
+            negative_sample = data[f"negative_sample_{mode}"]
+            self.assertEqual(negative_sample.shape, (8, 16))
+            for gt, negatives in zip(
+                data[f"ground_truth_{mode}"], negative_sample.tolist()
+            ):
+                self.assertEqual(set(negatives) & set(gt), set())
+        # no negatives for val/test batches
+        batch = [{**sample, "train": False} for sample in batch]
+        data = collate_fn_kg(batch, self.e_num)
+        self.assertNotIn("negative_sample_head", data)
+
+
+class TestLinkPredictionEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.dataset = kg_dataset()
+        samples = [{**sample, "train": False} for sample in self.dataset.samples]
+        self.dataloader = get_dataloader(samples, batch_size=32)
+
+    def assert_same_metrics(self, model):
+        # the metrics of the predictions of forward(), as with the Trainer
+        y_true, y_prob = [], []
+        model.eval()
+        with torch.no_grad():
+            for data in self.dataloader:
+                output = model(**data)
+                y_true.append(output["y_true"].numpy())
+                y_prob.append(output["y_prob"].numpy())
+        expected = multiclass_metrics_fn(
+            np.concatenate(y_true),
+            np.concatenate(y_prob),
+            metrics=["hits@n", "mean_rank"],
+        )
+        actual = model.evaluate_link_prediction(self.dataloader, chunk_size=7)
+        self.assertEqual(actual.keys(), expected.keys())
+        for metric in expected:
+            self.assertAlmostEqual(actual[metric], expected[metric])
+
+    def test_transe(self):
+        torch.manual_seed(0)
+        self.assert_same_metrics(TransE(self.dataset, e_dim=16, r_dim=16))
+
+    def test_distmult(self):
+        torch.manual_seed(0)
+        self.assert_same_metrics(DistMult(self.dataset, e_dim=16, r_dim=16))
+
+    def test_complex(self):
+        torch.manual_seed(0)
+        self.assert_same_metrics(ComplEx(self.dataset, e_dim=16, r_dim=16))
+
+    def test_rotate(self):
+        torch.manual_seed(0)
+        self.assert_same_metrics(RotatE(self.dataset, e_dim=16, r_dim=8))
+
+
+def reference_filtered_scores(model, positive_sample, ground_truth, mode):
+    # the previous scores, with all the entities gathered by data_process()
+    y_true = positive_sample[:, 0] if mode == "head" else positive_sample[:, 2]
+    negative_sample = torch.arange(model.e_num).repeat(len(positive_sample), 1)
+    filter_bias = torch.zeros(len(positive_sample), model.e_num)
+    for i, gt in enumerate(ground_truth):
+        gt = [e for e in gt if e != y_true[i]]
+        negative_sample[i, gt] = y_true[i]
+        filter_bias[i, gt] = -1
+    head, relation, tail = model.data_process((positive_sample, negative_sample), mode=mode)
+    return model.calc(head=head, relation=relation, tail=tail, mode=mode) + filter_bias
+
+
+class TestLinkPredictionInference(unittest.TestCase):
+    def setUp(self):
+        self.dataset = kg_dataset()
+        samples = [{**sample, "train": False} for sample in self.dataset.samples]
+        self.dataloader = get_dataloader(samples, batch_size=32)
+
+    def models(self):
+        torch.manual_seed(0)
+        return [
+            TransE(self.dataset, e_dim=16, r_dim=16),
+            DistMult(self.dataset, e_dim=16, r_dim=16),
+            ComplEx(self.dataset, e_dim=16, r_dim=16),
+            RotatE(self.dataset, e_dim=16, r_dim=8),
+        ]
+
+    def test_filtered_scores(self):
+        for model in self.models():
+            model.eval()
+            with torch.no_grad():
+                for data in self.dataloader:
+                    positive_sample = torch.LongTensor(data["triple"])
+                    expected = torch.cat([
+                        reference_filtered_scores(
+                            model, positive_sample, data[f"ground_truth_{mode}"], mode
+                        )
+                        for mode in ["head", "tail"]
+                    ])
+                    actual = model(**data)["y_prob"]
+                    # bit-exact
+                    self.assertTrue(torch.equal(actual, expected), type(model).__name__)
+
+    def test_batch_inference(self):
+        queries = torch.LongTensor([sample["triple"] for sample in self.dataset.samples[:50]])
+        for model in self.models():
+            name = type(model).__name__
+            with torch.no_grad():
+                for mode in ["head", "tail"]:
+                    negative_sample = torch.arange(model.e_num).repeat(len(queries), 1)
+                    head, relation, tail = model.data_process(
+                        (queries, negative_sample), mode=mode
+                    )
+                    score = model.calc(head=head, relation=relation, tail=tail, mode=mode)
+                    expected_scores, expected_ids = score.topk(5, dim=1)
+                    query = {"relation": queries[:, 1]}
+                    if mode == "head":
+                        query["tail"] = queries[:, 2]
+                    else:
+                        query["head"] = queries[:, 0]
+                    ids, scores = model.batch_inference(
+                        **query, top_k=5, batch_size=16, chunk_size=7
+                    )
+                    self.assertEqual(ids.tolist(), expected_ids.tolist(), name)
+                    torch.testing.assert_close(scores, expected_scores, msg=name)
+                    # inference() predicts the top-k of the first query
+                    first = {key: value[0].item() for key, value in query.items()}
+                    self.assertEqual(
+                        model.inference(**first, top_k=5), expected_ids[0].tolist(), name
+                    )
+
+    def test_index_recall(self):
+        torch.manual_seed(0)
+        model = TransE(self.dataset, e_dim=16, r_dim=16)
+        model.build_index(n_lists=6)
+        relation, tail = torch.randint(4, (100,)), torch.randint(60, (100,))
+        expected, _ = model.batch_inference(relation=relation, tail=tail, top_k=10)
+        # searching all the lists is an exact search
+        actual, _ = model.batch_inference(
+            relation=relation, tail=tail, top_k=10, use_index=True, n_probe=6
+        )
+        recall = np.mean([
+            len(set(a) & set(e)) / len(e)
+            for a, e in zip(actual.tolist(), expected.tolist())
+        ])
+        self.assertEqual(recall, 1.0)
+
+    def test_outdated_index(self):
+        torch.manual_seed(0)
+        model = TransE(self.dataset, e_dim=16, r_dim=16)
+        with self.assertRaisesRegex(ValueError, "build_index"):
+            model.batch_inference(relation=0, tail=0, use_index=True)
+        model.build_index(n_lists=6)
+        expected = model.index.embeddings.clone()
+        model.batch_inference(relation=0, tail=0, use_index=True)
+        # a training step after the index is built
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        model.E_emb.sum().backward()
+        optimizer.step()
+        # the index keeps its own embeddings
+        self.assertTrue(torch.equal(model.index.embeddings, expected))
+        with self.assertRaisesRegex(ValueError, "build_index"):
+            model.batch_inference(relation=0, tail=0, use_index=True)
+        model.build_index(n_lists=6)
+        model.batch_inference(relation=0, tail=0, use_index=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
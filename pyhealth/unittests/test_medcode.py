@@ -4,6 +4,15 @@ import os
 current = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.dirname(os.path.dirname(current)))
 
+import math
+import pickle
+import shutil
+import tempfile
+from unittest import mock
+
+import networkx as nx
+import pandas as pd
+
 from pyhealth.medcode import InnerMap, CrossMap
 
 class TestInnerMap(unittest.TestCase):
@@ -36,7 +45,14 @@ class TestInnerMap(unittest.TestCase):
         self.assertEqual(
             self.inner_map.get_descendants("428"),
             ['428.0', '428.1', '428.2', '428.3', '428.4', '428.9', '428.20', '428.21', '428.22', '428.23', '428.30', '428.31', '428.32', '428.33', '428.40', '428.41', '428.42', '428.43'],            
-            msg="get_descendants function of InnerMap failed"        
+            msg="get_descendants function of InnerMap failed"
+            )
+
+    def test_batch_get_ancestors(self):
+        self.assertEqual(
+            self.inner_map.batch_get_ancestors(["428.0", "428"], max_depth=2),
+            [['428', '420-429.99'], ['420-429.99', '390-459.99']],
+            msg="batch_get_ancestors function of InnerMap failed"
             )
 
 
@@ -81,6 +97,107 @@ class TestCrossMap(unittest.TestCase):
             msg="map function of CrossMap failed"
         )
 
+    def test_map_codes(self):
+        self.assertEqual(
+            self.cross_map.map_codes(["428.0", "428.0"]),
+            {"428.0": ["108"]},
+            msg="map_codes function of CrossMap failed"
+        )
+        self.assertEqual(len(self.cross_map.cache), 1)
+        self.cross_map.clear_cache()
+        self.assertEqual(len(self.cross_map.cache), 0)
+
+
+class ToyVocabulary(InnerMap):
+    def __init__(self, **kwargs):
+        super(ToyVocabulary, self).__init__(vocabulary="TOY", **kwargs)
+
+
+class TestInnerMapCompact(unittest.TestCase):
+    """Compares the compact format of InnerMap with the networkx graph built
+    from the same vocabulary csv, without downloading any vocabulary."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # "E" has two parents, "B" has two rows, "R" only appears as a parent,
+        # and a missing name is nan as in the vocabulary csv files
+        self.df = pd.DataFrame(
+            {
+                "code": ["A", "B", "C", "D", "E", "E", "F", "G", "B"],
+                "name": ["a", "b", "c", "d", "e", "e", float("nan"), "g", "b2"],
+                "parent_code": ["R", "A", "A", "B", "C", "D", "E", "D", "A"],
+                "level": [1, 2, 2, 3, 3, 3, 4, 4, 2],
+            }
+        )
+        self.graph = self.baseline_graph(self.df)
+        self.patchers = [
+            mock.patch("pyhealth.medcode.inner_map.MODULE_CACHE_PATH", self.root),
+            mock.patch(
+                "pyhealth.medcode.inner_map.download_and_read_csv",
+                side_effect=lambda *args: self.df.copy(),
+            ),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.root)
+
+    @staticmethod
+    def baseline_graph(df):
+        # the graph of the previous versions of InnerMap
+        df = df.set_index("code")
+        graph = nx.DiGraph()
+        for code, row in df.iterrows():
+            row_dict = row.to_dict()
+            row_dict.pop("parent_code", None)
+            graph.add_node(code, **row_dict)
+        for code, row in df.iterrows():
+            if not pd.isna(row["parent_code"]):
+                graph.add_edge(row["parent_code"], code)
+        return graph
+
+    def assert_inner_map(self, inner_map):
+        self.assertEqual(len(inner_map.graph), len(self.graph))
+        for code in self.graph.nodes:
+            self.assertIn(code, inner_map)
+            for attribute in ["name", "level"]:
+                expected = self.graph.nodes[code].get(attribute, float("nan"))
+                actual = inner_map.lookup(code, attribute)
+                if isinstance(expected, float) and math.isnan(expected):
+                    self.assertTrue(math.isnan(actual))
+                else:
+                    self.assertEqual(actual, expected)
+            for kind, reachable, distance in [
+                ("ancestors", nx.ancestors, lambda x: nx.shortest_path_length(self.graph, x, code)),
+                ("descendants", nx.descendants, lambda x: nx.shortest_path_length(self.graph, code, x)),
+            ]:
+                expected = sorted(reachable(self.graph, code), key=lambda x: (distance(x), x))
+                self.assertEqual(getattr(inner_map, f"get_{kind}")(code), expected)
+                self.assertEqual(
+                    getattr(inner_map, f"get_{kind}")(code, max_depth=1),
+                    [x for x in expected if distance(x) <= 1],
+                )
+        self.assertNotIn("Z", inner_map)
+        with self.assertRaises(KeyError):
+            inner_map.lookup("Z")
+
+    def test_from_csv(self):
+        inner_map = ToyVocabulary()
+        self.assert_inner_map(inner_map)
+        # the compact cache is loaded as is
+        self.assert_inner_map(ToyVocabulary())
+        self.assert_inner_map(pickle.loads(pickle.dumps(inner_map)))
+
+    def test_from_graph_pickle(self):
+        with open(os.path.join(self.root, "TOY.pkl"), "wb") as f:
+            pickle.dump(self.graph, f)
+        self.df = None
+        self.assert_inner_map(ToyVocabulary())
+        self.assertTrue(os.path.exists(os.path.join(self.root, "TOY", "meta.json")))
+
 
 if __name__ == "__main__":
     unittest.main()
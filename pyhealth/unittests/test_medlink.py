@@ -0,0 +1,221 @@
+import math
+import random
+import unittest
+
+import numpy as np
+import torch
+
+from pyhealth.datasets import SampleEHRDataset
+from pyhealth.models import MedLink
+from pyhealth.models.medlink import (
+    BM25Okapi,
+    convert_to_ir_format,
+    filter_by_candidates,
+    generate_candidates,
+    get_eval_dataloader,
+)
+
+
+# this test suite verifies that the BM25 scores over the inverted index match
+# the previous document-by-document scores, and that the chunked MedLink search
+# and the blocked candidate generation match the previous full scans.
+
+
+def reference_scores(corpus, query, k1=1.5, b=0.75, epsilon=0.25):
+    # the previous implementation of BM25Okapi.get_scores()
+    doc_freqs = []
+    nd = {}
+    for document in corpus.values():
+        frequencies = {}
+        for word in document:
+            frequencies[word] = frequencies.get(word, 0) + 1
+        doc_freqs.append(frequencies)
+        for word in frequencies:
+            nd[word] = nd.get(word, 0) + 1
+    doc_len = np.array([len(document) for document in corpus.values()])
+    avgdl = doc_len.sum() / len(corpus)
+    idf = {}
+    for word, freq in nd.items():
+        idf[word] = math.log(len(corpus) - freq + 0.5) - math.log(freq + 0.5)
+    eps = epsilon * sum(idf.values()) / len(idf)
+    idf = {word: eps if value < 0 else value for word, value in idf.items()}
+    score = np.zeros(len(corpus))
+    for q in query.split(" "):
+        q_freq = np.array([(doc.get(q) or 0) for doc in doc_freqs])
+        score += (idf.get(q) or 0) * (
+            q_freq * (k1 + 1) / (q_freq + k1 * (1 - b + b * doc_len / avgdl))
+        )
+    return dict(zip(corpus, score.tolist()))
+
+
+class TestBM25(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # frequent codes have a negative idf
+        self.corpus = {
+            f"doc-{i}": [f"code-{c}" for c in rng.zipf(1.5, rng.randint(1, 20)) % 50]
+            for i in range(200)
+        }
+        self.queries = [
+            " ".join(f"code-{c}" for c in rng.zipf(1.5, rng.randint(1, 10)) % 60)
+            for _ in range(30)
+        ]
+        self.bm25 = BM25Okapi(self.corpus)
+
+    def test_scores(self):
+        for query in self.queries:
+            expected = reference_scores(self.corpus, query)
+            actual = self.bm25.get_scores(query)
+            self.assertEqual(list(actual), list(expected))
+            np.testing.assert_allclose(
+                list(actual.values()), list(expected.values()), rtol=1e-12
+            )
+            # token lists are scored as space-separated strings
+            self.assertEqual(self.bm25.get_scores(query.split(" ")), actual)
+
+    def test_string_corpus(self):
+        corpus = {d_id: " ".join(document) for d_id, document in self.corpus.items()}
+        bm25 = BM25Okapi(corpus)
+        for query in self.queries:
+            self.assertEqual(bm25.get_scores(query), self.bm25.get_scores(query))
+
+    def test_top_k(self):
+        scores = self.bm25.get_batch_scores(self.queries)
+        for query, row, top_k in zip(
+            self.queries, scores, self.bm25.get_top_k(self.queries, k=5, batch_size=7)
+        ):
+            expected = sorted(
+                self.bm25.get_scores(query).items(), key=lambda x: x[1], reverse=True
+            )[:5]
+            self.assertEqual(top_k, expected)
+            self.assertEqual(row.tolist(), list(self.bm25.get_scores(query).values()))
+
+
+def linkage_samples(num_samples=60, seed=0):
+    rng = np.random.RandomState(seed)
+    samples = []
+    for i in range(num_samples):
+        q_age = int(rng.randint(20, 80))
+        identifiers = f"F+{'Medicare' if rng.rand() < 0.5 else 'Private'}"
+        samples.append(
+            {
+                "patient_id": f"patient-{i}",
+                "visit_id": f"q-{i}",
+                "conditions": ["<cls>"] + [f"c{c}" for c in rng.choice(40, 5)],
+                "age": q_age,
+                "identifiers": identifiers,
+                "d_visit_id": f"d-{i}",
+                "d_conditions": ["<cls>"] + [f"c{c}" for c in rng.choice(40, 5)],
+                "d_age": q_age - int(rng.randint(0, 5)),
+                "d_identifiers": identifiers,
+            }
+        )
+    return samples
+
+
+class TestMedLinkSearch(unittest.TestCase):
+    def setUp(self):
+        samples = linkage_samples()
+        dataset = SampleEHRDataset(samples=samples)
+        torch.manual_seed(0)
+        self.model = MedLink(dataset=dataset, feature_keys=["conditions"])
+        corpus, queries, self.qrels, _, _ = convert_to_ir_format(samples)
+        self.corpus_loader, self.queries_loader = get_eval_dataloader(
+            corpus, queries, batch_size=16
+        )
+        # a few candidates per query, with the ground truth
+        rng = np.random.RandomState(1)
+        corpus_ids = list(corpus)
+        self.candidates = {
+            q_id: [corpus_ids[i] for i in sorted(rng.choice(len(corpus), 8, False))]
+            for q_id in queries
+        }
+        # the full (query, corpus) ranking, as the previous search() did
+        self.model.eval()
+        with torch.no_grad():
+            corpus_emb = self.model.encode_corpus(list(corpus.values()))
+            queries_emb = self.model.encode_queries(list(queries.values()))
+            idf = self.model.compute_idf(corpus_emb)
+            scores = torch.einsum("ac,bc->abc", queries_emb, corpus_emb)
+            scores = (scores * idf).sum(dim=-1).tolist()
+        self.expected = {
+            q_id: dict(zip(corpus_ids, q_scores))
+            for q_id, q_scores in zip(queries, scores)
+        }
+
+    def evaluate(self, **kwargs):
+        return self.model.evaluate(self.corpus_loader, self.queries_loader, **kwargs)
+
+    def assert_results(self, actual, expected):
+        self.assertEqual(list(actual), list(expected))
+        for q_id, scores in expected.items():
+            self.assertEqual(set(actual[q_id]), set(scores))
+            for c_id, score in scores.items():
+                self.assertAlmostEqual(actual[q_id][c_id], score, places=4)
+
+    def top_k(self, results, k):
+        return {
+            q_id: dict(sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k])
+            for q_id, scores in results.items()
+        }
+
+    def test_full_ranking(self):
+        # the corpus is scored in several chunks
+        self.assert_results(self.evaluate(batch_size=16), self.expected)
+
+    def test_top_k(self):
+        actual = self.evaluate(top_k=5, batch_size=16)
+        self.assert_results(actual, self.top_k(self.expected, 5))
+        for q_id, scores in actual.items():
+            self.assertEqual(list(scores), list(self.top_k(actual, 5)[q_id]))
+        # more than the corpus
+        self.assert_results(self.evaluate(top_k=1000, batch_size=16), self.expected)
+
+    def test_candidates(self):
+        expected = filter_by_candidates(
+            self.expected,
+            self.qrels,
+            {q_id: list(c_ids) for q_id, c_ids in self.candidates.items()},
+        )
+        candidates = {q_id: list(scores) for q_id, scores in expected.items()}
+        actual = self.evaluate(candidates=candidates, batch_size=16)
+        self.assert_results(actual, expected)
+        actual = self.evaluate(top_k=3, candidates=candidates, batch_size=16)
+        self.assert_results(actual, self.top_k(expected, 3))
+
+
+def reference_candidates(corpus_meta, queries_meta):
+    # the previous implementation of generate_candidates()
+    candidates = {}
+    for q_id, q_meta in queries_meta.items():
+        matches = []
+        for d_id, d_meta in corpus_meta.items():
+            if (d_meta["age"] <= q_meta["age"]) and (
+                d_meta["identifiers"] == q_meta["identifiers"]
+            ):
+                matches.append(d_id)
+        candidates[q_id] = matches
+    average_matches = int(np.mean([len(v) for v in candidates.values()]))
+    for q_id in queries_meta:
+        if len(candidates[q_id]) == 0:
+            candidates[q_id] = random.sample(list(corpus_meta.keys()), average_matches)
+    return candidates
+
+
+class TestGenerateCandidates(unittest.TestCase):
+    def test_candidates(self):
+        samples = linkage_samples(num_samples=200)
+        _, _, _, corpus_meta, queries_meta = convert_to_ir_format(samples)
+        # queries without any candidate, which get random ones
+        queries_meta["q-unknown"] = {"age": 50, "identifiers": "M+Private"}
+        queries_meta["q-young"] = {"age": 0, "identifiers": "F+Private"}
+        random.seed(0)
+        expected = reference_candidates(corpus_meta, queries_meta)
+        random.seed(0)
+        actual = generate_candidates(corpus_meta, queries_meta)
+        self.assertEqual(actual, expected)
+        self.assertGreater(len(actual["q-unknown"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+
+import numpy as np
+import torch
+
+from pyhealth.metrics import (
+    StreamingMetrics,
+    binary_metrics_fn,
+    ddi_rate_score,
+    multiclass_metrics_fn,
+    multilabel_metrics_fn,
+)
+
+
+# this test suite verifies that the metrics accumulated batch by batch match
+# the metrics computed on all predictions at once, and that the vectorized DDI
+# rate matches the pairwise count.
+
+
+class TestStreamingMetrics(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+        self.batch_size = 64
+
+    def stream(self, y_true, y_prob, metrics, mode, **kwargs):
+        streaming_metrics = StreamingMetrics(mode, metrics, **kwargs)
+        for i in range(0, len(y_true), self.batch_size):
+            streaming_metrics.update(
+                y_true[i : i + self.batch_size], y_prob[i : i + self.batch_size]
+            )
+        return streaming_metrics.compute()
+
+    def assert_scores(self, scores, expected, approximated):
+        self.assertEqual(scores.keys(), expected.keys())
+        for metric in expected:
+            places = 3 if metric in approximated else 7
+            self.assertAlmostEqual(scores[metric], expected[metric], places=places)
+
+    def test_binary(self):
+        y_true = self.rng.randint(0, 2, 500)
+        y_prob = np.clip(y_true * 0.3 + self.rng.rand(500) * 0.7, 0, 1)
+        metrics = ["pr_auc", "roc_auc", "accuracy", "f1", "cohen_kappa"]
+        self.assert_scores(
+            self.stream(y_true, y_prob, metrics, "binary"),
+            binary_metrics_fn(y_true, y_prob, metrics),
+            approximated={"pr_auc", "roc_auc"},
+        )
+
+    def test_multiclass(self):
+        y_true = self.rng.randint(0, 4, 500)
+        y_prob = self.rng.rand(500, 4)
+        y_prob[np.arange(500), y_true] += 0.5
+        y_prob /= y_prob.sum(1, keepdims=True)
+        metrics = ["roc_auc_macro_ovr", "accuracy", "f1_macro", "f1_weighted"]
+        self.assert_scores(
+            self.stream(y_true, y_prob, metrics, "multiclass"),
+            multiclass_metrics_fn(y_true, y_prob, metrics),
+            approximated={"roc_auc_macro_ovr"},
+        )
+
+    def test_multilabel(self):
+        y_true = (self.rng.rand(500, 6) < 0.3).astype(int)
+        y_prob = np.clip(y_true * 0.3 + self.rng.rand(500, 6) * 0.7, 0, 1)
+        metrics = ["pr_auc_samples", "roc_auc_macro", "f1_micro", "jaccard_samples"]
+        self.assert_scores(
+            self.stream(y_true, y_prob, metrics, "multilabel", threshold=0.5),
+            multilabel_metrics_fn(y_true, y_prob, metrics, threshold=0.5),
+            approximated={"roc_auc_macro"},
+        )
+
+    def test_pr_auc_without_positives(self):
+        # labels which are never positive, as often in drug recommendation
+        y_true = (self.rng.rand(500, 6) < 0.3).astype(int)
+        y_true[:, 2] = 0
+        y_prob = np.clip(y_true * 0.3 + self.rng.rand(500, 6) * 0.7, 0, 1)
+        metrics = ["pr_auc_macro", "pr_auc_weighted", "pr_auc_micro"]
+        self.assert_scores(
+            self.stream(y_true, y_prob, metrics, "multilabel"),
+            multilabel_metrics_fn(y_true, y_prob, metrics),
+            approximated=set(metrics),
+        )
+        self.assert_scores(
+            self.stream(y_true[:, 2], y_prob[:, 2], ["pr_auc"], "binary"),
+            binary_metrics_fn(y_true[:, 2], y_prob[:, 2], ["pr_auc"]),
+            approximated={"pr_auc"},
+        )
+        # the ROC AUC is not defined for this label
+        with self.assertRaisesRegex(ValueError, "ROC AUC"):
+            self.stream(y_true, y_prob, ["roc_auc_macro"], "multilabel")
+        scores = self.stream(
+            y_true[:, [0, 1]], y_prob[:, [0, 1]], ["roc_auc_macro"], "multilabel"
+        )
+        self.assertIn("roc_auc_macro", scores)
+
+    def test_exact_fallback(self):
+        y_true = self.rng.rand(100, 3)
+        y_prob = self.rng.rand(100, 3)
+        streaming_metrics = StreamingMetrics("regression", ["mse"])
+        self.assertTrue(streaming_metrics.exact)
+        streaming_metrics.update(y_true[:50], y_prob[:50], loss=1.0)
+        streaming_metrics.update(y_true[50:], y_prob[50:], loss=2.0)
+        scores = streaming_metrics.compute()
+        self.assertAlmostEqual(scores["mse"], np.mean((y_true - y_prob) ** 2))
+        self.assertAlmostEqual(scores["loss"], 1.5)
+
+
+def reference_ddi_rate_score(medications, ddi_matrix):
+    # the previous pairwise implementation of ddi_rate_score()
+    all_cnt = 0
+    ddi_cnt = 0
+    for sample in medications:
+        for i, med_i in enumerate(sample):
+            for j, med_j in enumerate(sample):
+                if j <= i:
+                    continue
+                all_cnt += 1
+                if ddi_matrix[med_i, med_j] == 1 or ddi_matrix[med_j, med_i] == 1:
+                    ddi_cnt += 1
+    if all_cnt == 0:
+        return 0
+    return ddi_cnt / all_cnt
+
+
+class TestDDIRateScore(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # not symmetric, with some self-interactions
+        self.ddi_matrix = (rng.rand(20, 20) < 0.1).astype(int)
+        self.y_pred = rng.rand(300, 20) < 0.2
+        self.y_pred[:5] = False
+
+    def test_indices(self):
+        medications = [np.where(sample)[0] for sample in self.y_pred]
+        # repeated medications
+        medications[5] = np.array([3, 3, 7])
+        self.assertAlmostEqual(
+            ddi_rate_score(medications, self.ddi_matrix, batch_size=64),
+            reference_ddi_rate_score(medications, self.ddi_matrix),
+        )
+
+    def test_multi_hot(self):
+        expected = reference_ddi_rate_score(
+            [np.where(sample)[0] for sample in self.y_pred], self.ddi_matrix
+        )
+        self.assertAlmostEqual(
+            ddi_rate_score(self.y_pred.astype(int), self.ddi_matrix, batch_size=64),
+            expected,
+        )
+        self.assertAlmostEqual(
+            ddi_rate_score(
+                torch.from_numpy(self.y_pred),
+                torch.from_numpy(self.ddi_matrix),
+                batch_size=64,
+            ),
+            expected,
+        )
+
+    def test_no_pairs(self):
+        self.assertEqual(ddi_rate_score([np.array([1]), []], self.ddi_matrix), 0)
+        self.assertEqual(ddi_rate_score(self.y_pred[:5], self.ddi_matrix), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import importlib.util
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import torch
+
+from pyhealth.datasets import SampleEHRDataset, get_dataloader
+from pyhealth.datasets.utils import collate_fn_dict
+from pyhealth.models import (
+    CNN,
+    MLP,
+    RETAIN,
+    RNN,
+    TCN,
+    AdaCare,
+    Agent,
+    ConCare,
+    GAMENet,
+    GRASP,
+    MICRON,
+    MoleRec,
+    SafeDrug,
+    StageNet,
+    Transformer,
+)
+
+
+# this test suite verifies that the models output the same results for the
+# raw features and for the features encoded by the collate function.
+
+
+class CollateEncodingTestCase(unittest.TestCase):
+    def assert_model_outputs(self, model, feature_keys):
+        model.eval()
+        collate_fn = model.get_collate_fn()
+        self.assertIsNot(collate_fn, collate_fn_dict)
+        raw_loader = get_dataloader(model.dataset, batch_size=4)
+        encoded_loader = get_dataloader(
+            model.dataset, batch_size=4, collate_fn=collate_fn
+        )
+        for raw, encoded in zip(raw_loader, encoded_loader):
+            for feature_key in feature_keys:
+                self.assertIsInstance(encoded[feature_key], torch.Tensor)
+            # some models sample at inference (e.g., the actions of Agent or
+            # the cluster centers of GRASP)
+            with torch.no_grad():
+                random.seed(0)
+                torch.manual_seed(0)
+                expected = model(**raw)
+                random.seed(0)
+                torch.manual_seed(0)
+                actual = model(**encoded)
+            for key in ["loss", "y_prob", "y_true"]:
+                torch.testing.assert_close(actual[key], expected[key])
+
+
+class TestCollateEncoding(CollateEncodingTestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.samples = []
+        for i in range(16):
+            num_visits = rng.randint(2, 6)
+            self.samples.append(
+                {
+                    "patient_id": f"patient-{i}",
+                    "visit_id": f"visit-{i}",
+                    # 3d features with a varying number of visits and codes
+                    "conditions": [
+                        [f"cond-{c}" for c in rng.choice(30, rng.randint(1, 6))]
+                        for _ in range(num_visits)
+                    ],
+                    # 2d features
+                    "procedures": [f"proc-{c}" for c in rng.choice(10, num_visits)],
+                    "label": int(rng.randint(2)),
+                }
+            )
+        self.dataset = SampleEHRDataset(samples=self.samples)
+
+    def assert_same_outputs(
+        self, model_cls, feature_keys=("conditions", "procedures"), **kwargs
+    ):
+        torch.manual_seed(0)
+        model = model_cls(
+            dataset=self.dataset,
+            feature_keys=list(feature_keys),
+            label_key="label",
+            mode="binary",
+            **kwargs,
+        )
+        self.assert_model_outputs(model, feature_keys)
+
+    def test_mlp(self):
+        self.assert_same_outputs(MLP, feature_keys=["procedures"])
+
+    def test_rnn(self):
+        self.assert_same_outputs(RNN)
+
+    def test_transformer(self):
+        self.assert_same_outputs(Transformer)
+
+    def test_retain(self):
+        self.assert_same_outputs(RETAIN)
+
+    def test_cnn(self):
+        self.assert_same_outputs(CNN)
+
+    def test_tcn(self):
+        self.assert_same_outputs(TCN)
+
+    def test_adacare(self):
+        self.assert_same_outputs(AdaCare, use_embedding=[True, True])
+
+    def test_agent(self):
+        self.assert_same_outputs(Agent)
+
+    def test_concare(self):
+        self.assert_same_outputs(ConCare, use_embedding=[True, True])
+
+    def test_grasp(self):
+        self.assert_same_outputs(GRASP, use_embedding=[True, True], cluster_num=2)
+
+    def test_stagenet(self):
+        self.assert_same_outputs(StageNet)
+
+
+# ATC level 5 drugs with their SMILES, and the drug-drug interactions between
+# them, as in the ATC.csv and DDI_GAMENet.csv files of the ATC vocabulary
+TOY_ATC_SMILES = {
+    "N02BA01": "CC(=O)OC1=CC=CC=C1C(=O)O",
+    "N02BE01": "CC(=O)NC1=CC=C(O)C=C1",
+    "N06BC01": "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "M01AE01": "CC(C)CC1=CC=C(C=C1)C(C)C(=O)O",
+    "J01CE01": "CC1(C)SC2C(NC(=O)CC3=CC=CC=C3)C(=O)N2C1C(=O)O",
+    "C07AA05": "CC(C)NCC(O)COC1=CC=CC2=CC=CC=C21",
+    "B01AA03": "CC(=O)CC(C1=CC=CC=C1)C1=C(O)C2=CC=CC=C2OC1=O",
+}
+TOY_DDI = [("B01AA03", "M01AE01"), ("B01AA03", "N02BA01"), ("C07AA05", "N06BC01")]
+
+
+def toy_atc_csv(filename, refresh_cache=False):
+    if filename == "DDI_GAMENet.csv":
+        return pd.DataFrame(TOY_DDI, columns=["ATC i", "ATC j"])
+    rows = [
+        {"code": code[:4], "name": code[:4], "parent_code": None, "level": 3}
+        for code in sorted(set(code[:4] for code in TOY_ATC_SMILES))
+    ]
+    rows += [
+        {"code": code, "name": code, "parent_code": code[:4], "level": 5}
+        for code in TOY_ATC_SMILES
+    ]
+    df = pd.DataFrame(rows)
+    df["smiles"] = df["code"].map(TOY_ATC_SMILES)
+    return df
+
+
+class TestDrugRecommendationCollateEncoding(CollateEncodingTestCase):
+    """The drug recommendation models, with a toy ATC vocabulary instead of the
+    downloaded one."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patchers = [
+            mock.patch("pyhealth.medcode.inner_map.MODULE_CACHE_PATH", self.root),
+            mock.patch(
+                "pyhealth.medcode.inner_map.download_and_read_csv", toy_atc_csv
+            ),
+            mock.patch("pyhealth.medcode.codes.atc.download_and_read_csv", toy_atc_csv),
+        ] + [
+            mock.patch(f"pyhealth.models.{module}.CACHE_PATH", self.root)
+            for module in ["gamenet", "micron", "safedrug", "molerec"]
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        rng = np.random.RandomState(0)
+        drugs = sorted(set(code[:4] for code in TOY_ATC_SMILES))
+        samples = []
+        for i in range(16):
+            num_visits = rng.randint(2, 6)
+            drugs_hist = [
+                rng.choice(drugs, rng.randint(1, 4), replace=False).tolist()
+                for _ in range(num_visits)
+            ]
+            # as in the drug recommendation tasks
+            samples.append(
+                {
+                    "patient_id": f"patient-{i}",
+                    "visit_id": f"visit-{i}",
+                    "conditions": [
+                        [f"cond-{c}" for c in rng.choice(30, rng.randint(1, 6))]
+                        for _ in range(num_visits)
+                    ],
+                    "procedures": [
+                        [f"proc-{c}" for c in rng.choice(10, rng.randint(1, 4))]
+                        for _ in range(num_visits)
+                    ],
+                    "drugs": drugs_hist[-1],
+                    "drugs_hist": drugs_hist[:-1] + [[]],
+                }
+            )
+        self.dataset = SampleEHRDataset(samples=samples)
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.root)
+
+    def assert_same_outputs(self, model_cls, **kwargs):
+        torch.manual_seed(0)
+        model = model_cls(self.dataset, embedding_dim=16, hidden_dim=16, **kwargs)
+        self.assert_model_outputs(model, ["conditions", "procedures"])
+
+    def test_gamenet(self):
+        self.assert_same_outputs(GAMENet)
+
+    def test_micron(self):
+        self.assert_same_outputs(MICRON)
+
+    def test_safedrug(self):
+        self.assert_same_outputs(SafeDrug)
+
+    @unittest.skipIf(importlib.util.find_spec("ogb") is None, "requires ogb")
+    def test_molerec(self):
+        self.assert_same_outputs(MoleRec)
+
+
+if __name__ == "__main__":
+    unittest.main()
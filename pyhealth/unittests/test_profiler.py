@@ -0,0 +1,132 @@
+import csv
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pyhealth import profiler as profiler_module
+from pyhealth.datasets import SampleEHRDataset, get_dataloader
+from pyhealth.models import MLP
+from pyhealth.profiler import TrainingProfiler, get_peak_memory, record_phase
+from pyhealth.trainer import Trainer
+
+
+# this test suite verifies the summary and the files of the training profiler,
+# and that the profiler is only active during the training loop.
+
+
+class TestTrainingProfiler(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_steps(self, profiler, num_steps=3):
+        for _ in range(num_steps):
+            with profiler.phase("data"):
+                data = {"label": [0] * 4}
+            with profiler.phase("forward"):
+                with record_phase("tokenization"):
+                    time.sleep(0.01)
+            profiler.step(data)
+        with profiler.phase("evaluation"):
+            # not reported during evaluation
+            with record_phase("tokenization"):
+                time.sleep(0.01)
+
+    def test_summary(self):
+        profiler = TrainingProfiler("cpu", output_path=self.root)
+        with profiler:
+            self.run_steps(profiler)
+        self.assertIsNone(profiler_module._active_profiler)
+        summary = profiler.summary()
+        self.assertEqual(summary["num_steps"], 3)
+        self.assertEqual(summary["num_samples"], 12)
+        for name in ["data", "forward", "tokenization", "evaluation"]:
+            self.assertGreaterEqual(summary[f"{name}_time"], 0)
+            self.assertLessEqual(summary[f"{name}_share"], 1)
+        # tokenization is nested in forward, and not recorded during evaluation
+        self.assertGreaterEqual(summary["tokenization_time"], 0.03)
+        self.assertGreaterEqual(summary["forward_time"], summary["tokenization_time"])
+        # the throughput is over the training steps only
+        step_time = summary["data_time"] + summary["forward_time"]
+        self.assertAlmostEqual(summary["samples_per_sec"], 12 / step_time)
+
+    def test_save(self):
+        profiler = TrainingProfiler("cpu", output_path=self.root)
+        with profiler:
+            self.run_steps(profiler)
+        profiler.save()
+        with open(os.path.join(self.root, "steps.csv")) as f:
+            steps = list(csv.DictReader(f))
+        self.assertEqual(len(steps), 3)
+        self.assertEqual(
+            set(steps[0]), {"step", "samples", "data", "forward", "tokenization"}
+        )
+        self.assertEqual([step["samples"] for step in steps], ["4"] * 3)
+        with open(os.path.join(self.root, "profile.json")) as f:
+            self.assertEqual(json.load(f)["num_steps"], 3)
+
+    def test_disabled(self):
+        profiler = TrainingProfiler("cpu", output_path=self.root, enabled=False)
+        with profiler:
+            self.assertIsNone(profiler_module._active_profiler)
+            self.run_steps(profiler)
+        profiler.save()
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_worker(self):
+        profiler = TrainingProfiler("cpu")
+        with profiler:
+            # e.g., a forked DataLoader worker, which inherits the profiler
+            with mock.patch(
+                "torch.utils.data.get_worker_info", return_value=object()
+            ), record_phase("tokenization"):
+                pass
+        self.assertNotIn("tokenization", profiler.phase_totals)
+
+    def test_peak_memory(self):
+        max_rss = mock.Mock(ru_maxrss=3 * 2**20)
+        with mock.patch("resource.getrusage", return_value=max_rss):
+            with mock.patch("sys.platform", "linux"):
+                self.assertEqual(get_peak_memory("cpu"), 3 * 2**10)
+            with mock.patch("sys.platform", "darwin"):
+                self.assertEqual(get_peak_memory("cpu"), 3)
+        # e.g., on Windows
+        with mock.patch.dict("sys.modules", {"resource": None}):
+            self.assertTrue(math.isnan(get_peak_memory("cpu")))
+
+    def test_trainer(self):
+        samples = [
+            {
+                "patient_id": str(i),
+                "visit_id": str(i),
+                "conditions": ["a", "b"],
+                "label": i % 2,
+            }
+            for i in range(8)
+        ]
+        dataset = SampleEHRDataset(samples=samples)
+        model = MLP(
+            dataset, feature_keys=["conditions"], label_key="label", mode="binary"
+        )
+        trainer = Trainer(model, device="cpu", output_path=self.root, exp_name="exp")
+        dataloader = get_dataloader(dataset, batch_size=4)
+        trainer.train(dataloader, val_dataloader=dataloader, epochs=1, profile=True)
+        self.assertIsNone(profiler_module._active_profiler)
+        for filename in ["steps.csv", "profile.json"]:
+            self.assertTrue(os.path.exists(os.path.join(self.root, "exp", filename)))
+        # the profiler is stopped when the training fails
+        with mock.patch.object(model, "forward", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                trainer.train(dataloader, epochs=1, profile=True)
+        self.assertIsNone(profiler_module._active_profiler)
+
+
+if __name__ == "__main__":
+    unittest.main()
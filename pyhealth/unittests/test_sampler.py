@@ -0,0 +1,33 @@
+import unittest
+
+from pyhealth.sampler import BucketBatchSampler
+
+
+class TestBucketBatchSampler(unittest.TestCase):
+    def setUp(self):
+        # number of visits is 1, 5, 1, 5, ...
+        self.samples = [
+            {"conditions": [["c1", "c2"]] * (1 + 4 * (i % 2)), "label": 0}
+            for i in range(20)
+        ]
+
+    def test_buckets(self):
+        sampler = BucketBatchSampler(self.samples, batch_size=4, num_buckets=2)
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(sorted(sum(batches, [])), list(range(20)))
+        # each batch only holds samples with the same number of visits
+        for batch in batches:
+            self.assertEqual(len({i % 2 for i in batch}), 1)
+
+    def test_shuffle(self):
+        sampler = BucketBatchSampler(
+            self.samples, batch_size=4, shuffle=True, num_buckets=2, drop_last=True
+        )
+        for batch in sampler:
+            self.assertEqual(len(batch), 4)
+            self.assertEqual(len({i % 2 for i in batch}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
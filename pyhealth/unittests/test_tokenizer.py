@@ -135,6 +135,28 @@ class Test3D(unittest.TestCase):
             msg="batch_encode_3d function (truncation) failed"
         )
 
+    def test_encode_array(self):
+        tokens = [
+            [
+                ['A03C', 'A03D', 'A03E', 'A03F'],
+                ['A08A', 'A09A'],
+            ],
+            [
+                ['A04A', 'B035', 'C129'],
+            ]
+        ]
+        indices, mask = self.tokenizer.batch_encode_3d_array(tokens)
+        self.assertEqual(
+            indices.tolist(),
+            [[[8, 9, 10, 11], [24, 25, 0, 0]], [[12, 1, 1, 0], [0, 0, 0, 0]]],
+            msg="batch_encode_3d_array function failed"
+        )
+        self.assertEqual(
+            mask.sum(axis=2).tolist(),
+            [[4, 2], [3, 0]],
+            msg="batch_encode_3d_array function (mask) failed"
+        )
+
     def test_decode(self):
         indices = [
             [
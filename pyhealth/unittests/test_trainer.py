@@ -0,0 +1,122 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+from pyhealth.datasets import SampleEHRDataset, get_dataloader
+from pyhealth.models import MLP
+from pyhealth.trainer import Trainer
+
+
+# this test suite verifies the evaluation and the training options of the
+# Trainer against their default behavior.
+
+
+def binary_samples(num_samples=200, seed=0):
+    rng = np.random.RandomState(seed)
+    samples = []
+    for i in range(num_samples):
+        label = int(rng.randint(2))
+        # the label is predictable from the codes
+        codes = rng.choice(10, 4) + 10 * label * (rng.rand(4) < 0.5)
+        samples.append(
+            {
+                "patient_id": f"patient-{i}",
+                "visit_id": f"visit-{i}",
+                "conditions": [f"cond-{c}" for c in codes],
+                "label": label,
+            }
+        )
+    return samples
+
+
+class TestTrainer(unittest.TestCase):
+    def setUp(self):
+        self.dataset = SampleEHRDataset(samples=binary_samples())
+        self.dataloader = get_dataloader(self.dataset, batch_size=32)
+
+    def get_model(self):
+        torch.manual_seed(0)
+        return MLP(
+            dataset=self.dataset,
+            feature_keys=["conditions"],
+            label_key="label",
+            mode="binary",
+        )
+
+    def test_streaming_metrics(self):
+        model = self.get_model()
+        metrics = ["roc_auc", "pr_auc", "accuracy", "f1"]
+        expected = Trainer(
+            model, metrics=metrics, device="cpu", enable_logging=False
+        ).evaluate(self.dataloader)
+        actual = Trainer(
+            model,
+            metrics=metrics,
+            device="cpu",
+            enable_logging=False,
+            streaming_metrics=True,
+        ).evaluate(self.dataloader)
+        self.assertEqual(actual.keys(), expected.keys())
+        for metric in expected:
+            # the AUCs are approximated with histograms
+            places = 3 if metric in ["roc_auc", "pr_auc"] else 7
+            self.assertAlmostEqual(actual[metric], expected[metric], places=places)
+
+    def train(self, batch_size, **kwargs):
+        model = self.get_model()
+        dataloader = get_dataloader(self.dataset, batch_size=batch_size)
+        Trainer(model, device="cpu", enable_logging=False).train(
+            dataloader,
+            epochs=2,
+            optimizer_class=torch.optim.SGD,
+            optimizer_params={"lr": 0.5},
+            **kwargs,
+        )
+        return model
+
+    def assert_same_parameters(self, actual, expected):
+        for (name, p), (_, q) in zip(
+            actual.named_parameters(), expected.named_parameters()
+        ):
+            torch.testing.assert_close(p, q, msg=name)
+
+    def test_default(self):
+        # a plain training loop
+        expected = self.get_model()
+        optimizer = torch.optim.SGD(expected.parameters(), lr=0.5)
+        for _ in range(2):
+            for data in get_dataloader(self.dataset, batch_size=40):
+                optimizer.zero_grad()
+                expected(**data)["loss"].backward()
+                optimizer.step()
+        with mock.patch("pyhealth.trainer.get_grad_scaler") as get_grad_scaler:
+            actual = self.train(batch_size=40)
+        get_grad_scaler.assert_not_called()
+        self.assert_same_parameters(actual, expected)
+
+    def test_gradient_accumulation(self):
+        # 200 samples: 3 groups of 4, 4 and 2 batches of 20 samples per epoch,
+        # i.e., batches of 80, 80 and 40 samples
+        expected = self.train(batch_size=80)
+        actual = self.train(batch_size=20, gradient_accumulation_steps=4)
+        self.assert_same_parameters(actual, expected)
+
+    def test_bf16(self):
+        expected = self.train(batch_size=40)
+        with mock.patch("pyhealth.trainer.get_grad_scaler") as get_grad_scaler:
+            actual = self.train(batch_size=40, mixed_precision="bf16")
+        # no loss scaling on CPU
+        get_grad_scaler.assert_not_called()
+        self.assertTrue(any(
+            not torch.equal(p, q)
+            for p, q in zip(actual.parameters(), self.get_model().parameters())
+        ))
+        for p, q in zip(actual.parameters(), expected.parameters()):
+            self.assertEqual(p.dtype, torch.float32)
+            torch.testing.assert_close(p, q, atol=0.05, rtol=0)
+
+
+if __name__ == "__main__":
+    unittest.main()